@@ -0,0 +1,223 @@
+"""
+Agenda statistics over a date range.
+
+``agenda_stats`` answers questions such as "how many hours of meetings did
+I have per week this quarter" with a compact summary instead of raw
+events. Events of the range (stored events and expanded recurring
+instances) are read from the mirror ``AGENDA_CHUNK_DAYS`` at a time,
+reduced to arrays of start/end epochs and folded into ``AgendaStats``,
+whose totals are sized by the number of days and periods, not events, so
+memory stays flat for multi-year ranges.
+
+Each chunk is aggregated in a few vectorized NumPy passes: ``searchsorted``
+against day and period boundaries, ``bincount`` for per-day and per-period
+sums, and a running maximum of end times for the union of busy time (and
+so the double-booked overlap). NumPy is a declared dependency; where it
+cannot be imported the same totals are computed in plain Python.
+"""
+
+import bisect
+import datetime
+import functools
+import os
+
+# Days of events read from the mirror and aggregated at a time
+AGENDA_CHUNK_DAYS = int(os.environ.get('AGENDA_CHUNK_DAYS', '31'))
+# Largest number of periods one summary may hold (use a coarser group_by beyond it)
+AGENDA_MAX_PERIODS = 400
+GROUP_BY = ('day', 'week', 'month')
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """The numpy module, or None when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _midnight(day: datetime.date, tzinfo) -> float:
+    return datetime.datetime.combine(day, datetime.time(0), tzinfo).timestamp()
+
+
+def _period_start(day: datetime.date, group_by: str) -> datetime.date:
+    if group_by == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if group_by == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day: datetime.date, group_by: str) -> datetime.date:
+    if group_by == 'week':
+        return day + datetime.timedelta(days=7)
+    if group_by == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+class AgendaStats:
+    """Running totals of the events of ``[time_min, time_max)`` in ``tzinfo``.
+
+    Feed ``add`` chunks of start/end timestamps in ascending chunk order
+    (events sorted by start within a chunk); durations are clipped to the
+    range and credited to the day and period each event starts in.
+    """
+
+    def __init__(self, time_min: float, time_max: float, tzinfo, group_by: str = 'week',
+                 use_numpy: bool = None):
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by '{group_by}'. Use 'day', 'week' or 'month'.")
+        if time_max <= time_min:
+            raise ValueError("The range end must be after its start")
+        self.time_min = time_min
+        self.time_max = time_max
+        self.tzinfo = tzinfo
+        self.group_by = group_by
+        self.np = _numpy() if use_numpy in (None, True) else None
+        if use_numpy and self.np is None:
+            raise ValueError("numpy is not installed")
+
+        first = datetime.datetime.fromtimestamp(time_min, tzinfo).date()
+        last = datetime.datetime.fromtimestamp(time_max, tzinfo).date()
+        self.first_day = first
+        self.day_starts = [_midnight(first + datetime.timedelta(days=i), tzinfo)
+                           for i in range((last - first).days + 1)]
+        self.period_days = []
+        day = _period_start(first, group_by)
+        while day <= last:
+            self.period_days.append(day)
+            day = _next_period(day, group_by)
+        if len(self.period_days) > AGENDA_MAX_PERIODS:
+            raise ValueError(f"{len(self.period_days)} {group_by}s is too many periods; "
+                             f"use a coarser group_by or a shorter range")
+        self.period_starts = [_midnight(day, tzinfo) for day in self.period_days]
+
+        zeros = self.np.zeros if self.np else (lambda n: [0.0] * n)
+        self.day_seconds = zeros(len(self.day_starts))
+        self.day_events = zeros(len(self.day_starts))
+        self.period_seconds = zeros(len(self.period_starts))
+        self.period_events = zeros(len(self.period_starts))
+        self.events = 0
+        self.seconds = 0.0
+        self.busy_seconds = 0.0      # union of all events
+        self.overlapping = 0         # events starting before an earlier one ended
+        self.longest = 0.0
+        self._reach = float('-inf')  # latest end seen so far
+
+    def add(self, starts, ends):
+        """Fold one chunk of events (parallel start/end timestamp sequences) into the totals."""
+        if len(starts):
+            if self.np is not None:
+                self._add_numpy(starts, ends)
+            else:
+                self._add_python(starts, ends)
+
+    def _add_numpy(self, starts, ends):
+        np = self.np
+        starts = np.maximum(np.asarray(starts, dtype=np.float64), self.time_min)
+        ends = np.minimum(np.asarray(ends, dtype=np.float64), self.time_max)
+        order = np.argsort(starts, kind='stable')
+        starts, ends = starts[order], ends[order]
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        if not len(starts):
+            return
+        durations = ends - starts
+        days = np.searchsorted(self.day_starts, starts, side='right') - 1
+        periods = np.searchsorted(self.period_starts, starts, side='right') - 1
+        self.day_seconds += np.bincount(days, weights=durations, minlength=len(self.day_starts))
+        self.day_events += np.bincount(days, minlength=len(self.day_starts))
+        self.period_seconds += np.bincount(periods, weights=durations, minlength=len(self.period_starts))
+        self.period_events += np.bincount(periods, minlength=len(self.period_starts))
+        # reach[i] = latest end among the events before i (including earlier chunks)
+        reach = np.maximum.accumulate(np.concatenate(([self._reach], ends[:-1])))
+        self.busy_seconds += float(np.maximum(ends - np.maximum(starts, reach), 0).sum())
+        self.overlapping += int((starts < reach).sum())
+        self._reach = max(self._reach, float(ends.max()))
+        self.events += len(starts)
+        self.seconds += float(durations.sum())
+        self.longest = max(self.longest, float(durations.max()))
+
+    def _add_python(self, starts, ends):
+        for start, end in sorted(zip(starts, ends)):
+            start, end = max(start, self.time_min), min(end, self.time_max)
+            if end <= start:
+                continue
+            duration = end - start
+            day = bisect.bisect_right(self.day_starts, start) - 1
+            period = bisect.bisect_right(self.period_starts, start) - 1
+            self.day_seconds[day] += duration
+            self.day_events[day] += 1
+            self.period_seconds[period] += duration
+            self.period_events[period] += 1
+            self.busy_seconds += max(end - max(start, self._reach), 0)
+            if start < self._reach:
+                self.overlapping += 1
+            self._reach = max(self._reach, end)
+            self.events += 1
+            self.seconds += duration
+            self.longest = max(self.longest, duration)
+
+    def summary(self, top_days: int = 5) -> dict:
+        """The compact result: totals, per-period series, weekday split and busiest days."""
+        hours = lambda seconds: round(float(seconds) / 3600, 2)
+        periods = [{'start': day.isoformat(), 'events': int(n), 'hours': hours(s)}
+                   for day, n, s in zip(self.period_days, self.period_events, self.period_seconds)]
+        weekday_seconds = [0.0] * 7
+        weekday_events = [0] * 7
+        offset = self.first_day.weekday()
+        for i, (n, s) in enumerate(zip(self.day_events, self.day_seconds)):
+            weekday_seconds[(offset + i) % 7] += float(s)
+            weekday_events[(offset + i) % 7] += int(n)
+        busiest = sorted((i for i, s in enumerate(self.day_seconds) if s > 0),
+                         key=lambda i: (-self.day_seconds[i], i))[:top_days]
+        return {
+            'events': self.events,
+            'hours': hours(self.seconds),
+            'busy_hours': hours(self.busy_seconds),
+            'overlap_hours': hours(self.seconds - self.busy_seconds),
+            'overlapping_events': self.overlapping,
+            'average_minutes': round(self.seconds / self.events / 60, 1) if self.events else 0,
+            'longest_minutes': round(self.longest / 60, 1),
+            'group_by': self.group_by,
+            'periods': periods,
+            'by_weekday': {name: {'events': n, 'hours': hours(s)}
+                           for name, n, s in zip(WEEKDAYS, weekday_events, weekday_seconds) if n},
+            'busiest_days': [{'date': (self.first_day + datetime.timedelta(days=i)).isoformat(),
+                              'events': int(self.day_events[i]), 'hours': hours(self.day_seconds[i])}
+                             for i in busiest],
+        }
+
+
+def chunks(time_min: float, time_max: float, days: int = AGENDA_CHUNK_DAYS):
+    """Consecutive ``(start, end)`` windows of at most ``days`` covering the range."""
+    step = days * 86400
+    start = time_min
+    while start < time_max:
+        yield start, min(start + step, time_max)
+        start += step
+
+
+def collect(stats: AgendaStats, intervals, calendar_ids: list, keep=None,
+            chunk_days: int = AGENDA_CHUNK_DAYS):
+    """Fold the range into ``stats`` chunk by chunk.
+
+    ``intervals(calendar_id, start, end)`` returns ``(start_ts, end_ts, event)``
+    overlapping a window; ``keep(event)`` filters events. An event is counted
+    in the chunk it starts in (the first chunk also takes events that began
+    before the range), so events spanning chunks are counted once.
+    """
+    for chunk_start, chunk_end in chunks(stats.time_min, stats.time_max, chunk_days):
+        starts, ends = [], []
+        first = chunk_start == stats.time_min
+        for calendar_id in calendar_ids:
+            for start_ts, end_ts, event in intervals(calendar_id, chunk_start, chunk_end):
+                if (first or start_ts >= chunk_start) and (keep is None or keep(event)):
+                    starts.append(start_ts)
+                    ends.append(end_ts)
+        stats.add(starts, ends)
+    return stats
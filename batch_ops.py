@@ -0,0 +1,146 @@
+"""
+Bulk Calendar mutations through the Google batch HTTP endpoint.
+
+Requests are grouped into batches of at most ``BATCH_LIMIT`` sub-requests
+(one HTTPS round trip each) and independent batches run concurrently.
+"""
+
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+from scheduler import RequestScheduler, applied_earlier, retry_safe, scheduler as default_scheduler
+from telemetry import telemetry
+
+# Calendar API maximum number of calls in one batch request
+BATCH_LIMIT = 50
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+
+def describe_error(error: Exception) -> str:
+    """Short, agent-readable description of a failed call."""
+    if isinstance(error, HttpError):
+        try:
+            message = json.loads(error.content)['error']['message']
+        except (ValueError, KeyError, TypeError):
+            message = error.resp.reason
+        return f"HTTP {error.resp.status}: {message}"
+    return str(error)
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# events() method -> (API method ID, HTTP method), for the retry policy
+_METHODS = {
+    'get': ('calendar.events.get', 'GET'),
+    'list': ('calendar.events.list', 'GET'),
+    'insert': ('calendar.events.insert', 'POST'),
+    'import_': ('calendar.events.import', 'POST'),
+    'patch': ('calendar.events.patch', 'PATCH'),
+    'update': ('calendar.events.update', 'PUT'),
+    'delete': ('calendar.events.delete', 'DELETE'),
+}
+
+
+def _method_id(call: tuple) -> str:
+    return _METHODS.get(call[0], (f'calendar.events.{call[0]}', 'POST'))[0]
+
+
+def _safe(call: tuple) -> bool:
+    method_id, http_method = _METHODS.get(call[0], (None, 'POST'))
+    return retry_safe(method_id, http_method, call[1].get('body'))
+
+
+def execute_batch(service_factory, calls: list, max_workers: int = BATCH_WORKERS,
+                  batch_limit: int = BATCH_LIMIT, scheduler: RequestScheduler = None) -> list:
+    """Run ``calls`` through batch requests and return one result per call.
+
+    Each call is ``(method, kwargs)`` on ``service.events()``, e.g.
+    ``('patch', {'calendarId': 'primary', 'eventId': ..., 'body': {...}})``.
+    Results keep the input order and are ``{'ok': True, 'response': ...}`` or
+    ``{'ok': False, 'error': ...}``.
+
+    Batch round trips go through the request scheduler, paid for with one
+    rate-limit token per sub-request. Sub-requests that fail transiently
+    (e.g. 429 or 503) are sent again in a later batch after a backoff, when
+    they are safe to repeat. A failed round trip is retried only by the
+    scheduler, and is final for its calls once that gives up. ``scheduler``
+    defaults to the default account's.
+    """
+    scheduler = scheduler or default_scheduler
+    results = [None] * len(calls)
+    errors = {}     # index -> exception from the latest attempt
+
+    def run_chunk(chunk):
+        def callback(request_id, response, exception):
+            i = int(request_id)
+            if exception is not None:
+                errors[i] = exception
+            else:
+                results[i] = {'ok': True, 'response': response}
+                errors.pop(i, None)
+
+        def send():
+            service = service_factory()
+            batch = service.new_batch_http_request(callback=callback)
+            for i, (method, kwargs) in chunk:
+                batch.add(getattr(service.events(), method)(**kwargs), request_id=str(i))
+            with telemetry.api_call('calendar.batch'):
+                batch.execute()
+
+        try:
+            scheduler.run('calendar.batch', send, safe=all(_safe(call) for _, call in chunk),
+                          cost=len(chunk))
+        except Exception as e:
+            # The whole round trip failed after the scheduler's own retries;
+            # final for every call in the chunk, not re-queued by the loop below
+            for i, _ in chunk:
+                if results[i] is None:
+                    errors.pop(i, None)
+                    results[i] = {'ok': False, 'error': describe_error(e)}
+
+    pending = list(enumerate(calls))
+    attempt = 0
+    while pending:
+        chunks = list(_chunks(pending, batch_limit))
+        if len(chunks) == 1:
+            run_chunk(chunks[0])
+        else:
+            # Copy the caller's context so telemetry attributes chunks to its tool
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                contexts = [contextvars.copy_context() for _ in chunks]
+                list(pool.map(lambda ctx, chunk: ctx.run(run_chunk, chunk), contexts, chunks))
+
+        retry, delay = [], 0.0
+        for i, call in pending:
+            error = errors.pop(i, None)
+            if error is None:
+                continue
+            if attempt and applied_earlier(_method_id(call), error):
+                # A lost response: the earlier attempt was applied
+                if call[0] == 'delete':
+                    results[i] = {'ok': True, 'response': ''}
+                else:
+                    kwargs = call[1]
+                    retry.append((i, ('get', {'calendarId': kwargs['calendarId'],
+                                              'eventId': kwargs['body']['id'],
+                                              'fields': kwargs.get('fields')})))
+                continue
+            backoff = scheduler.next_delay(error, attempt, _safe(call))
+            if backoff is None:
+                results[i] = {'ok': False, 'error': describe_error(error)}
+            else:
+                retry.append((i, call))
+                delay = max(delay, backoff)
+        pending = retry
+        attempt += 1
+        if delay:
+            time.sleep(delay)
+    return results
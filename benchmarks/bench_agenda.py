@@ -0,0 +1,107 @@
+"""
+Benchmark agenda_stats aggregation over multi-year ranges.
+
+Seeds the fake Calendar API with a few years of working-hours meetings
+(some overlapping, some declined or all-day) and weekly recurring series,
+syncs the mirror, then aggregates ranges of growing length with NumPy and
+with the pure-Python fallback. Checks both give the same summary, and
+reports the time and tracemalloc peak of each, the peak with the range
+read in one piece instead of ``AGENDA_CHUNK_DAYS`` chunks, and the size of
+the summary against the events it replaces. Run from the repository root:
+    python -m benchmarks.bench_agenda --years 4 --per-day 6
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from agenda import AGENDA_CHUNK_DAYS, AgendaStats, _numpy, collect
+from benchmarks.fake_server import install
+from freebusy import is_busy
+
+
+def make_events(years: int, per_day: int, start: datetime.datetime, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    events = []
+    for day in range(years * 365):
+        date = start + datetime.timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        for _ in range(rng.randint(0, 2 * per_day)):
+            begin = date + datetime.timedelta(hours=rng.randint(8, 17), minutes=rng.choice((0, 15, 30, 45)))
+            end = begin + datetime.timedelta(minutes=rng.choice((15, 30, 30, 60, 60, 90)))
+            event = {'summary': f'Meeting {len(events)}', 'start': {'dateTime': begin.isoformat()},
+                     'end': {'dateTime': end.isoformat()}}
+            if rng.random() < 0.05:
+                event['attendees'] = [{'email': 'me@example.com', 'self': True, 'responseStatus': 'declined'}]
+            events.append(event)
+        if rng.random() < 0.02:
+            events.append({'summary': 'Offsite', 'start': {'date': date.date().isoformat()},
+                           'end': {'date': (date.date() + datetime.timedelta(days=1)).isoformat()}})
+    for i, weekday in enumerate(('MO', 'WE', 'FR')):
+        begin = start + datetime.timedelta(days=i, hours=9 + i)
+        events.append({'summary': f'Standup {weekday}', 'recurrence': [f'RRULE:FREQ=WEEKLY;BYDAY={weekday}'],
+                       'start': {'dateTime': begin.isoformat(), 'timeZone': 'UTC'},
+                       'end': {'dateTime': (begin + datetime.timedelta(minutes=30)).isoformat(),
+                               'timeZone': 'UTC'}})
+    return events
+
+
+def keep(event):
+    return is_busy(event) and 'date' not in event.get('start', {})
+
+
+def measure(store, start: datetime.datetime, years: int, use_numpy: bool, chunk_days: int) -> tuple:
+    """(summary, seconds, peak bytes) of aggregating ``years`` from ``start`` by month."""
+    time_min = start.timestamp()
+    time_max = (start + datetime.timedelta(days=365 * years)).timestamp()
+    tracemalloc.start()
+    begin = time.perf_counter()
+    stats = AgendaStats(time_min, time_max, datetime.timezone.utc, 'month', use_numpy)
+    collect(stats, store.intervals, ['primary'], keep, chunk_days)
+    summary = stats.summary()
+    elapsed = time.perf_counter() - begin
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summary, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--per-day', type=int, default=6, help='average meetings per weekday')
+    args = parser.parse_args()
+
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    calendar_mcp, backend = install(0)
+    start = datetime.datetime(2022, 1, 3, tzinfo=datetime.timezone.utc)
+    backend.seed(make_events(args.years, args.per_day, start))
+    store = calendar_mcp.default_tenant.event_store
+    store.sync('primary')
+
+    modes = ([True] if _numpy() else []) + [False]
+    print(f"{'years':>5} {'events':>7} {'mode':<7} {'ms':>8} {'peak KiB':>9} {'one-piece KiB':>14}")
+    for years in range(1, args.years + 1):
+        results = {}
+        for use_numpy in modes:
+            summary, elapsed, peak = measure(store, start, years, use_numpy, AGENDA_CHUNK_DAYS)
+            _, _, whole_peak = measure(store, start, years, use_numpy, 365 * years)
+            results[use_numpy] = summary
+            print(f"{years:>5} {summary['events']:>7} {'numpy' if use_numpy else 'python':<7} "
+                  f"{elapsed * 1000:>8.1f} {peak / 1024:>9.0f} {whole_peak / 1024:>14.0f}")
+        assert len({json.dumps(r, sort_keys=True) for r in results.values()}) == 1, "numpy and python differ"
+
+    end = start + datetime.timedelta(days=365 * args.years)
+    summary = calendar_mcp.agenda_stats(start.date().isoformat(), end.date().isoformat(),
+                                        group_by='month', timezone='UTC')
+    raw = store.range('primary', start, end)
+    print(f"agenda_stats response {len(json.dumps(summary)) / 1024:.1f} KiB vs "
+          f"{len(json.dumps(raw)) / 1024:.0f} KiB of raw events ({len(raw)} events)")
+
+
+if __name__ == '__main__':
+    main()
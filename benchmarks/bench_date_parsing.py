@@ -0,0 +1,76 @@
+"""
+Benchmark date_parsing.parse_datetime against the original dateutil-only parser.
+
+Run from the repository root:
+    python -m benchmarks.bench_date_parsing --count 20000
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from dateutil import parser, tz
+
+from date_parsing import _parse_freeform, _parse_iso, parse_datetime, parse_many
+
+
+def legacy_parse_datetime(user_input: str, timezone: str = 'Asia/Karachi') -> str:
+    """The pre-optimisation implementation, kept for comparison."""
+    if not user_input:
+        return None
+    dt = parser.parse(user_input, dayfirst=False, yearfirst=True)
+    target_tz = tz.gettz(timezone)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=target_tz)
+    else:
+        dt = dt.astimezone(target_tz)
+    return dt.isoformat()
+
+
+def make_inputs(count: int, distinct: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    base = datetime.datetime(2025, 1, 1, 8, 0)
+    stamps = [base + datetime.timedelta(minutes=30 * rng.randrange(20000)) for _ in range(distinct)]
+    pools = {
+        'iso naive': [s.strftime('%Y-%m-%d %H:%M') for s in stamps],
+        'rfc3339': [s.strftime('%Y-%m-%dT%H:%M:%S') + rng.choice(('Z', '+05:00', '-07:00')) for s in stamps],
+        'free-form': [s.strftime('%B %d %Y %I:%M %p') for s in stamps],
+    }
+    return {name: [rng.choice(pool) for _ in range(count)] for name, pool in pools.items()}
+
+
+def clear_caches():
+    _parse_iso.cache_clear()
+    _parse_freeform.cache_clear()
+
+
+def rate(fn, values) -> float:
+    begin = time.perf_counter()
+    fn(values)
+    return len(values) / (time.perf_counter() - begin)
+
+
+def main():
+    parser_ = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser_.add_argument('--count', type=int, default=20000)
+    parser_.add_argument('--distinct', type=int, default=2000,
+                         help='number of distinct values (repeats exercise the memo cache)')
+    args = parser_.parse_args()
+
+    for name, values in make_inputs(args.count, args.distinct).items():
+        assert [parse_datetime(v) for v in values[:200]] == [legacy_parse_datetime(v) for v in values[:200]]
+        legacy = rate(lambda vs: [legacy_parse_datetime(v) for v in vs], values)
+        clear_caches()
+        fresh = rate(lambda vs: [parse_datetime(v) for v in vs], values[:args.distinct])
+        clear_caches()
+        repeated = rate(lambda vs: [parse_datetime(v) for v in vs], values)
+        clear_caches()
+        batch = rate(parse_many, values)
+        print(f"{name:>10}: legacy {legacy:>10,.0f}/s | uncached {fresh:>10,.0f}/s"
+              f" | memoized {repeated:>10,.0f}/s | parse_many {batch:>10,.0f}/s"
+              f" | speedup x{repeated / legacy:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark the multi-calendar fan-out against syncing calendars one by one.
+
+Seeds the fake Calendar API with several calendars, then times a cold
+agenda over all of them (full mirror sync of each calendar plus a merged
+page) sequentially and through ``fan_out``. It also pages through the
+merged agenda with ``list_upcoming_events(calendar_ids=['all'])`` and
+checks that every event comes back exactly once, in start-time order.
+Run from the repository root:
+    python -m benchmarks.bench_fanout --calendars 8 --events 300 --latency-ms 50
+"""
+
+import argparse
+import datetime
+import os
+import time
+
+from benchmarks.fake_server import install
+from event_store import EventStore
+from fanout import fan_out, merge_by_start
+
+
+def cold_agenda(service_factory, calendars: list, concurrent: bool, limit: int = 50) -> list:
+    store = EventStore(service_factory)
+    if concurrent:
+        fan_out(store.sync, calendars)
+    else:
+        for calendar_id in calendars:
+            store.sync(calendar_id)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return merge_by_start({c: store.keyed_range(c, time_min=now, limit=limit) for c in calendars}, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calendars', type=int, default=8)
+    parser.add_argument('--events', type=int, default=300, help='events per calendar')
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    calendar_mcp, backend = install(args.events, args.latency_ms, page_size=args.page_size)
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    calendars = ['primary']
+    for i in range(1, args.calendars):
+        calendar_id = f'team{i}@group.calendar.google.com'
+        # Offset each calendar so the merge has to interleave them
+        backend.seed_generated(args.events, calendar_id, start + datetime.timedelta(minutes=7 * i),
+                               spacing_minutes=60 + 10 * i)
+        calendars.append(calendar_id)
+    service_factory = calendar_mcp.get_calendar_service
+
+    timings = {}
+    for concurrent in (False, True):
+        begin = time.perf_counter()
+        page = cold_agenda(service_factory, calendars, concurrent)
+        timings[concurrent] = time.perf_counter() - begin
+        assert [item[:3] for item in page] == sorted(item[:3] for item in page)
+    print(f"{args.calendars} calendars x {args.events} events, {args.latency_ms:.0f} ms per request")
+    print(f"sequential {timings[False] * 1000:8.1f} ms | fan-out {timings[True] * 1000:8.1f} ms"
+          f" | speedup x{timings[False] / timings[True]:.1f}")
+
+    # Cursor paging over the merged agenda returns each upcoming event once, in order
+    seen, cursor, pages = [], None, 0
+    while True:
+        result = calendar_mcp.list_upcoming_events(max_results=25, cursor=cursor, profile='minimal',
+                                                   calendar_ids=['all'])
+        seen.extend((e['start'], e['calendar_id'], e['id']) for e in result['events'])
+        pages += 1
+        cursor = result['next_cursor']
+        if not cursor:
+            break
+    now = time.time()
+    expected = sum(1 for c in calendars for e in backend.calendars[c].values()
+                   if datetime.datetime.fromisoformat(e['end']['dateTime']).timestamp() > now)
+    assert len(seen) == len(set(seen)) == expected, (len(seen), len(set(seen)), expected)
+    print(f"paged {len(seen)} merged events in {pages} pages: no gaps or duplicates")
+
+
+if __name__ == '__main__':
+    main()
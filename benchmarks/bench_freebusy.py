@@ -0,0 +1,82 @@
+"""
+Benchmark the interval index and free-slot sweep against a linear scan.
+
+Run from the repository root:
+    python -m benchmarks.bench_freebusy --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+
+from freebusy import IntervalIndex, free_slots, merge_intervals
+
+HOUR = 3600.0
+
+
+def make_events(n: int, seed: int = 0) -> list:
+    """``n`` meetings of 15 min to 3 h spread over roughly ``n / 4`` days."""
+    rng = random.Random(seed)
+    span = max(n / 4, 1) * 24 * HOUR
+    events = []
+    for i in range(n):
+        start = rng.uniform(0, span)
+        events.append((start, start + rng.choice((0.25, 0.5, 1, 1.5, 3)) * HOUR, str(i)))
+    return events, span
+
+
+def linear_overlapping(events, start, end):
+    return [e for e in events if e[0] < end and e[1] > start]
+
+
+def timed(fn, repeat):
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - begin) / repeat, result
+
+
+def run(n: int, queries: int):
+    events, span = make_events(n)
+    rng = random.Random(1)
+    windows = []
+    for _ in range(queries):
+        start = rng.uniform(0, span)
+        windows.append((start, start + rng.choice((1, 4, 24)) * HOUR))
+
+    build_s, index = timed(lambda: IntervalIndex(events), 1)
+
+    def indexed():
+        return [index.overlapping(s, e) for s, e in windows]
+
+    def linear():
+        return [linear_overlapping(events, s, e) for s, e in windows]
+
+    index_s, found = timed(indexed, 3)
+    linear_s, expected = timed(linear, 1)
+    assert [len(f) for f in found] == [len(e) for e in expected], "index disagrees with linear scan"
+
+    week = (span / 2, span / 2 + 7 * 24 * HOUR)
+    slots_s, slots = timed(lambda: free_slots(index.busy(*week), week[0], week[1], HOUR), 20)
+    naive_s, naive = timed(lambda: free_slots(
+        merge_intervals((max(s, week[0]), min(e, week[1]))
+                        for s, e, _ in linear_overlapping(events, *week)),
+        week[0], week[1], HOUR), 5)
+    assert slots == naive, "free slots disagree with linear scan"
+
+    print(f"{n:>8} events | build {build_s * 1e3:8.2f} ms"
+          f" | overlap query {index_s / queries * 1e6:8.1f} us (linear {linear_s / queries * 1e6:9.1f} us)"
+          f" | week free slots {slots_s * 1e3:6.2f} ms (linear {naive_s * 1e3:7.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark local recurrence expansion against server-side expansion.
+
+Seeds the fake Calendar API with recurring series of many shapes (daily,
+weekday, monthly by weekday, COUNT/UNTIL, EXDATE/RDATE, all-day, zones
+that change to or from DST) and with modified and cancelled instances. It
+checks that the mirror's expansion returns the same instances as
+``singleEvents=True`` over several windows, then compares the size of a
+full pull both ways and the time to answer a window locally versus asking
+the API. Run from the repository root:
+    python -m benchmarks.bench_recurrence --series 200 --latency-ms 50
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+
+from benchmarks.fake_server import install
+from event_store import EventStore
+from listing import MAX_PAGE_SIZE, iter_pages
+
+ZONES = ('Europe/Berlin', 'America/New_York', 'Asia/Karachi', 'Australia/Sydney', 'UTC')
+RULES = ('RRULE:FREQ=DAILY', 'RRULE:FREQ=DAILY;INTERVAL=2', 'RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+         'RRULE:FREQ=WEEKLY;BYDAY=TU,TH;COUNT=40', 'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=FR',
+         'RRULE:FREQ=MONTHLY;BYDAY=1MO', 'RRULE:FREQ=MONTHLY;BYMONTHDAY=15;COUNT=12',
+         'RRULE:FREQ=MONTHLY;BYDAY=-1FR', 'RRULE:FREQ=YEARLY')
+
+
+def make_series(n: int, start: datetime.datetime, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        zone = rng.choice(ZONES)
+        begin = start + datetime.timedelta(days=rng.randint(-120, 30), hours=rng.randint(7, 18))
+        rule = rng.choice(RULES)
+        if 'COUNT' not in rule and rng.random() < 0.3:
+            until = begin + datetime.timedelta(days=rng.randint(30, 400))
+            rule += f";UNTIL={until.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+        recurrence = [rule]
+        if rng.random() < 0.3:
+            skipped = begin + datetime.timedelta(days=7 * rng.randint(1, 8))
+            recurrence.append(f"EXDATE:{skipped.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+        if rng.random() < 0.2:
+            extra = begin + datetime.timedelta(days=rng.randint(1, 60), hours=1)
+            recurrence.append(f"RDATE:{extra.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+        if rng.random() < 0.15:
+            day = begin.date()
+            events.append({'id': f'allday{i}', 'summary': f'All-day series {i}', 'recurrence': recurrence[:1],
+                           'start': {'date': day.isoformat()},
+                           'end': {'date': (day + datetime.timedelta(days=1)).isoformat()}})
+            continue
+        length = datetime.timedelta(minutes=rng.choice((15, 30, 60, 90)))
+        events.append({'id': f'series{i}', 'summary': f'Series {i}', 'recurrence': recurrence,
+                       'start': {'dateTime': begin.isoformat(), 'timeZone': zone},
+                       'end': {'dateTime': (begin + length).isoformat(), 'timeZone': zone}})
+    return events
+
+
+def add_exceptions(backend, count: int, window: tuple, seed: int = 1, calendar_id: str = 'primary'):
+    """Move or cancel ``count`` random instances through the fake API."""
+    rng = random.Random(seed)
+    service = backend.client()
+    events = service.events()
+    instances = [e for page in iter_pages(service, calendar_id, None, MAX_PAGE_SIZE, singleEvents=True,
+                                          timeMin=window[0].isoformat(), timeMax=window[1].isoformat())
+                 for e in page.get('items', []) if e.get('recurringEventId')]
+    for event in rng.sample(instances, min(count, len(instances))):
+        if rng.random() < 0.5:
+            events.delete(calendarId=calendar_id, eventId=event['id']).execute()
+        else:
+            events.patch(calendarId=calendar_id, eventId=event['id'],
+                         body={'summary': event['summary'] + ' (moved)', 'location': 'Elsewhere'}).execute()
+
+
+def server_window(service, time_min: datetime.datetime, time_max: datetime.datetime) -> list:
+    items = []
+    for page in iter_pages(service, 'primary', 'id,start,end,summary,status', MAX_PAGE_SIZE,
+                           singleEvents=True, orderBy='startTime', timeMin=time_min.isoformat(),
+                           timeMax=time_max.isoformat()):
+        items.extend(page.get('items', []))
+    return items
+
+
+def keys(events: list) -> list:
+    def ts(when):
+        return datetime.datetime.fromisoformat(when.get('dateTime') or when['date']).timestamp() \
+            if when.get('dateTime') else when['date']
+    return sorted((e['id'], str(ts(e['start'])), e.get('summary')) for e in events)
+
+
+def pull_bytes(service, **params) -> tuple:
+    pages = list(iter_pages(service, 'primary', None, MAX_PAGE_SIZE, **params))
+    items = [item for page in pages for item in page.get('items', [])]
+    return len(items), len(json.dumps(items)), len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', type=int, default=200)
+    parser.add_argument('--exceptions', type=int, default=60)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--page-size', type=int, default=250)
+    args = parser.parse_args()
+
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    calendar_mcp, backend = install(0, 0.0, page_size=args.page_size)
+    now = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    backend.seed(make_series(args.series, now))
+    add_exceptions(backend, args.exceptions, (now, now + datetime.timedelta(days=90)))
+    service = calendar_mcp.get_calendar_service()
+    store = EventStore(calendar_mcp.get_calendar_service)
+    store.sync('primary')
+
+    windows = [(now, now + datetime.timedelta(days=1)), (now, now + datetime.timedelta(days=7)),
+               (now - datetime.timedelta(days=60), now + datetime.timedelta(days=30)),
+               (now, now + datetime.timedelta(days=365))]
+    # Correctness: same instance IDs, starts and titles as the server's expansion
+    for time_min, time_max in windows:
+        local = keys(store.range('primary', time_min, time_max))
+        remote = keys(server_window(service, time_min, time_max))
+        assert local == remote, f"expansion differs in {time_min:%Y-%m-%d}..{time_max:%Y-%m-%d}: " \
+                                f"{sorted(set(local) ^ set(remote))[:5]}"
+    print(f"{args.series} series, {args.exceptions} exceptions: local expansion matches singleEvents=True "
+          f"in {len(windows)} windows")
+
+    year = windows[-1]
+    masters = pull_bytes(service)
+    expanded = pull_bytes(service, singleEvents=True, timeMin=year[0].isoformat(), timeMax=year[1].isoformat())
+    print(f"full pull, unexpanded: {masters[0]:6} items {masters[1] / 1024:8.1f} KiB {masters[2]:3} pages")
+    print(f"one year, expanded:    {expanded[0]:6} items {expanded[1] / 1024:8.1f} KiB {expanded[2]:3} pages")
+
+    backend.latency = args.latency_ms / 1000
+    print(f"window        local (cold)   local (warm)   server ({args.latency_ms:.0f} ms per request)")
+    for time_min, time_max in windows:
+        cold = EventStore(calendar_mcp.get_calendar_service, store.backend)
+        begin = time.perf_counter()
+        cold.range('primary', time_min, time_max)
+        cold_s = time.perf_counter() - begin
+        begin = time.perf_counter()
+        cold.range('primary', time_min, time_max)
+        warm_s = time.perf_counter() - begin
+        begin = time.perf_counter()
+        server_window(service, time_min, time_max)
+        server_s = time.perf_counter() - begin
+        days = (time_max - time_min).days
+        print(f"{days:4} days    {cold_s * 1000:9.2f} ms   {warm_s * 1000:9.2f} ms   {server_s * 1000:9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark the search index against scanning every event.
+
+The scan tokenizes each event per query, as a search without an index
+would; both must return the same matches. Run from the repository root:
+    python -m benchmarks.bench_search --sizes 1000 10000 50000
+"""
+
+import argparse
+import random
+import time
+
+from search import SearchIndex, event_fields, parse_query
+
+WORDS = ('design review planning standup retro budget roadmap sync interview onboarding '
+         'launch demo hiring offsite quarterly customer partner security incident training').split()
+PEOPLE = ('alice bob carol dave erin frank grace heidi ivan judy').split()
+ROOMS = ('Room 1', 'Room 2', 'Atlas', 'Boardroom', 'Cafe', 'Zoom')
+QUERIES = ('design', 'budget review', '"design review"', 'with:alice', 'plan* -retro',
+           'location:cafe with:bob', 'summary:standup -with:carol', 'sec* incident')
+
+
+def make_events(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        attendees = [{'email': f'{p}@example.com', 'displayName': p.title()}
+                     for p in rng.sample(PEOPLE, rng.randint(0, 4))]
+        events.append({'id': f'e{i}', 'summary': ' '.join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+                       'description': ' '.join(rng.choices(WORDS, k=rng.randint(0, 12))),
+                       'location': rng.choice(ROOMS), 'attendees': attendees})
+    return events
+
+
+def linear_search(events: list, query) -> set:
+    found = set()
+    for event in events:
+        fields = event_fields(event)
+        if all(_matches(fields, t) != t.negate for t in query.terms):
+            found.add(event['id'])
+    return found
+
+
+def _matches(fields: dict, term) -> bool:
+    for field in ((term.field,) if term.field else fields):
+        tokens = fields[field]
+        n = len(term.tokens)
+        for i in range(len(tokens) - n + 1):
+            window = tokens[i:i + n]
+            if window[:-1] == term.tokens[:-1] and (
+                    window[-1].startswith(term.tokens[-1]) if term.prefix else window[-1] == term.tokens[-1]):
+                return True
+    return False
+
+
+def timed(fn, repeat):
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - begin) / repeat, result
+
+
+def run(n: int):
+    events = make_events(n)
+    index = SearchIndex()
+    build_s, _ = timed(lambda: [index.on_upsert('primary', e, float(i), float(i) + 3600)
+                                for i, e in enumerate(events)], 1)
+    queries = [parse_query(q) for q in QUERIES]
+    index_s, found = timed(lambda: [index.search(q, limit=10) for q in queries], 3)
+    linear_s, expected = timed(lambda: [linear_search(events, q) for q in queries], 1)
+    for query, (matches, total), ids in zip(QUERIES, found, expected):
+        assert total == len(ids), f"index disagrees with scan on {query!r}: {total} vs {len(ids)}"
+        assert {m.event_id for m in matches} <= ids
+    per_query = len(queries)
+    print(f"{n:>7} events | build {build_s * 1e3:8.1f} ms | {index.stats()['terms']:>4} terms"
+          f" | ranked query {index_s / per_query * 1e3:7.2f} ms (scan {linear_s / per_query * 1e3:8.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark cold start of the stdio server.
+
+Each run starts ``benchmarks.fake_server`` as a fresh stdio process, as
+Claude Desktop does for every session, and records the time until the MCP
+``initialize`` handshake completes and until the first
+``list_upcoming_events`` result arrives, with and without the background
+warm start (``WARM_START``), from an empty in-memory mirror and from an
+on-disk mirror holding ``--mirror-events`` events (whose indexes must not
+be built before the handshake). ``--think-ms`` waits between the two, like
+a client reading the tool list before its first call. Separately, it times
+importing ``calendar_mcp`` with each mirror and the first Calendar client
+build (Google libraries, discovery document, token load), which the warm
+start moves off the first tool call. Run from the repository root:
+    python -m benchmarks.bench_startup --runs 5 --latency-ms 100 --think-ms 500 --mirror-events 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Timed in a fresh interpreter: the server module, then the first client build
+# from an unexpired token (no network access needed)
+CLIENT_BUILD = """
+import sys, time
+begin = time.perf_counter()
+import calendar_mcp
+imported = time.perf_counter()
+from calendar_service import CalendarServiceManager
+CalendarServiceManager(sys.argv[1], calendar_mcp.SCOPES).get_service()
+print(imported - begin, time.perf_counter() - imported)
+"""
+
+# Run once with EVENT_STORE_PATH set to a file: seed the fake and sync it into the mirror
+POPULATE = """
+import sys
+from benchmarks.fake_server import install
+calendar_mcp, backend = install(int(sys.argv[1]), page_size=2500)
+calendar_mcp.default_tenant.event_store.sync('primary')
+"""
+
+
+def populate(path: str, events: int):
+    """Write an on-disk mirror of ``events`` fake events to ``path``."""
+    subprocess.run([sys.executable, '-c', POPULATE, str(events)], cwd=REPO_ROOT,
+                   env=dict(os.environ, EVENT_STORE_PATH=path), capture_output=True, check=True)
+
+
+async def session_start(args, warm_start: bool, store_path: str = ':memory:') -> tuple:
+    """Spawn the server; return (seconds to initialize, seconds to first tool result)."""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    env = dict(os.environ, EVENT_STORE_PATH=store_path, WARM_START=str(int(warm_start)))
+    params = StdioServerParameters(command=sys.executable, cwd=REPO_ROOT, env=env,
+                                   args=['-m', 'benchmarks.fake_server', '--events', str(args.events),
+                                         '--latency-ms', str(args.latency_ms)])
+    begin = time.perf_counter()
+    with open(os.devnull, 'w') as server_log:
+        async with stdio_client(params, errlog=server_log) as streams, ClientSession(*streams) as session:
+            await session.initialize()
+            initialized = time.perf_counter()
+            await asyncio.sleep(args.think_ms / 1000)
+            thought = time.perf_counter()
+            result = await session.call_tool('list_upcoming_events', {'max_results': 10, 'profile': 'minimal'})
+            if result.isError:
+                raise RuntimeError(f"first tool call failed: {result.content[0].text}")
+            return initialized - begin, time.perf_counter() - thought
+
+
+def client_build(runs: int, store_path: str = ':memory:') -> tuple:
+    """Median (import seconds, first client build seconds) over fresh interpreters."""
+    token = {'token': 'bench', 'refresh_token': 'bench', 'client_id': 'bench', 'client_secret': 'bench',
+             'expiry': '2099-01-01T00:00:00Z'}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'token.json')
+        with open(path, 'w') as f:
+            json.dump(token, f)
+        env = dict(os.environ, EVENT_STORE_PATH=store_path)
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, '-c', CLIENT_BUILD, path], cwd=REPO_ROOT, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            samples.append(tuple(float(x) for x in out.split()))
+    return statistics.median(s[0] for s in samples), statistics.median(s[1] for s in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--think-ms', type=float, default=500.0)
+    parser.add_argument('--mirror-events', type=int, default=20000, help='events in the on-disk mirror')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events.db')
+        populate(path, args.mirror_events)
+        mirrors = {'empty': ':memory:', f'{args.mirror_events} events': path}
+        for name, store_path in mirrors.items():
+            imported, built = client_build(args.runs, store_path)
+            print(f"mirror {name:<13} import calendar_mcp {imported * 1000:8.1f} ms | "
+                  f"first client build {built * 1000:8.1f} ms")
+        print(f"{'mirror':<13} {'warm start':<10} {'initialize ms':>14} {'first tool ms':>14}   "
+              f"(after {args.think_ms:.0f} ms think time, {args.latency_ms:.0f} ms API latency)")
+        for name, store_path in mirrors.items():
+            for warm_start in (False, True):
+                samples = [asyncio.run(session_start(args, warm_start, store_path)) for _ in range(args.runs)]
+                init_s = statistics.median(s[0] for s in samples)
+                tool_s = statistics.median(s[1] for s in samples)
+                print(f"{name:<13} {'on' if warm_start else 'off':<10} {init_s * 1000:>14.1f} "
+                      f"{tool_s * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
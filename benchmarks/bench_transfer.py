@@ -0,0 +1,109 @@
+"""
+Benchmark bulk export and import of events.
+
+Seeds the fake Calendar API with a calendar of one-off meetings and
+recurring series with moved and cancelled occurrences, exports it to JSONL and ICS, and imports each file into
+an empty calendar through batched ``events().import_`` calls. Reports
+throughput, API round trips and working memory for growing calendar
+sizes, the round trips and time one
+``add_new_event`` per event would take at the same latency, and checks that
+each import reproduces the source calendar and that importing again sends
+nothing. Run from the repository root:
+    python -m benchmarks.bench_transfer --events 20000 --latency-ms 50
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_recurrence import add_exceptions, make_series
+from benchmarks.fake_server import install
+from event_store import event_bounds
+from transfer import IMPORT_BATCH_SIZE, export_file, import_file
+
+
+def contents(backend, calendar_id: str) -> dict:
+    """Comparable view of a fake calendar: (iCalUID, original start) -> fields and bounds.
+
+    A cancelled occurrence is compared by its status and times only; Google
+    lists nothing else of it.
+    """
+    keep = ('summary', 'description', 'location', 'recurrence', 'status')
+    return {(e['iCalUID'], event_bounds({'start': e['originalStartTime']})[0] if e.get('originalStartTime') else None):
+            ({k: e.get(k) for k in (('status',) if e.get('status') == 'cancelled' else keep)}, event_bounds(e))
+            for e in backend.calendars[calendar_id].values()}
+
+
+def timed(fn, *args, **kwargs) -> tuple:
+    """(result, seconds) of one call."""
+    begin = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - begin
+
+
+def working_memory(fn, *args, **kwargs) -> int:
+    """tracemalloc peak of one call less what it left allocated (the events the fake now stores)."""
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000, help='events in the largest calendar')
+    parser.add_argument('--steps', type=int, default=3, help='calendar sizes tried, up to --events')
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    calendar_mcp, backend = install(0, page_size=2500)
+    tenant = calendar_mcp.default_tenant
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    latency = args.latency_ms / 1000
+    print(f"{args.latency_ms:.0f} ms per request, {IMPORT_BATCH_SIZE} imports per batch round")
+    print(f"{'events':>7} {'format':<6} {'export s':>9} {'exp KiB':>8} {'import s':>9} {'events/s':>9} "
+          f"{'API calls':>9} {'imp KiB':>8} {'file KiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for step in range(1, args.steps + 1):
+            count = args.events * step // args.steps
+            source = f'source{step}'
+            backend.calendars[source] = {}
+            backend.seed_generated(count - count // 50, source, start, spacing_minutes=30)
+            backend.seed(make_series(count // 50, start, seed=step), source)
+            add_exceptions(backend, count // 100, (start - datetime.timedelta(days=120),
+                                                   start + datetime.timedelta(days=60)), step, source)
+            cancelled = sum(e.get('status') == 'cancelled' for e in backend.calendars[source].values())
+            assert cancelled, 'no cancelled occurrence to round-trip'
+            expected = contents(backend, source)
+            for fmt in ('jsonl', 'ics'):
+                path = os.path.join(tmp, f'{source}.{fmt}')
+                target = f'{source}-{fmt}'
+                backend.calendars[target] = {}
+                backend.latency = latency
+                exported, export_s = timed(export_file, tenant.get_service(), source, path)
+                calls = backend.calls
+                result, import_s = timed(import_file, tenant.get_service, target, path,
+                                         scheduler=tenant.scheduler)
+                calls = backend.calls - calls
+                backend.latency = 0.0
+                export_peak = working_memory(export_file, tenant.get_service(), source, path)
+                backend.calendars['scratch'] = {}
+                import_peak = working_memory(import_file, tenant.get_service, 'scratch', path)
+                assert result['imported'] == exported['events'] and not result['failed'], result
+                assert contents(backend, target) == expected, f"{fmt} import differs from the source"
+                again = import_file(tenant.get_service, target, path, existing=set(expected))
+                assert again['imported'] == 0 and again['existing'] == exported['events'], again
+                print(f"{count:>7} {fmt:<6} {export_s:>9.2f} {export_peak / 1024:>8.0f} {import_s:>9.2f} "
+                      f"{result['imported'] / import_s:>9.0f} {calls:>9} {import_peak / 1024:>8.0f} "
+                      f"{exported['bytes'] / 1024:>9.0f}")
+    print(f"one add_new_event per event: {args.events} API calls, "
+          f"~{args.events * latency / 60:.1f} min at {args.latency_ms:.0f} ms each")
+
+
+if __name__ == '__main__':
+    main()
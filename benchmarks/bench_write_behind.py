@@ -0,0 +1,99 @@
+"""
+Benchmark the write-behind queue against writing each edit through.
+
+An agent reschedules events the chatty way: several ``update_event`` calls
+per event (title, then time, then location, then description). With the
+queue off every call is one ``events().patch``; with it on the calls are
+answered from the mirror and each event's edits go out as one merged patch.
+Reports tool latency, API calls and patch payload bytes, and checks that
+Google ends up with the same events either way. Run from the repository root:
+    python -m benchmarks.bench_write_behind --events 50 --latency-ms 80
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import time
+
+from benchmarks.fake_server import install
+
+
+def edits(event_id: str, start: datetime.datetime, i: int) -> list:
+    moved = start + datetime.timedelta(days=1, hours=i % 5)
+    return [{'event_id': event_id, 'new_summary': f'Rescheduled {i}'},
+            {'event_id': event_id, 'new_start': moved.isoformat(),
+             'new_end': (moved + datetime.timedelta(minutes=45)).isoformat()},
+            {'event_id': event_id, 'new_location': f'Room {i % 7}'},
+            {'event_id': event_id, 'new_description': f'Moved by the agent ({i})'}]
+
+
+def run(calendar_mcp, backend, event_ids: list, start: datetime.datetime, delay: float) -> dict:
+    tenant = calendar_mcp.default_tenant
+    tenant.write_queue.delay = delay
+    calls_before = backend.calls
+    latencies = []
+    begin = time.perf_counter()
+    for i, event_id in enumerate(event_ids):
+        for kwargs in edits(event_id, start, i):
+            call = time.perf_counter()
+            calendar_mcp.update_event(timezone='UTC', profile='minimal', **kwargs)
+            latencies.append(time.perf_counter() - call)
+    tenant.write_queue.flush()
+    wall = time.perf_counter() - begin
+    sent, backend.patch_bytes = backend.patch_bytes, 0
+    return {'calls': backend.calls - calls_before, 'bytes': sent, 'wall': wall,
+            'p50': statistics.median(latencies), 'max': max(latencies)}
+
+
+def snapshot(backend, event_ids: list) -> list:
+    events = backend.client().events()
+    keep = ('summary', 'location', 'description', 'start', 'end')
+    return [{k: e.get(k) for k in keep}
+            for e in (events.get(calendarId='primary', eventId=i).execute() for i in event_ids)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=50, help='events edited (4 edits each)')
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    parser.add_argument('--delay', type=float, default=2.0, help='WRITE_BEHIND_DELAY for the queued run')
+    args = parser.parse_args()
+
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    calendar_mcp, backend = install(args.events * 2, 0.0)
+    # Measure what the patches carry
+    events_type = type(backend.client().events())
+    plain_patch = events_type.patch
+    backend.patch_bytes = 0
+
+    def measured_patch(self, calendarId, eventId, body, **kwargs):
+        backend.patch_bytes += len(json.dumps(body))
+        return plain_patch(self, calendarId, eventId, body, **kwargs)
+    events_type.patch = measured_patch
+
+    store = calendar_mcp.default_tenant.event_store
+    store.sync('primary')
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    events = store.range('primary', start - datetime.timedelta(days=1))
+    half = args.events
+    through_ids = [e['id'] for e in events[:half]]
+    behind_ids = [e['id'] for e in events[half:2 * half]]
+    backend.latency = args.latency_ms / 1000
+
+    through = run(calendar_mcp, backend, through_ids, start, 0.0)
+    behind = run(calendar_mcp, backend, behind_ids, start, args.delay)
+    backend.latency = 0.0
+    assert snapshot(backend, through_ids) == snapshot(backend, behind_ids), "queued edits diverged"
+    stats = calendar_mcp.default_tenant.write_queue.stats()
+    print(f"{args.events} events x 4 edits, {args.latency_ms:.0f} ms per request; final events identical")
+    print(f"{'mode':<14} {'API calls':>9} {'patch bytes':>11} {'p50 ms':>8} {'max ms':>8} {'total s':>8}")
+    for name, r in (('write-through', through), ('write-behind', behind)):
+        print(f"{name:<14} {r['calls']:>9} {r['bytes']:>11} {r['p50'] * 1000:>8.2f} "
+              f"{r['max'] * 1000:>8.2f} {r['wall']:>8.2f}")
+    print(f"queue: {stats['queued']} edits queued, {stats['coalesced']} coalesced, {stats['patches']} patches sent")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,623 @@
+"""
+In-process stand-in for the Google Calendar v3 client.
+
+Mimics the ``service.<collection>().<method>(...).execute()`` shape of
+``googleapiclient`` and the v3 JSON resources for the calls this server
+makes, with injectable latency, errors and page sizes, so tools and
+benchmarks run without network access.
+"""
+
+import copy
+import datetime
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import httplib2
+from dateutil.rrule import rruleset, rrulestr
+from googleapiclient.errors import HttpError
+
+from date_parsing import get_zone
+from scheduler import retry_safe, scheduler
+from telemetry import telemetry
+
+
+def http_error(status: int, reason: str = '') -> HttpError:
+    """An ``HttpError`` shaped like the ones googleapiclient raises."""
+    resp = httplib2.Response({'status': status})
+    resp.reason = reason
+    body = json.dumps({'error': {'code': status, 'message': reason,
+                                 'errors': [{'reason': reason}]}}).encode()
+    return HttpError(resp, body)
+
+
+def _ts(when: dict, time_zone: str = 'UTC') -> float:
+    if when.get('dateTime'):
+        return datetime.datetime.fromisoformat(when['dateTime']).timestamp()
+    return datetime.datetime.fromisoformat(when['date']).replace(
+        tzinfo=get_zone(time_zone)).timestamp()
+
+
+def push_headers(channel: dict, state: str = 'exists') -> dict:
+    """Headers of a push notification for a channel recorded by the fake."""
+    return {'X-Goog-Channel-ID': channel['id'], 'X-Goog-Channel-Token': channel.get('token', ''),
+            'X-Goog-Channel-Expiration': channel['expiration'], 'X-Goog-Resource-ID': channel['resourceId'],
+            'X-Goog-Resource-URI': channel['resourceUri'], 'X-Goog-Resource-State': state,
+            'X-Goog-Message-Number': str(channel['messages'])}
+
+
+def _search_text(event: dict) -> str:
+    people = [*(event.get('attendees') or []), event.get('organizer') or {}]
+    return ' '.join([event.get('summary', ''), event.get('description', ''), event.get('location', ''),
+                     *(f"{p.get('displayName', '')} {p.get('email', '')}" for p in people)]).lower()
+
+
+def _listed(event: dict) -> dict:
+    """An event as list() returns it: like Google, a cancelled occurrence keeps only its identity."""
+    if event.get('status') == 'cancelled' and event.get('recurringEventId'):
+        return {k: copy.deepcopy(event[k]) for k in ('kind', 'etag', 'id', 'status', 'updated',
+                                                      'recurringEventId', 'originalStartTime') if k in event}
+    return copy.deepcopy(event)
+
+
+def _rfc3339(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+# ----------------------------
+# Server-side recurrence, written apart from recurrence.py so it can check it
+# ----------------------------
+# How far singleEvents=True expands a never-ending series without timeMax
+EXPANSION_DAYS = 730
+
+
+def _expand(master: dict, time_zone: str, lo: float, hi: float) -> list:
+    """Instances of a recurring ``master`` overlapping [lo, hi), as singleEvents=True returns them."""
+    start, end = master['start'], master['end']
+    all_day = not start.get('dateTime')
+    zone = get_zone(start.get('timeZone') or time_zone)
+    if all_day:
+        first = datetime.datetime.fromisoformat(start['date']).replace(tzinfo=zone)
+        length = datetime.datetime.fromisoformat(end['date']).replace(tzinfo=zone) - first
+    else:
+        first = datetime.datetime.fromisoformat(start['dateTime']).astimezone(zone)
+        length = datetime.datetime.fromisoformat(end['dateTime']).astimezone(zone) - first
+    rules = rruleset()
+    for line in master['recurrence']:
+        head, _, value = line.partition(':')
+        name, *params = head.upper().split(';')
+        params = dict(p.split('=', 1) for p in params)
+        if name == 'RRULE':
+            parts = []
+            for part in value.split(';'):
+                key, _, val = part.partition('=')
+                if key.upper() == 'UNTIL' and not val.upper().endswith('Z'):
+                    local = datetime.datetime.strptime((val + 'T235959')[:15], '%Y%m%dT%H%M%S')
+                    val = local.replace(tzinfo=zone).astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+                parts.append(f'{key}={val}')
+            rules.rrule(rrulestr(';'.join(parts), dtstart=first))
+        elif name in ('RDATE', 'EXDATE'):
+            for item in value.split(','):
+                if len(item) == 8:
+                    dt = datetime.datetime.combine(datetime.date(int(item[:4]), int(item[4:6]), int(item[6:])),
+                                                   first.timetz().replace(tzinfo=None), zone)
+                else:
+                    dt = datetime.datetime.strptime(item[:15], '%Y%m%dT%H%M%S').replace(
+                        tzinfo=datetime.timezone.utc if item.endswith('Z') else get_zone(params.get('TZID', zone.key)))
+                (rules.rdate if name == 'RDATE' else rules.exdate)(dt)
+    if not any(line.upper().startswith('RRULE') for line in master['recurrence']):
+        rules.rdate(first)
+    instances = []
+    for original in rules.between(datetime.datetime.fromtimestamp(lo, zone) - length,
+                                  datetime.datetime.fromtimestamp(hi, zone), inc=True):
+        finish = original + length
+        if finish.timestamp() <= lo or original.timestamp() >= hi:
+            continue
+        event = {k: v for k, v in master.items() if k != 'recurrence'}
+        event['recurringEventId'] = master['id']
+        if all_day:
+            event['id'] = f"{master['id']}_{original.strftime('%Y%m%d')}"
+            event['start'] = {'date': original.date().isoformat()}
+            event['end'] = {'date': finish.date().isoformat()}
+        else:
+            utc = original.astimezone(datetime.timezone.utc)
+            event['id'] = f"{master['id']}_{utc.strftime('%Y%m%dT%H%M%SZ')}"
+            event['start'] = dict(master['start'], dateTime=original.isoformat())
+            event['end'] = dict(master['end'], dateTime=finish.isoformat())
+        event['originalStartTime'] = dict(event['start'])
+        instances.append(event)
+    return instances
+
+
+class FakeRequest:
+    """Deferred call; ``execute()`` applies latency/error injection first.
+
+    Like the service manager's ``ScheduledRequest``, execute() goes through
+    the request scheduler and reports each attempt to telemetry.
+    """
+
+    def __init__(self, backend, fn, method_id, method='GET', body=None):
+        self._backend = backend
+        self._fn = fn
+        self.methodId = method_id
+        self.method = method
+        self.body = body
+        self.headers = {}
+
+    def execute(self, num_retries=0):
+        return scheduler.run(self.methodId, self._attempt, retry_safe(self.methodId, self.method, self.body),
+                             recover=self._recover)
+
+    def _attempt(self):
+        with telemetry.api_call(self.methodId):
+            self._backend.before_call()
+            return self._backend.inject(self._fn, self.headers)
+
+    def _recover(self, error):
+        if self.method == 'DELETE':
+            return ''
+        # The retried insert answered 409: return the event the lost attempt created
+        with self._backend._lock:
+            return copy.deepcopy(next(cal[self.body['id']] for cal in self._backend.calendars.values()
+                                      if self.body['id'] in cal))
+
+
+class FakeBatch:
+    """``BatchHttpRequest`` stand-in: one latency roll per batch, one error roll per sub-request."""
+
+    def __init__(self, backend, callback=None):
+        self._backend = backend
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request_id or str(len(self._requests)), request, callback))
+
+    def execute(self):
+        self._backend.before_call()
+        for request_id, request, callback in self._requests:
+            response, exception = None, None
+            try:
+                response = self._backend.inject(request._fn, request.headers)
+            except HttpError as e:
+                exception = e
+            for cb in (callback, self._callback):
+                if cb is not None:
+                    cb(request_id, response, exception)
+
+
+class FakeCalendarBackend:
+    """State shared by every fake client: calendars, events and the change log.
+
+    ``latency`` (seconds) is slept on every execute(); ``error_rate`` makes that
+    fraction of calls fail with ``error_status`` (403/429 answer
+    rateLimitExceeded). ``lost_response_rate`` is the share of those failures
+    that happen after the call was applied, as when a response is lost in
+    transit. ``page_size`` caps list pages.
+
+    ``events().watch`` channels are recorded; ``push(calendar_id)`` POSTs a
+    change notification to each channel watching that calendar, like Google
+    does, and ``auto_push`` sends one shortly after every change.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, page_size: int = 250, time_zone: str = 'UTC',
+                 seed: int = 0, lost_response_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lost_response_rate = lost_response_rate
+        self.page_size = page_size
+        self.time_zone = time_zone
+        self.calendars = {'primary': {}}
+        self.changes = []           # (seq, calendar_id, event_id)
+        self.min_sync_seq = 0       # sync tokens older than this answer 410 Gone
+        self.calls = 0
+        self.uids = {}              # (calendar id, iCalUID) -> IDs of events that had it
+        self.channels = {}          # channel id -> watch request body + calendar and message number
+        self.auto_push = False
+        self.pushes = 0
+        self._push_timers = {}
+        self._seq = itertools.count(1)
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+
+    def before_call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def inject(self, fn, headers):
+        """Run one call, failing it before or after it takes effect per the error rates."""
+        with self._lock:
+            fail = self.error_rate and self._random.random() < self.error_rate
+            after = fail and self._random.random() < self.lost_response_rate
+        reason = 'rateLimitExceeded' if self.error_status in (403, 429) else 'backendError'
+        if fail and not after:
+            raise http_error(self.error_status, reason)
+        result = fn(headers)
+        if after:
+            raise http_error(self.error_status, reason)
+        return result
+
+    def touch(self, calendar_id: str, event: dict):
+        seq = next(self._seq)
+        self.uids.setdefault((calendar_id, event.get('iCalUID')), set()).add(event['id'])
+        event['etag'] = f'"{seq}"'
+        event['updated'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.changes.append((seq, calendar_id, event['id']))
+        if self.auto_push and calendar_id not in self._push_timers:
+            # Coalesce a burst of changes into one push, as Google does
+            timer = self._push_timers[calendar_id] = threading.Timer(0.05, self._auto_push, (calendar_id,))
+            timer.daemon = True
+            timer.start()
+
+    def _auto_push(self, calendar_id: str):
+        with self._lock:
+            self._push_timers.pop(calendar_id, None)
+        self.push(calendar_id)
+
+    def push(self, calendar_id: str = 'primary', state: str = 'exists') -> list:
+        """POST a notification to every channel watching ``calendar_id``; returns the statuses."""
+        with self._lock:
+            channels = [c for c in self.channels.values() if c['calendar_id'] == calendar_id]
+            for channel in channels:
+                channel['messages'] += 1
+            requests = [(c['address'], push_headers(c, state)) for c in channels]
+        statuses = []
+        for address, headers in requests:
+            request = urllib.request.Request(address, data=b'', headers=headers, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    statuses.append(response.status)
+            except urllib.error.HTTPError as e:
+                statuses.append(e.code)
+            except OSError:
+                statuses.append(None)
+            self.pushes += 1
+        return statuses
+
+    def seed(self, events, calendar_id: str = 'primary'):
+        """Insert events directly (no latency, no errors); returns their IDs."""
+        ids = []
+        with self._lock:
+            cal = self.calendars.setdefault(calendar_id, {})
+            for event in events:
+                event = copy.deepcopy(event)
+                event.setdefault('id', uuid.uuid4().hex)
+                event.setdefault('status', 'confirmed')
+                event.setdefault('iCalUID', event['id'] + '@google.com')
+                cal[event['id']] = event
+                self.touch(calendar_id, event)
+                ids.append(event['id'])
+        return ids
+
+    def seed_generated(self, count: int, calendar_id: str = 'primary', start: datetime.datetime = None,
+                       spacing_minutes: int = 90):
+        """Seed ``count`` one-hour meetings, one every ``spacing_minutes``."""
+        start = start or datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        events = []
+        for i in range(count):
+            begin = start + datetime.timedelta(minutes=spacing_minutes * i)
+            events.append({
+                'summary': f'Meeting {i}',
+                'description': f'Generated event {i}',
+                'location': f'Room {i % 12}',
+                'start': {'dateTime': begin.isoformat(), 'timeZone': self.time_zone},
+                'end': {'dateTime': (begin + datetime.timedelta(hours=1)).isoformat(),
+                        'timeZone': self.time_zone},
+            })
+        return self.seed(events, calendar_id)
+
+    def instances(self, calendar_id: str, master: dict, lo: float = None, hi: float = None) -> list:
+        """Instances of ``master`` in [lo, hi) that no exception replaces."""
+        hi = max(lo or 0, time.time()) + EXPANSION_DAYS * 86400 if hi is None else hi
+        lo = 0.0 if lo is None else lo
+        overridden = {_ts(e['originalStartTime'], self.time_zone) for e in self.calendars[calendar_id].values()
+                      if e.get('recurringEventId') == master['id'] and e.get('originalStartTime')}
+        return [e for e in _expand(master, self.time_zone, lo, hi)
+                if _ts(e['originalStartTime'], self.time_zone) not in overridden]
+
+    def instance(self, calendar_id: str, event_id: str):
+        """The unmodified instance ``event_id`` of a recurring event, or None."""
+        master_id, _, suffix = event_id.rpartition('_')
+        master = self.calendars.get(calendar_id, {}).get(master_id)
+        if not master or not master.get('recurrence') or master.get('status') == 'cancelled':
+            return None
+        try:
+            day = datetime.datetime.strptime(suffix[:8], '%Y%m%d').replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            return None
+        around = [e for e in self.instances(calendar_id, master, day.timestamp() - 2 * 86400,
+                                            day.timestamp() + 3 * 86400) if e['id'] == event_id]
+        return around[0] if around else None
+
+    def invalidate_sync_tokens(self):
+        """Make every outstanding sync token answer 410 Gone."""
+        with self._lock:
+            self.min_sync_seq = next(self._seq)
+
+    def client(self) -> 'FakeCalendarService':
+        return FakeCalendarService(self)
+
+
+class _Events:
+    def __init__(self, backend: FakeCalendarBackend):
+        self.b = backend
+
+    def _cal(self, calendar_id):
+        try:
+            return self.b.calendars[calendar_id]
+        except KeyError:
+            raise http_error(404, 'notFound')
+
+    def _live(self, calendar_id, event_id, materialize=False):
+        """A live event; an untouched recurring instance becomes an exception with ``materialize``."""
+        cal = self._cal(calendar_id)
+        event = cal.get(event_id)
+        if event is None:
+            event = self.b.instance(calendar_id, event_id)
+            if event is not None and materialize:
+                cal[event_id] = event
+        if event is None or event.get('status') == 'cancelled':
+            raise http_error(404, 'notFound')
+        return event
+
+    def list(self, calendarId, timeMin=None, timeMax=None, maxResults=None,
+             singleEvents=False, orderBy=None, syncToken=None, pageToken=None,
+             q=None, showDeleted=False, iCalUID=None, fields=None, **kwargs):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                cal = self._cal(calendarId)
+                if syncToken:
+                    if int(syncToken) < b.min_sync_seq:
+                        raise http_error(410, 'fullSyncRequired')
+                    ids = dict.fromkeys(eid for seq, cid, eid in b.changes
+                                        if cid == calendarId and seq > int(syncToken))
+                    items = [cal[eid] for eid in ids if eid in cal]
+                else:
+                    # Cancelled instances are listed unless recurring events are expanded
+                    items = [e for e in cal.values()
+                             if showDeleted or e.get('status') != 'cancelled'
+                             or (e.get('recurringEventId') and not singleEvents)]
+                lo = datetime.datetime.fromisoformat(timeMin).timestamp() if timeMin else None
+                hi = datetime.datetime.fromisoformat(timeMax).timestamp() if timeMax else None
+                if singleEvents:
+                    items = [instance for e in items
+                             for instance in (b.instances(calendarId, e, lo, hi)
+                                              if e.get('recurrence') and e.get('status') != 'cancelled' else [e])]
+                if lo is not None or hi is not None:
+                    # A recurring event matches if one of its instances does
+                    items = [e for e in items
+                             if (b.instances(calendarId, e, lo, hi) if e.get('recurrence') else
+                                 (lo is None or _ts(e['end'], b.time_zone) > lo)
+                                 and (hi is None or _ts(e['start'], b.time_zone) < hi))]
+                if q:
+                    # Like Google: every word must occur in some text field or attendee
+                    words = q.lower().split()
+                    items = [e for e in items if all(w in _search_text(e) for w in words)]
+                if iCalUID:
+                    items = [e for e in items if e.get('iCalUID') == iCalUID]
+                if orderBy == 'startTime':
+                    items.sort(key=lambda e: _ts(e['start'], b.time_zone))
+                size = min(maxResults or b.page_size, b.page_size)
+                offset = int(pageToken or 0)
+                response = {'kind': 'calendar#events', 'timeZone': b.time_zone,
+                            'items': [_listed(e) for e in items[offset:offset + size]]}
+                if offset + size < len(items):
+                    response['nextPageToken'] = str(offset + size)
+                else:
+                    response['nextSyncToken'] = str(b.changes[-1][0] if b.changes else 0)
+                return response
+        return FakeRequest(b, run, 'calendar.events.list')
+
+    def get(self, calendarId, eventId, fields=None, **kwargs):
+        def run(headers):
+            with self.b._lock:
+                return copy.deepcopy(self._live(calendarId, eventId))
+        return FakeRequest(self.b, run, 'calendar.events.get')
+
+    def insert(self, calendarId, body, fields=None, **kwargs):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                cal = self._cal(calendarId)
+                event = copy.deepcopy(body)
+                event.setdefault('id', uuid.uuid4().hex)
+                if event['id'] in cal:
+                    raise http_error(409, 'duplicate')
+                event.setdefault('status', 'confirmed')
+                event.setdefault('iCalUID', event['id'] + '@google.com')
+                cal[event['id']] = event
+                b.touch(calendarId, event)
+                return copy.deepcopy(event)
+        return FakeRequest(b, run, 'calendar.events.insert', 'POST', body)
+
+    def import_(self, calendarId, body, fields=None, **kwargs):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                cal = self._cal(calendarId)
+                # Like Google: one event per iCalUID, plus changed occurrences of a series
+                # keyed by their original start
+                original = body.get('originalStartTime')
+                same = [cal[i] for i in b.uids.get((calendarId, body.get('iCalUID')), ())
+                        if i in cal and cal[i].get('iCalUID') == body.get('iCalUID')]
+                if original:
+                    at = _ts(original, b.time_zone)
+                    event = next((e for e in same if e.get('originalStartTime')
+                                  and _ts(e['originalStartTime'], b.time_zone) == at), None)
+                else:
+                    event = next((e for e in same if not e.get('originalStartTime')), None)
+                if event is None:
+                    event = {'id': uuid.uuid4().hex}
+                    master = next((e for e in same if e.get('recurrence')), None)
+                    if original and master is not None:
+                        event['recurringEventId'] = master['id']
+                        if original.get('date'):
+                            event['id'] = f"{master['id']}_{original['date'].replace('-', '')}"
+                        else:
+                            utc = datetime.datetime.fromtimestamp(at, datetime.timezone.utc)
+                            event['id'] = f"{master['id']}_{utc.strftime('%Y%m%dT%H%M%SZ')}"
+                    cal[event['id']] = event
+                event.update(copy.deepcopy(body))
+                event.setdefault('status', 'confirmed')
+                b.touch(calendarId, event)
+                return copy.deepcopy(event)
+        return FakeRequest(b, run, 'calendar.events.import', 'POST', body)
+
+    def _modify(self, calendarId, eventId, body, replace):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                event = self._live(calendarId, eventId, materialize=True)
+                if headers.get('If-Match') and headers['If-Match'] != event['etag']:
+                    raise http_error(412, 'conditionNotMet')
+                if replace:
+                    keep = {k: event[k] for k in ('id', 'iCalUID', 'status') if k in event}
+                    event.clear()
+                    event.update(keep)
+                event.update(copy.deepcopy(body))
+                b.touch(calendarId, event)
+                return copy.deepcopy(event)
+        if replace:
+            return FakeRequest(b, run, 'calendar.events.update', 'PUT')
+        return FakeRequest(b, run, 'calendar.events.patch', 'PATCH')
+
+    def update(self, calendarId, eventId, body, fields=None, **kwargs):
+        return self._modify(calendarId, eventId, body, True)
+
+    def patch(self, calendarId, eventId, body, fields=None, **kwargs):
+        return self._modify(calendarId, eventId, body, False)
+
+    def delete(self, calendarId, eventId, **kwargs):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                cal = self._cal(calendarId)
+                event = cal.get(eventId)
+                if event is None:
+                    # Deleting one instance of a recurring event leaves a cancelled exception
+                    event = b.instance(calendarId, eventId)
+                    if event is not None:
+                        cal[eventId] = event
+                if event is None or event.get('status') == 'cancelled':
+                    raise http_error(410, 'deleted')
+                event['status'] = 'cancelled'
+                b.touch(calendarId, event)
+                return ''
+        return FakeRequest(b, run, 'calendar.events.delete', 'DELETE')
+
+    def watch(self, calendarId, body, **kwargs):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                self._cal(calendarId)
+                if body['id'] in b.channels:
+                    raise http_error(400, 'channelIdNotUnique')
+                ttl = float(body.get('params', {}).get('ttl', 604800))
+                channel = dict(copy.deepcopy(body), calendar_id=calendarId, messages=0,
+                               kind='api#channel', resourceId=f'resource-{calendarId}',
+                               resourceUri=f'https://www.googleapis.com/calendar/v3/calendars/{calendarId}/events',
+                               expiration=str(int((time.time() + ttl) * 1000)))
+                b.channels[body['id']] = channel
+                return {k: channel[k] for k in ('kind', 'id', 'resourceId', 'resourceUri', 'token', 'expiration')
+                        if k in channel}
+        return FakeRequest(b, run, 'calendar.events.watch', 'POST', body)
+
+
+class _Channels:
+    def __init__(self, backend: FakeCalendarBackend):
+        self.b = backend
+
+    def stop(self, body):
+        b = self.b
+
+        def run(headers):
+            with b._lock:
+                channel = b.channels.get(body['id'])
+                if channel is None or channel['resourceId'] != body.get('resourceId'):
+                    raise http_error(404, 'notFound')
+                del b.channels[body['id']]
+                return ''
+        return FakeRequest(b, run, 'calendar.channels.stop', 'POST', body)
+
+
+class _FreeBusy:
+    def __init__(self, backend: FakeCalendarBackend):
+        self.b = backend
+
+    def query(self, body):
+        b = self.b
+
+        def run(headers):
+            lo = datetime.datetime.fromisoformat(body['timeMin']).timestamp()
+            hi = datetime.datetime.fromisoformat(body['timeMax']).timestamp()
+            calendars = {}
+            with b._lock:
+                for item in body.get('items', []):
+                    cal = b.calendars.get(item['id'])
+                    if cal is None:
+                        calendars[item['id']] = {'busy': [], 'errors': [{'domain': 'global',
+                                                                         'reason': 'notFound'}]}
+                        continue
+                    events = [instance for e in cal.values()
+                              for instance in (b.instances(item['id'], e, lo, hi) if e.get('recurrence') else [e])]
+                    busy = sorted((max(_ts(e['start']), lo), min(_ts(e['end']), hi))
+                                  for e in events
+                                  if e.get('status') != 'cancelled'
+                                  and e.get('transparency') != 'transparent'
+                                  and _ts(e['end']) > lo and _ts(e['start']) < hi)
+                    calendars[item['id']] = {'busy': [{'start': _rfc3339(s), 'end': _rfc3339(e)}
+                                                      for s, e in busy]}
+            return {'kind': 'calendar#freeBusy', 'calendars': calendars}
+        return FakeRequest(b, run, 'calendar.freebusy.query', 'POST')
+
+
+class _CalendarList:
+    def __init__(self, backend: FakeCalendarBackend):
+        self.b = backend
+
+    def list(self, pageToken=None, maxResults=None, fields=None, **kwargs):
+        def run(headers):
+            with self.b._lock:
+                items = [{'id': cid, 'summary': cid, 'primary': cid == 'primary',
+                          'accessRole': 'owner', 'timeZone': self.b.time_zone}
+                         for cid in self.b.calendars]
+            return {'kind': 'calendar#calendarList', 'items': items}
+        return FakeRequest(self.b, run, 'calendar.calendarList.list')
+
+
+class FakeCalendarService:
+    """Drop-in for the object returned by ``googleapiclient.discovery.build``."""
+
+    def __init__(self, backend: FakeCalendarBackend):
+        self.backend = backend
+
+    def events(self):
+        return _Events(self.backend)
+
+    def freebusy(self):
+        return _FreeBusy(self.backend)
+
+    def calendarList(self):
+        return _CalendarList(self.backend)
+
+    def channels(self):
+        return _Channels(self.backend)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self.backend, callback)
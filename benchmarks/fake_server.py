@@ -0,0 +1,92 @@
+"""
+Run the calendar_mcp FastMCP server against the offline fake Calendar API.
+
+The event mirror lives in memory and the Calendar client is a seeded
+``FakeCalendarBackend`` (see fake_calendar.py), so no credentials or network
+access are needed. Run from the repository root:
+    python -m benchmarks.fake_server --events 2000 --latency-ms 20
+    python -m benchmarks.fake_server --transport sse --port 8765 --trace-memory
+    python -m benchmarks.fake_server --transport sse --push   # watch channels + webhook pushes
+"""
+
+import argparse
+import datetime
+import os
+import tracemalloc
+
+from benchmarks.fake_calendar import FakeCalendarBackend
+
+
+def install(events: int = 500, latency_ms: float = 0.0, error_rate: float = 0.0,
+            page_size: int = 250, seed: int = 0, error_status: int = 503,
+            lost_response_rate: float = 0.0, rate: float = 0.0):
+    """Import calendar_mcp with an in-memory mirror and point it at a seeded fake.
+
+    ``rate`` sets the request scheduler's limit (0 = unpaced, so runs measure
+    the server rather than the quota). Returns ``(calendar_mcp module,
+    FakeCalendarBackend)``.
+    """
+    os.environ.setdefault('EVENT_STORE_PATH', ':memory:')
+    import calendar_mcp
+
+    calendar_mcp.scheduler.configure(rate=rate)
+    backend = FakeCalendarBackend(latency=latency_ms / 1000, error_rate=error_rate,
+                                  error_status=error_status, page_size=page_size, seed=seed,
+                                  lost_response_rate=lost_response_rate)
+    # Start a day back so list/lookup windows always contain events
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    backend.seed_generated(events, start=start - datetime.timedelta(days=1))
+    calendar_mcp.service_manager.use_service(backend.client())
+    return calendar_mcp, backend
+
+
+def register_bench_tool(calendar_mcp, backend):
+    """Expose fake API call counts and tracemalloc figures to out-of-process harnesses."""
+    @calendar_mcp.mcp.tool(name='bench_stats', description='Benchmark counters of the fake backend')
+    def bench_stats(reset_peak: bool = False) -> dict:
+        stats = {'api_calls': backend.calls, 'tracing': tracemalloc.is_tracing()}
+        if tracemalloc.is_tracing():
+            stats['alloc_current'], stats['alloc_peak'] = tracemalloc.get_traced_memory()
+            if reset_peak:
+                tracemalloc.reset_peak()
+        return stats
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--events', type=int, default=500, help='events seeded into the fake calendar')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency added to every API call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of API calls that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of injected failures')
+    parser.add_argument('--lost-response-rate', type=float, default=0.0,
+                        help='share of failures that happen after the call was applied')
+    parser.add_argument('--rate', type=float, default=0.0, help='scheduler requests per second (0 = unpaced)')
+    parser.add_argument('--page-size', type=int, default=250, help='maximum items per list page')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fake_arguments(parser)
+    parser.add_argument('--transport', choices=('stdio', 'sse'), default='stdio')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--trace-memory', action='store_true', help='track allocations with tracemalloc')
+    parser.add_argument('--push', action='store_true',
+                        help='(sse) watch the fake calendar and push its changes to the local webhook')
+    args = parser.parse_args()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    calendar_mcp, backend = install(args.events, args.latency_ms, args.error_rate, args.page_size,
+                                    args.seed, args.error_status, args.lost_response_rate, args.rate)
+    register_bench_tool(calendar_mcp, backend)
+    calendar_mcp.mcp.settings.host = args.host
+    calendar_mcp.mcp.settings.port = args.port
+    if args.push and args.transport == 'sse':
+        backend.auto_push = True
+        calendar_mcp.watch_manager.address = f'http://{args.host}:{args.port}{calendar_mcp.PUSH_WEBHOOK_PATH}'
+    calendar_mcp.run_server(args.transport)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Load test the MCP tools against the offline fake Calendar API.
+
+Each worker repeatedly runs one scenario: list_upcoming_events, add_new_event,
+update_event, manage_calendar('list') and delete_event. ``--mode inproc``
+calls the FastMCP server in this process; ``stdio`` and ``sse`` start
+``benchmarks.fake_server`` as a subprocess and talk to it through the MCP
+client. Reports per-tool p50/p95/p99 latency, throughput, errors and
+allocations. Run from the repository root:
+    python -m benchmarks.harness --mode stdio --concurrency 8 --iterations 50
+    python -m benchmarks.harness --mode sse --latency-ms 20 --json bench.json --max-p95-ms 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.fake_server import add_fake_arguments, install
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS = ('list_upcoming_events', 'add_new_event', 'update_event', 'manage_calendar', 'delete_event')
+
+
+# ----------------------------
+# Drivers: one call(name, arguments) -> (ok, text) per transport
+# ----------------------------
+class InProcessDriver:
+    def __init__(self, args):
+        self.args = args
+
+    async def __aenter__(self):
+        tracemalloc.start()
+        a = self.args
+        self.calendar_mcp, self.backend = install(a.events, a.latency_ms, a.error_rate, a.page_size,
+                                                  a.seed, a.error_status, a.lost_response_rate, a.rate)
+        return self
+
+    async def __aexit__(self, *exc):
+        tracemalloc.stop()
+
+    async def call(self, name: str, arguments: dict) -> tuple:
+        from mcp.server.fastmcp.exceptions import ToolError
+        try:
+            content = await self.calendar_mcp.mcp.call_tool(name, arguments)
+        except ToolError as e:
+            return False, str(e)
+        return True, content[0].text if content else ''
+
+    async def stats(self, reset_peak: bool = False) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        if reset_peak:
+            tracemalloc.reset_peak()
+        return {'api_calls': self.backend.calls, 'alloc_current': current, 'alloc_peak': peak}
+
+
+class ClientDriver:
+    """Talks to ``benchmarks.fake_server`` over stdio or SSE."""
+
+    def __init__(self, args):
+        self.args = args
+        self._stack = contextlib.AsyncExitStack()
+
+    def _server_args(self) -> list:
+        a = self.args
+        return ['-m', 'benchmarks.fake_server', '--trace-memory',
+                '--events', str(a.events), '--latency-ms', str(a.latency_ms),
+                '--error-rate', str(a.error_rate), '--error-status', str(a.error_status),
+                '--lost-response-rate', str(a.lost_response_rate), '--rate', str(a.rate),
+                '--page-size', str(a.page_size), '--seed', str(a.seed)]
+
+    async def __aenter__(self):
+        from mcp import ClientSession, StdioServerParameters
+        from mcp.client.sse import sse_client
+        from mcp.client.stdio import stdio_client
+
+        env = dict(os.environ, EVENT_STORE_PATH=':memory:')
+        if self.args.mode == 'stdio':
+            params = StdioServerParameters(command=sys.executable, args=self._server_args(),
+                                           env=env, cwd=REPO_ROOT)
+            streams = await self._stack.enter_async_context(stdio_client(params))
+        else:
+            port = self.args.port or _free_port()
+            server = subprocess.Popen([sys.executable, *self._server_args(), '--transport', 'sse',
+                                       '--port', str(port)], cwd=REPO_ROOT, env=env)
+            self._stack.callback(_stop, server)
+            await _wait_for_port(port, server)
+            streams = await self._stack.enter_async_context(
+                sse_client(f'http://127.0.0.1:{port}/sse', sse_read_timeout=300))
+        self.session = await self._stack.enter_async_context(ClientSession(*streams))
+        await self.session.initialize()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._stack.aclose()
+
+    async def call(self, name: str, arguments: dict) -> tuple:
+        result = await self.session.call_tool(name, arguments)
+        text = result.content[0].text if result.content else ''
+        return not result.isError, text
+
+    async def stats(self, reset_peak: bool = False) -> dict:
+        ok, text = await self.call('bench_stats', {'reset_peak': reset_peak})
+        return json.loads(text) if ok else {}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for_port(port: int, server: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"fake_server exited with status {server.returncode}")
+        with contextlib.suppress(OSError):
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"fake_server did not listen on port {port} within {timeout:.0f}s")
+
+
+def _stop(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# ----------------------------
+# Scenario and reporting
+# ----------------------------
+async def timed_call(driver, samples: dict, name: str, arguments: dict) -> tuple:
+    begin = time.perf_counter()
+    try:
+        ok, text = await driver.call(name, arguments)
+    except Exception as e:
+        ok, text = False, str(e)
+    samples[name]['latencies'].append(time.perf_counter() - begin)
+    if not ok:
+        samples[name]['errors'] += 1
+    return ok, text
+
+
+async def worker(driver, samples: dict, worker_id: int, iterations: int):
+    base = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=30 + worker_id)
+    for i in range(iterations):
+        start = base + datetime.timedelta(hours=i)
+        await timed_call(driver, samples, 'list_upcoming_events', {'max_results': 10, 'profile': 'minimal'})
+        ok, event_id = await timed_call(driver, samples, 'add_new_event', {
+            'summary': f'bench {worker_id}-{i}', 'description': 'harness',
+            'start_datetime_str': start.isoformat(),
+            'end_datetime_str': (start + datetime.timedelta(minutes=30)).isoformat(),
+            'timezone': 'UTC', 'location': 'nowhere'})
+        await timed_call(driver, samples, 'manage_calendar', {'action': 'list', 'max_results': 5,
+                                                              'profile': 'minimal'})
+        if not ok:
+            continue
+        await timed_call(driver, samples, 'update_event', {'event_id': event_id,
+                                                           'new_summary': f'bench {worker_id}-{i} moved',
+                                                           'timezone': 'UTC', 'profile': 'minimal'})
+        await timed_call(driver, samples, 'delete_event', {'event_id': event_id, 'profile': 'minimal'})
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: dict, wall: float, before: dict, after: dict, args) -> dict:
+    tools = {}
+    total = 0
+    for name, sample in samples.items():
+        values = sorted(sample['latencies'])
+        total += len(values)
+        tools[name] = {'calls': len(values), 'errors': sample['errors'],
+                       'p50_ms': percentile(values, 50) * 1000,
+                       'p95_ms': percentile(values, 95) * 1000,
+                       'p99_ms': percentile(values, 99) * 1000}
+    report = {'mode': args.mode, 'concurrency': args.concurrency, 'iterations': args.iterations,
+              'events': args.events, 'latency_ms': args.latency_ms, 'error_rate': args.error_rate,
+              'wall_s': wall, 'calls': total, 'throughput_per_s': total / wall if wall else 0.0,
+              'tools': tools}
+    if 'api_calls' in after:
+        report['api_calls'] = after['api_calls'] - before.get('api_calls', 0)
+    if 'alloc_peak' in after:
+        report['alloc_peak_bytes'] = after['alloc_peak']
+        report['alloc_net_bytes'] = after['alloc_current'] - before.get('alloc_current', 0)
+    return report
+
+
+def print_report(report: dict):
+    print(f"mode={report['mode']} concurrency={report['concurrency']} iterations={report['iterations']} "
+          f"events={report['events']} latency={report['latency_ms']}ms error_rate={report['error_rate']}")
+    print(f"{'tool':<22} {'calls':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, t in report['tools'].items():
+        print(f"{name:<22} {t['calls']:>6} {t['errors']:>6} {t['p50_ms']:>9.2f} "
+              f"{t['p95_ms']:>9.2f} {t['p99_ms']:>9.2f}")
+    print(f"{report['calls']} calls in {report['wall_s']:.2f}s -> {report['throughput_per_s']:.1f} calls/s")
+    if 'api_calls' in report:
+        print(f"fake API calls: {report['api_calls']}")
+    if 'alloc_peak_bytes' in report:
+        print(f"allocations: peak {report['alloc_peak_bytes'] / 1024:.0f} KiB, "
+              f"net {report['alloc_net_bytes'] / 1024:+.0f} KiB")
+
+
+async def run(args) -> dict:
+    driver_cls = InProcessDriver if args.mode == 'inproc' else ClientDriver
+    samples = {name: {'latencies': [], 'errors': 0} for name in TOOLS}
+    async with driver_cls(args) as driver:
+        # Warm up: initial mirror sync, name index and caches
+        await driver.call('list_upcoming_events', {'max_results': 1})
+        before = await driver.stats(reset_peak=True)
+        begin = time.perf_counter()
+        await asyncio.gather(*(worker(driver, samples, w, args.iterations)
+                               for w in range(args.concurrency)))
+        wall = time.perf_counter() - begin
+        after = await driver.stats()
+    return summarize(samples, wall, before, after, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('inproc', 'stdio', 'sse'), default='inproc')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent scenario workers')
+    parser.add_argument('--iterations', type=int, default=20, help='scenarios per worker')
+    parser.add_argument('--port', type=int, default=0, help='SSE port (default: any free port)')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    parser.add_argument('--max-p95-ms', type=float, help='exit with status 1 if any tool p95 exceeds this')
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95_ms is not None:
+        slow = [name for name, t in report['tools'].items() if t['p95_ms'] > args.max_p95_ms]
+        if slow:
+            print(f"p95 above {args.max_p95_ms} ms: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
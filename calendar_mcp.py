@@ -1,12 +1,34 @@
 from mcp.server.fastmcp import FastMCP
-from dateutil import parser, tz  # Added for flexible date-time parsing
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from date_parsing import get_zone, parse_datetime
+from event_store import SYNC_FIELDS
+from event_model import DEFAULT_PROFILE, check_profile, project, project_all
+from agenda import AgendaStats, collect
+from batch_ops import execute_batch
+from listing import MAX_PAGE_SIZE, decode_cursor, encode_cursor, iter_events
+from fanout import after_position, fan_out, merge_by_start
+from freebusy import free_slots, is_busy, merge_intervals, working_hours
+from push import (PUSH_WEBHOOK_PATH, RESOURCE_PREFIX, Subscriptions, WatchManager, WatchRenewer,
+                  enable_subscriptions)
+from recurrence import is_recurring, split_recurrence
+from scheduler import new_event_id, scheduler
+from search import parse_query, remote_terms
+from telemetry import telemetry
+from transfer import export_file, import_file
+from tenants import DEFAULT_TENANT, Tenant, TenantMiddleware, TenantPool, TokenRefresher, current_tenant_id
+from starlette.requests import Request
+from starlette.responses import Response
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import atexit
+import contextvars
 import datetime
+import functools
+import json
 import os
+import sys
+import time
+from urllib.parse import unquote
 
 
 
@@ -14,88 +36,203 @@ import os
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
+EVENT_STORE_PATH = os.environ.get('EVENT_STORE_PATH', 'events.db')
+# Window searched when resolving an event by name (days before/after today)
+NAME_LOOKUP_PAST_DAYS = 31
+NAME_LOOKUP_FUTURE_DAYS = 366
+# Worker threads available to blocking Calendar calls made by tools
+TOOL_WORKERS = int(os.environ.get('TOOL_WORKERS', '16'))
+# Build the client and sync the mirror in the background once a stdio server starts (0 = off)
+WARM_START = int(os.environ.get('WARM_START', '1'))
+# Directory export_events and import_events read and write files in
+TRANSFER_DIR = os.environ.get('TRANSFER_DIR', 'transfers')
 
 # ----------------------------
 # Helper: Google Calendar Service
 # ----------------------------
 
+# The account configured by TOKEN_FILE/EVENT_STORE_PATH; other accounts come
+# from TENANTS_FILE and are picked per SSE session (see tenants.py)
+default_tenant = Tenant(DEFAULT_TENANT, TOKEN_FILE, EVENT_STORE_PATH, SCOPES, scheduler=scheduler)
+service_manager = default_tenant.service_manager
+tenant_pool = TenantPool.from_file(default_tenant, SCOPES, in_memory=EVENT_STORE_PATH == ':memory:')
+
+
+def current_tenant() -> Tenant:
+    """The account of the MCP session being served."""
+    return tenant_pool.get(current_tenant_id())
+
+
 def get_calendar_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception:
-                os.remove(TOKEN_FILE)
-                raise Exception("Token expired and could not be refreshed. Please re-authenticate.")
-        else:
-            raise Exception(f"No valid credentials found. Please run authentication outside container first. Place token.json in {TOKEN_FILE}")
-    return build('calendar', 'v3', credentials=creds)
+    """Return the current account's Calendar client (built once, see calendar_service.py)."""
+    return current_tenant().get_service()
+
+
+def resolve_event_name(name: str, calendar_id: str = 'primary') -> dict:
+    """Return the best-ranked mirrored event whose summary matches ``name``."""
+    tenant = current_tenant()
+    event_store = tenant.event_store
+    event_store.sync(calendar_id)
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    with telemetry.span('name_lookup'):
+        matches = tenant.name_index.resolve(name, calendar_id,
+                                     time_min=now - NAME_LOOKUP_PAST_DAYS * 86400,
+                                     time_max=now + NAME_LOOKUP_FUTURE_DAYS * 86400)
+    if not matches:
+        raise ValueError(f"No event found with name '{name}'")
+    # Only act on an exact match or an unambiguous prefix; never edit a fuzzy guess
+    best = matches[0]
+    if best.kind == 'exact' or (best.kind == 'prefix' and len(matches) == 1):
+        return event_store.get(calendar_id, best.event_id)
+    suggestions = ', '.join(f"'{m.summary}'" for m in matches)
+    raise ValueError(f"No event found with name '{name}'. Closest matches: {suggestions}")
+
+# -----------------------------
+# MCP Server & Tool Definitions
+# -----------------------------
+mcp = FastMCP("Google Calendar MCP Server")
+
+# Blocking httplib2 calls run here so the event loop keeps serving other clients
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix='calendar-tool')
+
+
+def blocking_tool(**tool_kwargs):
+    """Register a blocking function as an async MCP tool run on the worker pool.
+
+    The undecorated function is returned, so tools can still call each other
+    (and scripts can call them) synchronously.
+    """
+    def decorator(fn):
+        name = tool_kwargs.get('name') or fn.__name__
+
+        def traced(*args, **kwargs):
+            with telemetry.tool(name):
+                return fn(*args, **kwargs)
+
+        @functools.wraps(fn)
+        async def run_in_pool(*args, **kwargs):
+            return await _in_pool(traced, *args, **kwargs)
+        mcp.tool(**tool_kwargs)(run_in_pool)
+        return fn
+    return decorator
+
+
+async def _in_pool(fn, *args, **kwargs):
+    """Run blocking ``fn`` on the worker pool with the caller's context (tenant, telemetry)."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_tool_executor, call)
+
+
+# Prometheus scrape endpoint (served by the SSE transport)
+@mcp.custom_route('/metrics', methods=['GET'])
+async def metrics(request: Request) -> Response:
+    return Response(telemetry.render_prometheus(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 # ----------------------------
-# Helper: Date Parsing
+# Push notifications and resource subscriptions
 # ----------------------------
-def parse_datetime(user_input: str, timezone: str = 'Asia/Karachi') -> str:
-    """
-    Parse a free-form datetime string, attach/convert to the given zone,
-    and return an RFC3339 string with offset (e.g. '2025-05-20T15:00:00+05:00').
-    """
-    if not user_input:
-        return None
+# Upcoming events exposed per calendar as a resource
+RESOURCE_EVENTS = 50
 
-    # 1) Parse into a datetime (might be naive or have another zone)
-    dt = parser.parse(user_input, dayfirst=False, yearfirst=True)
+subscriptions = Subscriptions()
+enable_subscriptions(mcp._mcp_server, subscriptions)
+# Watch channels are opened only when PUSH_WEBHOOK_URL is set (see push.py)
+watch_manager = WatchManager(tenant_pool, subscriptions)
 
-    # 2) Force-set missing tzinfo, or convert to target zone
-    target_tz = tz.gettz(timezone)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=target_tz)
-    else:
-        dt = dt.astimezone(target_tz)
 
-    # 3) Return full ISO with offset
-    return dt.isoformat()
+@mcp.custom_route(PUSH_WEBHOOK_PATH, methods=['POST'])
+async def push_notification(request: Request) -> Response:
+    channel, state = watch_manager.receive(request.headers)
+    if channel is None:
+        return Response(status_code=404)
+    # 'sync' only confirms a new channel; anything else means the calendar changed
+    if state != 'sync':
+        watch_manager.schedule(channel, _tool_executor)
+    return Response(status_code=200)
 
 
+def _upcoming_events(calendar_id: str) -> str:
+    event_store = current_tenant().event_store
+    event_store.sync(calendar_id)
+    events = event_store.range(calendar_id, time_min=datetime.datetime.now(datetime.timezone.utc),
+                               limit=RESOURCE_EVENTS)
+    return json.dumps({'calendar_id': calendar_id, 'events': project_all(events, 'minimal')})
 
-# -----------------------------
-# MCP Server & Tool Definitions
-# -----------------------------
-mcp = FastMCP("Google Calendar MCP Server")
+
+@mcp.resource(RESOURCE_PREFIX + '{calendar_id}', name='upcoming_events', mime_type='application/json',
+              description="Upcoming events of a calendar ('primary' = your own); subscribe to be told when it changes")
+async def upcoming_events(calendar_id: str) -> str:
+    return await _in_pool(_upcoming_events, unquote(calendar_id))
 
 
 # List Events Tool
-@mcp.tool(name="list_upcoming_events", description="List upcoming calendar events with optional max results")
-def list_upcoming_events(max_results: int = 10) -> list:
-    service = get_calendar_service()
-    now = datetime.datetime.utcnow().isoformat() + 'Z'
-    events = service.events().list(
-        calendarId='primary', timeMin=now,
-        maxResults=max_results, singleEvents=True,
-        orderBy='startTime'
-    ).execute().get('items', [])
-    return events
+@blocking_tool(name="list_upcoming_events", description="List upcoming calendar events with optional max results; pass next_cursor back as cursor for the next page. calendar_ids merges several calendars by start time ('all' = every calendar in your list)")
+def list_upcoming_events(max_results: int = 10, cursor: str = None,
+                         profile: str = DEFAULT_PROFILE, calendar_ids: list[str] = None) -> dict:
+    check_profile(profile)
+    tenant = current_tenant()
+    event_store = tenant.event_store
+    calendars = tenant.calendar_list.resolve(calendar_ids)
+    errors = {}
+    if len(calendars) == 1:
+        event_store.sync(calendars[0])
+    else:
+        # Pull all calendars' changes concurrently; one failing calendar does not fail the list
+        synced, errors = fan_out(event_store.sync, calendars)
+        calendars = [c for c in calendars if c in synced]
+    if cursor:
+        position = decode_cursor(cursor)
+        time_min = datetime.datetime.fromtimestamp(position['t'], datetime.timezone.utc)
+        after = (position['s'], position.get('c', calendars[0] if calendars else 'primary'), position['i'])
+    else:
+        time_min = datetime.datetime.now(datetime.timezone.utc)
+        after = None
+    # Fetch one extra event to know whether another page exists
+    streams = {c: event_store.keyed_range(c, time_min=time_min, limit=max_results + 1,
+                                          after=after_position(after, c))
+               for c in calendars}
+    merged = merge_by_start(streams, max_results + 1)
+    next_cursor = None
+    if len(merged) > max_results:
+        merged = merged[:max_results]
+        start_ts, calendar_id, event_id, _ = merged[-1]
+        next_cursor = encode_cursor({'t': time_min.timestamp(), 's': start_ts, 'c': calendar_id,
+                                     'i': event_id})
+    events = project_all((event for *_, event in merged), profile)
+    if len(streams) > 1:
+        for event, (_, calendar_id, _, _) in zip(events, merged):
+            event['calendar_id'] = calendar_id
+    result = {'events': events, 'next_cursor': next_cursor}
+    if errors:
+        result['errors'] = errors
+    return result
 
 
 
 # Add Event Tool
-@mcp.tool(name="add_new_event", description="Add a new calendar event and return its ID")
+@blocking_tool(name="add_new_event", description="Add a new calendar event and return its ID; recurrence takes RFC 5545 lines such as 'RRULE:FREQ=WEEKLY;BYDAY=MO'")
 def add_new_event(summary: str, description: str = "", start_datetime_str: str = None,
                    end_datetime_str: str = None, timezone: str = 'Asia/Karachi',
-                   location: str = '') -> str:
-    service = get_calendar_service()
-    start_dt = parse_datetime(start_datetime_str, timezone)
-    end_dt = parse_datetime(end_datetime_str, timezone)
+                   location: str = '', recurrence: list[str] = None) -> str:
+    tenant = current_tenant()
+    service = tenant.get_service()
+    with telemetry.span('parse_dates'):
+        start_dt = parse_datetime(start_datetime_str, timezone)
+        end_dt = parse_datetime(end_datetime_str, timezone)
     body = {
+        'id': new_event_id(),  # client-side ID: the scheduler may retry the insert safely
         'summary': summary,
         'location': location,
         'description': description,
         'start': {'dateTime': start_dt, 'timeZone': timezone},
         'end': {'dateTime': end_dt, 'timeZone': timezone},
     }
-    event = service.events().insert(calendarId='primary', body=body).execute()
+    if recurrence:
+        body['recurrence'] = recurrence
+    event = service.events().insert(calendarId='primary', body=body, fields=SYNC_FIELDS).execute()
+    tenant.event_store.apply('primary', event)
 
     # Print event details
     summary = event.get('summary', 'No Title')
@@ -105,15 +242,15 @@ def add_new_event(summary: str, description: str = "", start_datetime_str: str =
     description = event.get('description', 'No Description')
     location = event.get('location', 'No Location')
 
-    print(f"**Name:** {summary}")
-    print(f"**Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}")
-    print(f"**Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})")
-    print(f"**Description:** {description}")
-    print(f"**Location:** {location}")
-    print("#" * 50)
-    print("This event has been Added successfully!")
-    print("#" * 50)
-    print(f"Event ID: {event['id']}")
+    print(f"**Name:** {summary}", file=sys.stderr)
+    print(f"**Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}", file=sys.stderr)
+    print(f"**Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})", file=sys.stderr)
+    print(f"**Description:** {description}", file=sys.stderr)
+    print(f"**Location:** {location}", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
+    print("This event has been Added successfully!", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
+    print(f"Event ID: {event['id']}", file=sys.stderr)
 
     return event['id']
 
@@ -121,48 +258,148 @@ def add_new_event(summary: str, description: str = "", start_datetime_str: str =
 
 
 # Update Event Tool: match by name or ID, or list current month events
-@mcp.tool(name="update_event", description="Update an event by ID or name; lists current month if no identifier given")
+def _patch_body(new_summary: str = None, new_description: str = None,
+                new_start: str = None, new_end: str = None,
+                new_location: str = None, timezone: str = 'Asia/Karachi') -> dict:
+    """Build an ``events().patch`` body holding only the changed fields."""
+    body = {}
+    if new_summary: body['summary'] = new_summary
+    if new_description: body['description'] = new_description
+    with telemetry.span('parse_dates'):
+        if new_start:
+            body['start'] = {'dateTime': parse_datetime(new_start, timezone), 'timeZone': timezone}
+        if new_end:
+            body['end'] = {'dateTime': parse_datetime(new_end, timezone), 'timeZone': timezone}
+    if new_location: body['location'] = new_location
+    return body
+
+
+def _current_month_events() -> list:
+    with telemetry.span('month_listing'):
+        event_store = current_tenant().event_store
+        event_store.sync('primary')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (start_month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return event_store.range('primary', time_min=start_month, time_max=next_month)
+
+
+# ----------------------------
+# Recurring events: which occurrences an edit applies to
+# ----------------------------
+EDIT_SCOPES = ('this', 'following', 'all')
+# Fields a "this and following" edit copies from the old series to the new one
+SERIES_FIELDS = ('summary', 'description', 'location', 'transparency', 'attendees')
+
+
+def _lookup_event(tenant, event_id: str) -> dict:
+    return tenant.event_store.get('primary', event_id) or tenant.get_service().events().get(
+        calendarId='primary', eventId=event_id, fields=SYNC_FIELDS).execute()
+
+
+def _edit_target(tenant, event: dict, scope: str) -> dict:
+    """The event an edit with ``scope`` acts on: an instance, a series master or a plain event.
+
+    A series given by its master (e.g. found by name) stands for its next
+    occurrence unless the scope is 'all'.
+    """
+    if scope not in EDIT_SCOPES:
+        raise ValueError(f"Unknown scope '{scope}'. Use 'this', 'following' or 'all'.")
+    if is_recurring(event):
+        if scope == 'all':
+            return event
+        instance = tenant.event_store.next_instance('primary', event['id'], time.time())
+        if instance is None:
+            raise ValueError(f"'{event.get('summary', event['id'])}' has no upcoming occurrences")
+        return instance
+    if scope == 'all' and event.get('recurringEventId'):
+        return _lookup_event(tenant, event['recurringEventId'])
+    return event
+
+
+def _edit_following(tenant, instance: dict, body: dict = None):
+    """Change (``body``) or delete (None) ``instance`` and all later occurrences.
+
+    The series is cut before the instance; for a change, a new series with
+    the rest of the rule starts at the instance. Modified instances from the
+    cut on are deleted. Returns the new master, or the edited one when the
+    cut falls on the first occurrence.
+    """
+    store = tenant.event_store
+    tenant.write_queue.flush('primary')
+    store.sync('primary')
+    master_id = instance['recurringEventId']
+    series = store.series('primary', master_id)
+    if series is None:
+        raise ValueError(f"Recurring event '{master_id}' is not in the primary calendar")
+    original_ts = store.original_timestamp('primary', instance)
+    original = series.occurs_at(original_ts)
+    if original is None:
+        raise ValueError(f"'{instance['id']}' is not an occurrence of its series")
+    events = tenant.get_service().events()
+    if original_ts == series.bounds()[0]:
+        # From the first occurrence on: the whole series
+        if body is None:
+            events.delete(calendarId='primary', eventId=master_id).execute()
+            store.remove('primary', master_id)
+            return None
+        updated = events.patch(calendarId='primary', eventId=master_id, body=body, fields=SYNC_FIELDS).execute()
+        store.apply('primary', updated)
+        return updated
+    head, tail = split_recurrence(series, original)
+    created = None
+    if body is not None and tail:
+        # Create the new series first: a failure then leaves the old one intact
+        first = series.instance(original)
+        new = {k: series.master[k] for k in SERIES_FIELDS if k in series.master}
+        new.update(id=new_event_id(), start=first['start'], end=first['end'], recurrence=tail)
+        new.update(body)
+        created = events.insert(calendarId='primary', body=new, fields=SYNC_FIELDS).execute()
+        store.apply('primary', created)
+    truncated = events.patch(calendarId='primary', eventId=master_id, body={'recurrence': head},
+                             fields=SYNC_FIELDS).execute()
+    store.apply('primary', truncated)
+    stale = store.exceptions('primary', master_id, since=original_ts)
+    if stale:
+        calls = [('delete', {'calendarId': 'primary', 'eventId': event_id}) for event_id in stale]
+        for event_id, outcome in zip(stale, execute_batch(tenant.get_service, calls, scheduler=tenant.scheduler)):
+            if not outcome['ok']:
+                print(f"Deleting modified instance {event_id} failed: {outcome['error']}", file=sys.stderr)
+            store.remove('primary', event_id)
+    return created
+
+
+@blocking_tool(name="update_event", description="Update an event by ID or name; lists current month if no identifier given. For recurring events, scope is 'this' occurrence, 'following' (this and later ones) or 'all'")
 def update_event(event_id: str = None, name: str = None,
                  new_summary: str = None, new_description: str = None,
                  new_start: str = None, new_end: str = None,
                  new_location: str = None,
-                 timezone: str = 'Asia/Karachi') -> any:
-    service = get_calendar_service()
+                 timezone: str = 'Asia/Karachi',
+                 profile: str = DEFAULT_PROFILE, scope: str = 'this') -> any:
+    check_profile(profile)
     # If no ID or name provided: list this month's events
     if not event_id and not name:
-        now = datetime.datetime.utcnow()
-        start_month = now.replace(day=1).isoformat() + 'Z'
-        next_month = (now.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
-        end_month = next_month.isoformat() + 'Z'
-        events = service.events().list(
-            calendarId='primary', timeMin=start_month, timeMax=end_month,
-            singleEvents=True, orderBy='startTime'
-        ).execute().get('items', [])
-        return events
-    # Resolve name to ID if needed
-    if not event_id and name:
-        # fetch current month and find match
-        this_month = update_event(name=None)  # recursive to list events
-        matches = [e for e in this_month if e.get('summary', '').lower() == name.lower()]
-        if not matches:
-            raise ValueError(f"No event found with name '{name}'")
-        event = matches[0]
+        return project_all(_current_month_events(), profile)
+    tenant = current_tenant()
+    event = resolve_event_name(name) if not event_id else _lookup_event(tenant, event_id)
+    target = _edit_target(tenant, event, scope)
+    # Patch only the changed fields: no full-body PUT needed
+    body = _patch_body(new_summary, new_description, new_start, new_end, new_location, timezone)
+    queued = False
+    if scope == 'following' and target.get('recurringEventId'):
+        updated = _edit_following(tenant, target, body)
+        if updated is None:
+            raise ValueError("No later occurrences are left to update")
+    elif tenant.write_queue.enabled:
+        # Answered from the mirror; the queue sends this and any further edits as one patch
+        updated = tenant.write_queue.patch('primary', target, body)
+        queued = True
     else:
-        event = service.events().get(calendarId='primary', eventId=event_id).execute()
-    # Apply updates
-    if new_summary: event['summary'] = new_summary
-    if new_description: event['description'] = new_description
-    if new_start:
-        event['start']['dateTime'] = parse_datetime(new_start, timezone)
-        event['start']['timeZone'] = timezone
-    if new_end:
-        event['end']['dateTime'] = parse_datetime(new_end, timezone)
-        event['end']['timeZone'] = timezone
-    if new_location: event['location'] = new_location
-
-    updated = service.events().update(
-        calendarId='primary', eventId=event['id'], body=event
-    ).execute()
+        # Patching an instance ID turns that occurrence into an exception
+        updated = tenant.get_service().events().patch(
+            calendarId='primary', eventId=target['id'], body=body, fields=SYNC_FIELDS
+        ).execute()
+        tenant.event_store.apply('primary', updated)
 
     # Print updated event details
     summary = updated.get('summary', 'No Title')
@@ -172,35 +409,35 @@ def update_event(event_id: str = None, name: str = None,
     description = updated.get('description', 'No Description')
     location = updated.get('location', 'No Location')
 
-    print(f"** New Name:** {summary}")
-    print(f"**New Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}")
-    print(f"**New Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})")
-    print(f"**New Description:** {description}")
-    print(f"**New location:** {location}")
-    print("#" * 50)
-    print("This event has been updated successfully!")
-    print("#" * 50)
+    print(f"** New Name:** {summary}", file=sys.stderr)
+    print(f"**New Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}", file=sys.stderr)
+    print(f"**New Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})", file=sys.stderr)
+    print(f"**New Description:** {description}", file=sys.stderr)
+    print(f"**New location:** {location}", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
+    print("This event has been updated successfully!", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
 
-    return {'id': updated['id'], 'summary': updated.get('summary')}
+    result = project(updated, profile)
+    if queued:
+        result['pending'] = True  # not sent yet; see flush_writes
+    return result
 
 
 
 
 # Delete Event Tool: match by name or ID, or list current month events
-@mcp.tool(name="delete_event", description="Delete an event by ID or name; lists current month if no identifier given")
-def delete_event(event_id: str = None, name: str = None) -> any:
-    service = get_calendar_service()
+@blocking_tool(name="delete_event", description="Delete an event by ID or name; lists current month if no identifier given. For recurring events, scope is 'this' occurrence, 'following' (this and later ones) or 'all'")
+def delete_event(event_id: str = None, name: str = None,
+                 profile: str = DEFAULT_PROFILE, scope: str = 'this') -> any:
+    check_profile(profile)
     if not event_id and not name:
-        return update_event()  # lists current month
-    if not event_id and name:
-        events = delete_event()  # list
-        matches = [e for e in events if e.get('summary', '').lower() == name.lower()]
-        if not matches:
-            raise ValueError(f"No event found with name '{name}'")
-        event = matches[0]
-        event_id = event['id']
-    else:
-        event = service.events().get(calendarId='primary', eventId=event_id).execute()
+        return project_all(_current_month_events(), profile)  # lists current month
+    tenant = current_tenant()
+    service = tenant.get_service()
+    event = resolve_event_name(name) if not event_id else _lookup_event(tenant, event_id)
+    event = _edit_target(tenant, event, scope)
+    event_id = event['id']
 
     # Print event details before deletion
     summary = event.get('summary', 'No Title')
@@ -210,25 +447,419 @@ def delete_event(event_id: str = None, name: str = None) -> any:
     description = event.get('description', 'No Description')
     location = event.get('location', 'No Location')
 
-    print(f"**Name:** {summary}")
-    print(f"**Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}")
-    print(f"**Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})")
-    print(f"**Description:** {description}")
-    print(f"**Location:** {location}")
-    print("#" * 50)
-    print("This event has been deleted successfully!")
-    print("#" * 50)
-
-    # Delete the event
+    print(f"**Name:** {summary}", file=sys.stderr)
+    print(f"**Date:** {datetime.datetime.fromisoformat(start).strftime('%B %d, %Y')}", file=sys.stderr)
+    print(f"**Time:** {datetime.datetime.fromisoformat(start).strftime('%H:%M')} - {datetime.datetime.fromisoformat(end).strftime('%H:%M')} ({timezone})", file=sys.stderr)
+    print(f"**Description:** {description}", file=sys.stderr)
+    print(f"**Location:** {location}", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
+    print("This event has been deleted successfully!", file=sys.stderr)
+    print("#" * 50, file=sys.stderr)
+
+    if scope == 'following' and event.get('recurringEventId'):
+        _edit_following(tenant, event)
+        return {'deleted': True, 'id': event_id, 'scope': 'following'}
+    # Delete the event (deleting an instance ID cancels just that occurrence)
+    tenant.write_queue.discard('primary', event_id)
     service.events().delete(calendarId='primary', eventId=event_id).execute()
+    tenant.event_store.remove('primary', event_id)
     return {'deleted': True, 'id': event_id}
 
+
+def _batch_call(op: dict, timezone: str) -> tuple:
+    """Translate one batch operation into an ``events()`` method call."""
+    action = op.get('action')
+    timezone = op.get('timezone', timezone)
+    if action == 'add':
+        body = {
+            'id': new_event_id(),
+            'summary': op.get('summary'),
+            'location': op.get('location', ''),
+            'description': op.get('description', ''),
+            'start': {'dateTime': parse_datetime(op.get('start_datetime_str'), timezone), 'timeZone': timezone},
+            'end': {'dateTime': parse_datetime(op.get('end_datetime_str'), timezone), 'timeZone': timezone},
+        }
+        return 'insert', {'calendarId': 'primary', 'body': body, 'fields': SYNC_FIELDS}
+    if action not in ('update', 'delete'):
+        raise ValueError(f"Unknown action '{action}'. Use 'add', 'update', or 'delete'.")
+    event_id = op.get('event_id')
+    if not event_id and op.get('name'):
+        event_id = resolve_event_name(op['name'])['id']
+    if not event_id:
+        raise ValueError("An 'event_id' or 'name' is required")
+    if action == 'delete':
+        return 'delete', {'calendarId': 'primary', 'eventId': event_id}
+    body = _patch_body(op.get('new_summary'), op.get('new_description'), op.get('new_start'),
+                       op.get('new_end'), op.get('new_location'), timezone)
+    return 'patch', {'calendarId': 'primary', 'eventId': event_id, 'body': body, 'fields': SYNC_FIELDS}
+
+
+# Batch Tool: many adds/updates/deletes in a handful of round trips
+@blocking_tool(name="batch_manage_events", description="Add, update or delete many events in one call using batched API requests")
+def batch_manage_events(operations: list[dict], timezone: str = 'Asia/Karachi') -> list:
+    """
+    Each operation is a dict with an 'action' and the fields of the single-event tools:
+    - 'add'    -> summary, description, start_datetime_str, end_datetime_str, location
+    - 'update' -> event_id or name, new_summary, new_description, new_start, new_end, new_location
+    - 'delete' -> event_id or name
+    An operation may override 'timezone'. Returns one result per operation, in order.
+    """
+    # Queued single edits go first so the batch applies on top of them
+    current_tenant().write_queue.flush('primary')
+    results = [None] * len(operations)
+    calls, positions = [], []
+    for i, op in enumerate(operations):
+        try:
+            calls.append(_batch_call(op, timezone))
+            positions.append(i)
+        except Exception as e:
+            results[i] = {'index': i, 'action': op.get('action'), 'ok': False, 'error': str(e)}
+
+    tenant = current_tenant()
+    event_store = tenant.event_store
+    outcomes = execute_batch(tenant.get_service, calls, scheduler=tenant.scheduler)
+    for i, (method, kwargs), outcome in zip(positions, calls, outcomes):
+        result = {'index': i, 'action': operations[i].get('action'), 'ok': outcome['ok']}
+        if not outcome['ok']:
+            result['error'] = outcome['error']
+        elif method == 'delete':
+            event_store.remove('primary', kwargs['eventId'])
+            result['id'] = kwargs['eventId']
+        else:
+            event = outcome['response']
+            event_store.apply('primary', event)
+            result['id'] = event['id']
+            result['summary'] = event.get('summary')
+        results[i] = result
+    return results
+
+
+# ----------------------------
+# Free/Busy and Conflicts
+# ----------------------------
+# Google answers at most this many calendars per freebusy().query
+FREEBUSY_MAX_ITEMS = 50
+
+
+def _window(start_str: str, end_str: str, timezone: str, default_days: int = 7) -> tuple:
+    """Resolve a user-supplied window to POSIX timestamps (defaults: now .. now + days)."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start = datetime.datetime.fromisoformat(parse_datetime(start_str, timezone)) if start_str else now
+    end = (datetime.datetime.fromisoformat(parse_datetime(end_str, timezone)) if end_str
+           else start + datetime.timedelta(days=default_days))
+    if end <= start:
+        raise ValueError("The window end must be after its start")
+    return start.timestamp(), end.timestamp()
+
+
+def _remote_busy(calendar_ids: list, start_ts: float, end_ts: float) -> tuple:
+    """Busy intervals per calendar from freebusy().query, plus per-calendar errors."""
+    service = get_calendar_service()
+    busy, errors = {}, {}
+    time_min = datetime.datetime.fromtimestamp(start_ts, datetime.timezone.utc).isoformat()
+    time_max = datetime.datetime.fromtimestamp(end_ts, datetime.timezone.utc).isoformat()
+    for i in range(0, len(calendar_ids), FREEBUSY_MAX_ITEMS):
+        chunk = calendar_ids[i:i + FREEBUSY_MAX_ITEMS]
+        response = service.freebusy().query(body={
+            'timeMin': time_min, 'timeMax': time_max,
+            'items': [{'id': calendar_id} for calendar_id in chunk],
+        }).execute()
+        for calendar_id, info in response.get('calendars', {}).items():
+            if info.get('errors'):
+                errors[calendar_id] = [e.get('reason') for e in info['errors']]
+            busy[calendar_id] = [
+                (datetime.datetime.fromisoformat(b['start']).timestamp(),
+                 datetime.datetime.fromisoformat(b['end']).timestamp())
+                for b in info.get('busy', [])]
+    return busy, errors
+
+
+def _busy_events(tenant, start_ts: float, end_ts: float) -> list:
+    """``(start, end, event id)`` of busy 'primary' events in a window, recurring instances included."""
+    index = tenant.busy_index.index('primary')
+    found = [(index.starts[i], index.ends[i], index.payloads[i]) for i in index.overlapping(start_ts, end_ts)]
+    found.extend((start, end, event['id']) for start, end, event in tenant.event_store.expand('primary', start_ts, end_ts)
+                 if is_busy(event))
+    found.sort()
+    return found
+
+
+def _busy_intervals(attendees: list, start_ts: float, end_ts: float) -> tuple:
+    """Busy time for 'primary' (from the local interval index) and other attendees."""
+    attendees = list(dict.fromkeys(attendees or ['primary']))
+    intervals, errors = [], {}
+    if 'primary' in attendees:
+        tenant = current_tenant()
+        tenant.event_store.sync('primary')
+        intervals.extend((max(start, start_ts), min(end, end_ts))
+                         for start, end, _ in _busy_events(tenant, start_ts, end_ts))
+    others = [a for a in attendees if a != 'primary']
+    if others:
+        remote, errors = _remote_busy(others, start_ts, end_ts)
+        for busy in remote.values():
+            intervals.extend(busy)
+    return merge_intervals(intervals), errors
+
+
+def _iso(ts: float, tzinfo) -> str:
+    return datetime.datetime.fromtimestamp(ts, tzinfo).isoformat()
+
+
+@blocking_tool(name="find_free_slots", description="Find open time slots of a given length shared by all attendees within a window")
+def find_free_slots(duration_minutes: int = 30, attendees: list[str] = None,
+                    window_start: str = None, window_end: str = None,
+                    timezone: str = 'Asia/Karachi',
+                    work_start_hour: int = None, work_end_hour: int = None,
+                    max_slots: int = 10) -> dict:
+    """
+    attendees are calendar IDs or email addresses ('primary' = your own calendar,
+    the default). The window defaults to the next 7 days; set work_start_hour and
+    work_end_hour (0-24, in timezone) to only return slots within working hours.
+    """
+    start_ts, end_ts = _window(window_start, window_end, timezone)
+    busy, errors = _busy_intervals(attendees, start_ts, end_ts)
+    tzinfo = get_zone(timezone)
+    allowed = None
+    if work_start_hour is not None or work_end_hour is not None:
+        allowed = working_hours(start_ts, end_ts, tzinfo,
+                                work_start_hour or 0, 24 if work_end_hour is None else work_end_hour)
+    slots = free_slots(busy, start_ts, end_ts, duration_minutes * 60, allowed, max_slots)
+    result = {'slots': [{'start': _iso(s, tzinfo), 'end': _iso(e, tzinfo),
+                         'minutes': int((e - s) // 60)} for s, e in slots]}
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+@blocking_tool(name="check_conflicts", description="List events and attendee busy times that overlap a proposed time range")
+def check_conflicts(start_datetime_str: str, end_datetime_str: str,
+                    attendees: list[str] = None, timezone: str = 'Asia/Karachi',
+                    profile: str = 'minimal') -> dict:
+    check_profile(profile)
+    start_ts, end_ts = _window(start_datetime_str, end_datetime_str, timezone)
+    tenant = current_tenant()
+    event_store = tenant.event_store
+    event_store.sync('primary')
+    conflicts = [event_store.get('primary', event_id) for _, _, event_id in _busy_events(tenant, start_ts, end_ts)]
+    result = {'conflict': bool(conflicts), 'events': project_all(filter(None, conflicts), profile)}
+    others = [a for a in dict.fromkeys(attendees or []) if a != 'primary']
+    if others:
+        tzinfo = get_zone(timezone)
+        remote, errors = _remote_busy(others, start_ts, end_ts)
+        busy = {calendar_id: [{'start': _iso(s, tzinfo), 'end': _iso(e, tzinfo)} for s, e in intervals]
+                for calendar_id, intervals in remote.items() if intervals}
+        result['attendees_busy'] = busy
+        result['conflict'] = result['conflict'] or bool(busy)
+        if errors:
+            result['errors'] = errors
+    return result
+
+
+# ----------------------------
+# Search
+# ----------------------------
+# Window of remote searches when the query has no after:/before:/on: (days around today)
+SEARCH_REMOTE_DAYS = int(os.environ.get('SEARCH_REMOTE_DAYS', '365'))
+# Seconds a remote q= search keeps answering identical follow-ups from the index
+SEARCH_REMOTE_TTL = float(os.environ.get('SEARCH_REMOTE_TTL', '60'))
+
+
+def _remote_search(tenant, query, calendar_id: str):
+    """Fill the index with the events of an unmirrored calendar that match ``query`` remotely.
+
+    Matches are cached in the mirror until the calendar's first full sync
+    replaces them, so follow-up queries are answered locally. Each refresh
+    drops cached events of the window that no longer come back (deleted,
+    or renamed so they stop matching).
+    """
+    now = time.time()
+    # Whole days, so that repeated queries share a window
+    today = now - now % 86400
+    time_min = query.time_min if query.time_min is not None else today - SEARCH_REMOTE_DAYS * 86400
+    time_max = query.time_max if query.time_max is not None else today + (SEARCH_REMOTE_DAYS + 1) * 86400
+    q = remote_terms(query)
+    key = (calendar_id, q, time_min, time_max)
+    searched = tenant.remote_searches.get(key)
+    if searched is not None and now - searched < SEARCH_REMOTE_TTL:
+        return
+    # Recurring events come unexpanded, as the mirror stores them
+    params = {'timeMin': datetime.datetime.fromtimestamp(time_min, datetime.timezone.utc).isoformat(),
+              'timeMax': datetime.datetime.fromtimestamp(time_max, datetime.timezone.utc).isoformat()}
+    if q:
+        params['q'] = q
+    found = set()
+    for event in iter_events(tenant.get_service(), calendar_id, SYNC_FIELDS, MAX_PAGE_SIZE, **params):
+        tenant.event_store.apply(calendar_id, event)
+        found.add(event['id'])
+    pruned = tenant.event_store.prune(calendar_id, time_min, time_max, found)
+    # Dropped events may have been matches of other cached searches: refresh those on next use
+    tenant.remote_searches = {k: t for k, t in tenant.remote_searches.items()
+                              if now - t < SEARCH_REMOTE_TTL and not (pruned and k[0] == calendar_id)}
+    tenant.remote_searches[key] = now
+
+
+def _prepare_search(tenant, query, calendar_id: str):
+    # Mirrored calendars are brought up to date; others are narrowed remotely with q=
+    if calendar_id == 'primary' or tenant.event_store.mirrored(calendar_id):
+        tenant.event_store.sync(calendar_id)
+    else:
+        _remote_search(tenant, query, calendar_id)
+
+
+@blocking_tool(name="search_events", description='Search events, ranked by relevance. Query language: free text, "phrases", prefix*, summary:/title:, description:, location:, attendee:/with:, after:DATE, before:DATE, on:DATE, -term to exclude')
+def search_events(query: str, calendar_ids: list[str] = None, max_results: int = 10,
+                  timezone: str = 'Asia/Karachi', profile: str = 'minimal') -> dict:
+    """
+    Example: 'with:alice "design review" after:2025-05-01 -cancelled'.
+    calendar_ids defaults to ["primary"]; "all" searches every calendar in your list.
+    Dates in after:/before:/on: are read in timezone.
+    """
+    check_profile(profile)
+    parsed = parse_query(query, timezone)
+    tenant = current_tenant()
+    calendars = tenant.calendar_list.resolve(calendar_ids)
+    errors = {}
+    if len(calendars) == 1:
+        _prepare_search(tenant, parsed, calendars[0])
+    else:
+        _, errors = fan_out(functools.partial(_prepare_search, tenant, parsed), calendars)
+    with telemetry.span('search'):
+        matches, total = tenant.search_index.search(parsed, [c for c in calendars if c not in errors],
+                                                    max_results)
+    events, seen = [], set()
+    for match in matches:
+        event = tenant.event_store.get(match.calendar_id, match.event_id)
+        if event is not None and is_recurring(event):
+            # A series is shown as its next occurrence (unless that one matched on its own)
+            after = parsed.time_min if parsed.time_min is not None else time.time()
+            event = tenant.event_store.next_instance(match.calendar_id, event['id'], after) or event
+        if event is None or (match.calendar_id, event['id']) in seen:
+            continue
+        seen.add((match.calendar_id, event['id']))
+        item = project(event, profile)
+        item['score'] = round(match.score, 3)
+        if len(calendars) > 1:
+            item['calendar_id'] = match.calendar_id
+        events.append(item)
+    result = {'events': events, 'total': total}
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+# Agenda Stats Tool: aggregate a date range on the server instead of returning its events
+@blocking_tool(name="agenda_stats", description="Summarize a date range (weeks, months or years) without listing its events: meeting hours per day/week/month, busy and double-booked time, hours by weekday and the busiest days")
+def agenda_stats(start_date: str, end_date: str, calendar_ids: list[str] = None,
+                 group_by: str = 'week', timezone: str = 'Asia/Karachi',
+                 include_all_day: bool = False, top_days: int = 5) -> dict:
+    """
+    group_by is 'day', 'week' (starting Monday) or 'month'. Counts events you are
+    busy for (not cancelled, declined or marked free); all-day events are left out
+    unless include_all_day. calendar_ids defaults to ["primary"]; "all" sums every
+    calendar in your list.
+    """
+    start_ts, end_ts = _window(start_date, end_date, timezone)
+    stats = AgendaStats(start_ts, end_ts, get_zone(timezone), group_by)
+    tenant = current_tenant()
+    calendars = tenant.calendar_list.resolve(calendar_ids)
+    errors = {}
+    if len(calendars) == 1:
+        tenant.event_store.sync(calendars[0])
+    else:
+        _, errors = fan_out(tenant.event_store.sync, calendars)
+
+    def keep(event):
+        return is_busy(event) and (include_all_day or 'date' not in event.get('start', {}))
+    with telemetry.span('agenda', group_by=group_by):
+        collect(stats, tenant.event_store.intervals, [c for c in calendars if c not in errors], keep)
+    result = stats.summary(top_days)
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+# ----------------------------
+# Export and Import
+# ----------------------------
+def _transfer_path(path: str) -> str:
+    """Resolve a tool-supplied file name inside TRANSFER_DIR."""
+    root = os.path.realpath(TRANSFER_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError(f"'{path}' is outside the transfer directory {root}")
+    return full
+
+
+def export_calendar(tenant: Tenant, path: str, calendar_id: str = 'primary', start_date: str = None,
+                    end_date: str = None, file_format: str = None, timezone: str = 'Asia/Karachi') -> dict:
+    time_min = parse_datetime(start_date, timezone) if start_date else None
+    time_max = parse_datetime(end_date, timezone) if end_date else None
+    with telemetry.span('export', calendar_id=calendar_id):
+        return export_file(tenant.get_service(), calendar_id, path, file_format, time_min, time_max)
+
+
+def import_calendar(tenant: Tenant, path: str, calendar_id: str = 'primary', file_format: str = None,
+                    timezone: str = 'Asia/Karachi', skip_existing: bool = True, resume: bool = True) -> dict:
+    event_store = tenant.event_store
+    tenant.write_queue.flush(calendar_id)
+    event_store.sync(calendar_id)
+    existing = event_store.ical_keys(calendar_id) if skip_existing else frozenset()
+    with telemetry.span('import', calendar_id=calendar_id):
+        return import_file(tenant.get_service, calendar_id, path, file_format, timezone, existing,
+                           functools.partial(event_store.original_timestamp, calendar_id), resume,
+                           tenant.scheduler, functools.partial(event_store.apply, calendar_id))
+
+
+@blocking_tool(name="export_events", description="Export a calendar's events to a JSONL or ICS file in the server's transfer directory, streamed page by page; start_date/end_date limit it to a range")
+def export_events(path: str, calendar_id: str = 'primary', start_date: str = None, end_date: str = None,
+                  file_format: str = None, timezone: str = 'Asia/Karachi') -> dict:
+    """
+    file_format is 'jsonl' (every field, for backups and import_events) or 'ics'
+    (for other calendar apps); by default it follows the extension of path.
+    Returns the path written, format, event count and file size.
+    """
+    return export_calendar(current_tenant(), _transfer_path(path), calendar_id, start_date, end_date,
+                           file_format, timezone)
+
+
+@blocking_tool(name="import_events", description="Import events from a JSONL or ICS file in the server's transfer directory through batched requests, keeping their iCalUIDs; skips events already in the calendar and resumes an interrupted import")
+def import_events(path: str, calendar_id: str = 'primary', file_format: str = None,
+                  timezone: str = 'Asia/Karachi', skip_existing: bool = True, resume: bool = True) -> dict:
+    """
+    timezone applies to ICS times without a zone. With skip_existing off, events
+    whose iCalUID is already in the calendar are updated from the file. resume=False
+    starts over instead of continuing after the last checkpoint.
+    Returns counts (read, imported, failed, duplicates, existing, unsupported) and the
+    failed records.
+    """
+    return import_calendar(current_tenant(), _transfer_path(path), calendar_id, file_format, timezone,
+                           skip_existing, resume)
+
+
+# Flush Tool: send queued edits now and report what went wrong
+@blocking_tool(name="flush_writes", description="Send edits queued by update_event (write-behind mode) now; reports conflicts and failed edits")
+def flush_writes() -> dict:
+    write_queue = current_tenant().write_queue
+    result = write_queue.flush()
+    # Include problems of earlier background flushes the agent has not seen yet
+    reported = {id(e) for e in result['conflicts'] + result['errors']}
+    result['earlier'] = [e for e in write_queue.errors(clear=True) if id(e) not in reported]
+    return result
+
+
+# Server Stats Tool
+@blocking_tool(name="server_stats", description="Report internal counters (client builds, token refreshes, mirror syncs, HTTP cache hits, API queue depth, per-tool metrics)")
+def server_stats() -> dict:
+    tenant = current_tenant()
+    return dict(tenant.stats(), http_cache=service_manager.response_cache.stats(),
+                tenants=tenant_pool.stats(), push=watch_manager.stats(), telemetry=telemetry.snapshot())
+
 # -----------------------------
 # Server Entry Point
 # -----------------------------
 
 
-@mcp.tool()
+@blocking_tool()
 def manage_calendar(action: str,
                     event_id: str = None,
                     summary: str = None,
@@ -237,7 +868,12 @@ def manage_calendar(action: str,
                     start_datetime_str: str = None,
                     end_datetime_str: str = None,
                     timezone: str = 'Asia/Karachi',
-                    max_results: int = 10) -> any:
+                    max_results: int = 10,
+                    cursor: str = None,
+                    profile: str = DEFAULT_PROFILE,
+                    calendar_ids: list[str] = None,
+                    recurrence: list[str] = None,
+                    scope: str = 'this') -> any:
     """
     General entrypoint to manage calendar via action parameter:
     - 'list'      -> list_upcoming_events
@@ -246,19 +882,65 @@ def manage_calendar(action: str,
     - 'delete'    -> delete_event_by_id
     """
     if action == 'list':
-        return list_upcoming_events(max_results)
+        return list_upcoming_events(max_results, cursor, profile, calendar_ids)
     elif action == 'add':
-        return add_new_event(summary, description, start_datetime_str, end_datetime_str, timezone, location)
+        return add_new_event(summary, description, start_datetime_str, end_datetime_str, timezone, location,
+                             recurrence)
     elif action == 'update':
-        return update_event(event_id, summary, description, start_datetime_str, end_datetime_str, timezone, location)
+        return update_event(event_id=event_id, new_summary=summary, new_description=description,
+                            new_start=start_datetime_str, new_end=end_datetime_str,
+                            new_location=location, timezone=timezone, profile=profile, scope=scope)
     elif action == 'delete':
-        return delete_event(event_id)
+        return delete_event(event_id, profile=profile, scope=scope)
     else:
         raise ValueError(f"Unknown action '{action}'. Use 'list', 'add', 'update', or 'delete'.")
 
 # -----------------------------
 # Server Entry Point
 # -----------------------------
+def warm_start(tenant: Tenant, calendar_id: str = 'primary'):
+    """Seed the indexes, load the Google client and sync the mirror before the first tool needs them.
+
+    Failures (e.g. no token yet) are only logged; the first tool call reports them.
+    """
+    try:
+        with telemetry.span('warm_start'):
+            # A tool call that needs the indexes meanwhile waits for this seeding
+            tenant.event_store.seed_listeners()
+            tenant.get_service()
+            tenant.event_store.sync(calendar_id)
+    except Exception as e:
+        print(f"Warm start failed: {e}", file=sys.stderr)
+
+
+@atexit.register
+def _flush_write_queues():
+    for tenant in tenant_pool.tenants():
+        tenant.write_queue.flush_all()
+
+
+def run_server(transport: str = 'stdio'):
+    """Serve over stdio (the default account) or SSE (one account per session key)."""
+    if transport != 'sse':
+        # The handshake is answered right away; a tool call arriving before the
+        # warm-up finishes simply waits on the same locks
+        if WARM_START:
+            _tool_executor.submit(warm_start, default_tenant)
+        mcp.run(transport=transport)
+        return
+    import uvicorn
+    starlette_app = mcp.sse_app()
+    if watch_manager.enabled:
+        # Open channels once the webhook can answer Google's first 'sync' message
+        starlette_app.router.on_startup.append(WatchRenewer(watch_manager).start)
+        starlette_app.router.on_shutdown.append(watch_manager.stop_all)
+    app = TenantMiddleware(starlette_app, tenant_pool, mcp.settings.sse_path)
+    TokenRefresher(tenant_pool).start()
+    uvicorn.run(app, host=mcp.settings.host, port=mcp.settings.port,
+                log_level=mcp.settings.log_level.lower())
+
+
 # Run this MCP server; the 'manage_calendar' tool can replace CLI logic.
+# MCP_TRANSPORT=sse serves http://FASTMCP_HOST:FASTMCP_PORT/sse instead of stdio.
 if __name__ == '__main__':
-    mcp.run(transport="stdio")
+    run_server(os.environ.get('MCP_TRANSPORT', 'stdio'))
@@ -0,0 +1,266 @@
+"""
+Google Calendar service manager, one per account.
+
+Builds the Calendar client once, keeps the OAuth credentials fresh and only
+re-reads the token file when it changes on disk. The parsed discovery
+document and the per-thread HTTP connections are shared by every manager in
+the process, so each additional account costs only its credentials and a
+thin client object. The Google client libraries are imported on first use,
+so importing this module (and starting the server) does not pay for them.
+"""
+
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+from urllib.parse import quote
+
+from http_cache import CachingHttp, ResponseCache
+from scheduler import RequestScheduler, retry_safe, scheduler as default_scheduler
+from telemetry import telemetry
+
+# Refresh the access token this many seconds before it actually expires
+TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', '300'))
+
+# Per-thread httplib2 connections shared by all managers (requests carry their
+# own Authorization header, so accounts never share credentials)
+_connections = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def _discovery_document() -> dict:
+    from googleapiclient.discovery_cache import get_static_doc
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+
+def _thread_connection() -> 'httplib2.Http':
+    http = getattr(_connections, 'http', None)
+    if http is None:
+        import httplib2
+        http = _connections.http = httplib2.Http()
+    return http
+
+
+def _revoked(error: Exception) -> bool:
+    """Whether a ``RefreshError`` means the refresh token was revoked or expired (``invalid_grant``)."""
+    for arg in error.args:
+        if isinstance(arg, dict) and arg.get('error') == 'invalid_grant':
+            return True
+    return 'invalid_grant' in str(error)
+
+
+class CalendarServiceManager:
+    """Thread-safe cache of credentials and the discovery-built Calendar client.
+
+    The discovery document is processed once per process. Every request gets
+    an ``AuthorizedHttp`` bound to a per-thread ``httplib2.Http`` (httplib2 is
+    not thread-safe) and to the current credentials, so reloading or
+    refreshing the token never requires rebuilding the client. GET responses
+    go through a ``ResponseCache`` (see http_cache.py) under
+    ``cache_namespace``, so several accounts can share one cache, and requests
+    are paced by ``scheduler``, which holds this account's quota.
+    """
+
+    def __init__(self, token_file: str, scopes: list, refresh_margin: int = TOKEN_REFRESH_MARGIN,
+                 response_cache: ResponseCache = None, cache_namespace: str = '',
+                 scheduler: RequestScheduler = None):
+        self.token_file = token_file
+        self.scopes = scopes
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self.response_cache = response_cache or ResponseCache()
+        self.cache_namespace = cache_namespace
+        self.scheduler = scheduler or default_scheduler
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._credentials = None
+        self._token_mtime = None
+        self._service = None
+        self._pinned = None
+        self._stats = {'builds': 0, 'refreshes': 0, 'refresh_failures': 0, 'reloads': 0, 'cache_hits': 0}
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def get_service(self):
+        """Return the shared Calendar client, refreshing credentials if needed."""
+        with self._lock:
+            if self._pinned is not None:
+                self._stats['cache_hits'] += 1
+                return self._pinned
+            reloaded = self._reload_if_changed()
+            refreshed = self._refresh_if_needed()
+            if self._service is None:
+                from googleapiclient.discovery import build_from_document
+                with telemetry.span('discovery_build'):
+                    self._service = build_from_document(_discovery_document(), http=self._thread_http(),
+                                                        requestBuilder=self._build_request)
+                self._stats['builds'] += 1
+            elif not reloaded and not refreshed:
+                self._stats['cache_hits'] += 1
+            return self._service
+
+    def get_credentials(self) -> 'Credentials':
+        """Return valid credentials without building the client."""
+        with self._lock:
+            self._reload_if_changed()
+            self._refresh_if_needed()
+            return self._credentials
+
+    def refresh(self) -> bool:
+        """Reload or refresh the token now if it changed or expires soon.
+
+        Meant for a background thread, so tool calls rarely wait on a refresh.
+        Returns whether anything changed; does nothing while a service is
+        pinned or before the credentials were first loaded.
+        """
+        with self._lock:
+            if self._pinned is not None or self._credentials is None:
+                return False
+            reloaded = self._reload_if_changed()
+            return self._refresh_if_needed() or reloaded
+
+    def use_service(self, service):
+        """Serve ``service`` (e.g. an offline fake) instead of the Google client.
+
+        Credentials are not loaded while a service is pinned; pass None to
+        go back to the real client.
+        """
+        with self._lock:
+            self._pinned = service
+
+    def invalidate(self):
+        """Drop cached credentials and client; the next call starts from scratch."""
+        with self._lock:
+            self._credentials = None
+            self._token_mtime = None
+            self._service = None
+            self._local = threading.local()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    def _reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.token_file).st_mtime_ns
+        except FileNotFoundError:
+            self._credentials = None
+            self._token_mtime = None
+            raise Exception(f"No valid credentials found. Please run authentication outside container first. Place token.json in {self.token_file}")
+        if self._credentials is not None and mtime == self._token_mtime:
+            return False
+        from google.oauth2.credentials import Credentials
+        with telemetry.span('token_reload'):
+            self._credentials = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+        self._token_mtime = mtime
+        self._stats['reloads'] += 1
+        return True
+
+    def _refresh_if_needed(self) -> bool:
+        creds = self._credentials
+        if creds.valid and not self._expires_soon(creds):
+            return False
+        if not creds.refresh_token:
+            raise Exception(f"No valid credentials found. Please run authentication outside container first. Place token.json in {self.token_file}")
+        from google.auth.exceptions import RefreshError
+        from google.auth.transport.requests import Request
+        try:
+            with telemetry.span('token_refresh'):
+                creds.refresh(Request())
+        except RefreshError as e:
+            if _revoked(e):
+                # The refresh token itself is dead: only a new OAuth flow helps
+                os.remove(self.token_file)
+                self.invalidate()
+                raise Exception("Token expired and could not be refreshed. Please re-authenticate.")
+            return self._refresh_failed(creds, e)
+        except Exception as e:
+            return self._refresh_failed(creds, e)
+        self._stats['refreshes'] += 1
+        self._save_credentials(creds)
+        return True
+
+    def _refresh_failed(self, creds, error: Exception) -> bool:
+        # A transient failure (network, 5xx): keep the token, try again on the next call
+        self._stats['refresh_failures'] += 1
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if creds.token and (creds.expiry is None or creds.expiry > now):
+            print(f"Token refresh failed, using the current token until it expires: {error}", file=sys.stderr)
+            return False
+        raise Exception(f"Token refresh failed: {error}")
+
+    def _expires_soon(self, creds) -> bool:
+        if creds.expiry is None:
+            return False
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= self.refresh_margin
+
+    def _save_credentials(self, creds):
+        # Persist the refreshed token so other processes (and restarts) reuse it;
+        # remember the new mtime so our own write does not trigger a reload.
+        try:
+            with open(self.token_file, 'w') as token:
+                token.write(creds.to_json())
+            self._token_mtime = os.stat(self.token_file).st_mtime_ns
+        except OSError:
+            pass
+
+    def _thread_http(self) -> 'AuthorizedHttp':
+        http = getattr(self._local, 'http', None)
+        if http is None or http.credentials is not self._credentials:
+            from google_auth_httplib2 import AuthorizedHttp
+            base = getattr(self._local, 'base_http', None)
+            if base is None:
+                base = self._local.base_http = CachingHttp(_thread_connection(), self.response_cache,
+                                                           self.cache_namespace)
+            http = self._local.http = AuthorizedHttp(self._credentials, http=base)
+        return http
+
+    def _build_request(self, http, *args, **kwargs) -> 'HttpRequest':
+        # Ignore the client's shared http object and use this thread's connection
+        request = _request_class()(self._thread_http(), *args, **kwargs)
+        request.scheduler = self.scheduler
+        return request
+
+
+@functools.lru_cache(maxsize=None)
+def _request_class() -> type:
+    """Define ``ScheduledRequest`` on first use; it subclasses googleapiclient's ``HttpRequest``."""
+    from googleapiclient.http import HttpRequest
+
+    class ScheduledRequest(HttpRequest):
+        """``HttpRequest`` whose execute() goes through the request scheduler.
+
+        Each attempt is counted and timed per API method, paced by the rate
+        limiter and retried per the scheduler's policy (see scheduler.py).
+        """
+
+        scheduler = default_scheduler
+
+        def execute(self, http=None, num_retries=0):
+            def attempt():
+                with telemetry.api_call(self.methodId):
+                    return super(ScheduledRequest, self).execute(http=http)
+            return self.scheduler.run(self.methodId, attempt, retry_safe(self.methodId, self.method, self.body),
+                                      recover=self._recover)
+
+        def _recover(self, error):
+            # A retried delete found the event gone, or a retried keyed insert found it
+            # created: the lost first attempt did the work, so answer as it would have.
+            if self.method == 'DELETE':
+                import httplib2
+                return self.postproc(httplib2.Response({'status': 204}), b'')
+            event_id = json.loads(self.body)['id']
+            base, _, query = self.uri.partition('?')
+            get = ScheduledRequest(self.http, self.postproc, f"{base}/{quote(event_id, safe='')}?{query}",
+                                   methodId='calendar.events.get')
+            get.scheduler = self.scheduler
+            return get.execute()
+
+    return ScheduledRequest
@@ -0,0 +1,47 @@
+"""
+Export or import calendar events from the command line.
+
+Uses the server's account (TOKEN_FILE, EVENT_STORE_PATH); paths are taken
+as given rather than inside TRANSFER_DIR. Examples:
+    python calendar_transfer.py export backup.jsonl
+    python calendar_transfer.py export team.ics --calendar team@group.calendar.google.com --start 2025-01-01
+    python calendar_transfer.py import backup.jsonl --calendar archive@group.calendar.google.com
+"""
+
+import argparse
+import json
+import sys
+
+from calendar_mcp import default_tenant, export_calendar, import_calendar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='write a calendar to a .jsonl or .ics file')
+    export.add_argument('--start', help='only events ending after this date/time')
+    export.add_argument('--end', help='only events starting before this date/time')
+    restore = commands.add_parser('import', help='import a .jsonl or .ics file into a calendar')
+    restore.add_argument('--no-skip-existing', action='store_true',
+                         help='update events whose iCalUID is already in the calendar')
+    restore.add_argument('--restart', action='store_true', help='ignore the checkpoint of an earlier run')
+    for command in (export, restore):
+        command.add_argument('path')
+        command.add_argument('--calendar', default='primary')
+        command.add_argument('--format', choices=('jsonl', 'ics'), help='default: from the file extension')
+        command.add_argument('--timezone', default='Asia/Karachi')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        result = export_calendar(default_tenant, args.path, args.calendar, args.start, args.end,
+                                 args.format, args.timezone)
+    else:
+        result = import_calendar(default_tenant, args.path, args.calendar, args.format, args.timezone,
+                                 not args.no_skip_existing, not args.restart)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return 1 if result.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
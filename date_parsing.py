@@ -0,0 +1,76 @@
+"""
+Date/time parsing for tool inputs.
+
+ISO-8601/RFC3339 strings take a ``datetime.fromisoformat`` fast path; only
+free-form text falls back to dateutil. Time zone objects and repeated
+parses are memoized.
+"""
+
+import datetime
+import functools
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name: str) -> datetime.tzinfo:
+    """Return a cached tzinfo for an IANA zone name."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        # No system/tzdata zoneinfo (e.g. slim images): use dateutil's bundled data
+        from dateutil import tz
+        zone = tz.gettz(name)
+        if zone is None:
+            raise ValueError(f"Unknown timezone '{name}'")
+        return zone
+
+
+def _localize(dt: datetime.datetime, timezone: str) -> str:
+    target_tz = get_zone(timezone)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=target_tz)
+    else:
+        dt = dt.astimezone(target_tz)
+    return dt.isoformat()
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_iso(user_input: str, timezone: str) -> str:
+    return _localize(datetime.datetime.fromisoformat(user_input), timezone)
+
+
+@functools.lru_cache(maxsize=2048)
+def _parse_freeform(user_input: str, timezone: str, today: datetime.date) -> str:
+    # ``today`` is part of the cache key: dateutil fills missing parts from it
+    from dateutil import parser
+    return _localize(parser.parse(user_input, dayfirst=False, yearfirst=True), timezone)
+
+
+def parse_datetime(user_input: str, timezone: str = 'Asia/Karachi') -> str:
+    """
+    Parse a free-form datetime string, attach/convert to the given zone,
+    and return an RFC3339 string with offset (e.g. '2025-05-20T15:00:00+05:00').
+    """
+    if not user_input:
+        return None
+    try:
+        return _parse_iso(user_input, timezone)
+    except ValueError:
+        return _parse_freeform(user_input, timezone, datetime.date.today())
+
+
+def parse_many(inputs, timezone: str = 'Asia/Karachi') -> list:
+    """Parse a batch of inputs, parsing each distinct value only once."""
+    today = datetime.date.today()
+    parsed = {}
+    for value in inputs:
+        if value in parsed:
+            continue
+        if not value:
+            parsed[value] = None
+            continue
+        try:
+            parsed[value] = _parse_iso(value, timezone)
+        except ValueError:
+            parsed[value] = _parse_freeform(value, timezone, today)
+    return [parsed[value] for value in inputs]
@@ -0,0 +1,80 @@
+"""
+Compact event representation and response profiles for tool results.
+
+Raw Google event resources carry many fields the tools never use (etag,
+htmlLink, creator, reminders, ...). Tool responses are projected to one of
+three profiles instead:
+
+- ``minimal``  -> id, summary, start, end
+- ``standard`` -> minimal + location, description, time_zone, status, recurring_event_id
+- ``full``     -> the mirrored API resource as-is
+
+Profiles only trim what the mirror returns: the API is always queried with
+the event store's ``SYNC_FIELDS`` so one cached copy serves every profile.
+"""
+
+from dataclasses import dataclass
+
+PROFILES = ('minimal', 'standard', 'full')
+DEFAULT_PROFILE = 'standard'
+
+@dataclass(slots=True)
+class EventRecord:
+    id: str
+    summary: str
+    start: str
+    end: str
+    time_zone: str = None
+    location: str = None
+    description: str = None
+    status: str = None
+    recurring_event_id: str = None
+
+    @classmethod
+    def from_api(cls, event: dict) -> 'EventRecord':
+        start = event.get('start') or {}
+        end = event.get('end') or {}
+        return cls(
+            id=event['id'],
+            summary=event.get('summary', ''),
+            start=start.get('dateTime') or start.get('date'),
+            end=end.get('dateTime') or end.get('date'),
+            time_zone=start.get('timeZone'),
+            location=event.get('location') or None,
+            description=event.get('description') or None,
+            status=event.get('status'),
+            recurring_event_id=event.get('recurringEventId'),
+        )
+
+    def as_dict(self, profile: str = DEFAULT_PROFILE) -> dict:
+        data = {'id': self.id, 'summary': self.summary, 'start': self.start, 'end': self.end}
+        if profile == 'minimal':
+            return data
+        for key in ('time_zone', 'location', 'description', 'recurring_event_id'):
+            value = getattr(self, key)
+            if value:
+                data[key] = value
+        # 'confirmed' is the norm; only report unusual states
+        if self.status and self.status != 'confirmed':
+            data['status'] = self.status
+        return data
+
+
+def check_profile(profile: str) -> str:
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}'. Use 'minimal', 'standard', or 'full'.")
+    return profile
+
+
+def project(event: dict, profile: str = DEFAULT_PROFILE) -> dict:
+    """Shape one API event for a tool response."""
+    if check_profile(profile) == 'full':
+        return event
+    return EventRecord.from_api(event).as_dict(profile)
+
+
+def project_all(events, profile: str = DEFAULT_PROFILE) -> list:
+    check_profile(profile)
+    if profile == 'full':
+        return list(events)
+    return [EventRecord.from_api(event).as_dict(profile) for event in events]
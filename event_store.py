@@ -0,0 +1,694 @@
+"""
+Local incremental mirror of Google Calendar events.
+
+The mirror is seeded once with a full ``events().list`` and then kept current
+with ``syncToken`` pulls, so list, lookup and range queries are answered from
+SQLite instead of a network round trip. Calendars with an active push
+channel (see push.py) are trusted for longer: the push triggers their next
+pull.
+
+Recurring events are pulled unexpanded: each series is stored once, as its
+master, and range queries expand it for the requested window (see
+recurrence.py). Modified and cancelled instances are stored as overrides of
+the occurrences they replace.
+"""
+
+import datetime
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from date_parsing import get_zone
+from listing import MAX_PAGE_SIZE, iter_pages
+from recurrence import Series, is_recurring, split_instance_id
+from telemetry import telemetry
+
+# Serve queries from the mirror for this many seconds before pulling changes
+EVENT_STORE_MAX_AGE = float(os.environ.get('EVENT_STORE_MAX_AGE', '30'))
+# ... and this long for watched calendars, in case a push notification is lost
+EVENT_STORE_WATCHED_MAX_AGE = float(os.environ.get('EVENT_STORE_WATCHED_MAX_AGE', '3600'))
+
+# Event fields kept in the mirror (partial response mask for sync pulls): what the
+# profiles, lookups, search (attendees, organizer) and busy time (transparency,
+# own response) read; links, reminders and the like are left out
+SYNC_FIELDS = ('id,status,etag,updated,iCalUID,summary,description,location,'
+               'start,end,recurrence,recurringEventId,originalStartTime,transparency,'
+               'organizer(email,displayName),attendees(email,displayName,responseStatus,self)')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id    TEXT NOT NULL,
+    start_ts    REAL,
+    end_ts      REAL,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_by_start ON events (calendar_id, start_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token  TEXT,
+    time_zone   TEXT,
+    synced_at   REAL
+);
+CREATE TABLE IF NOT EXISTS series (
+    calendar_id TEXT NOT NULL,
+    event_id    TEXT NOT NULL,
+    start_ts    REAL,               -- first occurrence
+    end_ts      REAL,               -- end of the last occurrence; NULL if it never ends
+    data        TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE TABLE IF NOT EXISTS overrides (
+    calendar_id TEXT NOT NULL,
+    event_id    TEXT NOT NULL,      -- the modified or cancelled instance
+    master_id   TEXT NOT NULL,
+    original_ts REAL NOT NULL,      -- start of the occurrence it replaces
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS overrides_by_master ON overrides (calendar_id, master_id);
+CREATE TABLE IF NOT EXISTS pulled (
+    calendar_id TEXT NOT NULL,
+    seq         INTEGER NOT NULL,   -- listing order
+    data        TEXT NOT NULL,      -- event of a pull whose last page has not arrived yet
+    PRIMARY KEY (calendar_id, seq)
+);
+"""
+# Bumped when mirrors must be rebuilt; 2 = recurring events stored unexpanded
+SCHEMA_VERSION = 2
+
+
+def event_bounds(event: dict, time_zone: str = None) -> tuple:
+    """Return (start, end) of an API event as POSIX timestamps.
+
+    All-day events only carry a date; they are anchored at midnight in the
+    calendar's time zone (UTC if unknown).
+    """
+    return (_to_timestamp(event.get('start'), time_zone),
+            _to_timestamp(event.get('end'), time_zone))
+
+
+def _to_timestamp(when: dict, time_zone: str = None):
+    if not when:
+        return None
+    if when.get('dateTime'):
+        return datetime.datetime.fromisoformat(when['dateTime']).timestamp()
+    if when.get('date'):
+        zone = get_zone(time_zone) if time_zone else datetime.timezone.utc
+        return datetime.datetime.fromisoformat(when['date']).replace(tzinfo=zone).timestamp()
+    return None
+
+
+class SQLiteBackend:
+    """SQLite storage for the mirror; use ``':memory:'`` for a throwaway store."""
+
+    def __init__(self, path: str = ':memory:'):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            # Older mirrors hold expanded instances and singleEvents sync tokens: start over
+            self.conn.executescript('DELETE FROM events; DELETE FROM sync_state;')
+            self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def begin(self):
+        self.conn.execute('BEGIN')
+
+    def commit(self):
+        self.conn.execute('COMMIT')
+
+    def rollback(self):
+        self.conn.execute('ROLLBACK')
+
+    def get_state(self, calendar_id: str):
+        row = self.conn.execute(
+            'SELECT sync_token, time_zone, synced_at FROM sync_state WHERE calendar_id = ?',
+            (calendar_id,)).fetchone()
+        return None if row is None else {'sync_token': row[0], 'time_zone': row[1], 'synced_at': row[2]}
+
+    def set_state(self, calendar_id: str, sync_token: str, time_zone: str, synced_at: float):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, time_zone, synced_at) '
+            'VALUES (?, ?, ?, ?)', (calendar_id, sync_token, time_zone, synced_at))
+
+    def stage(self, calendar_id: str, first_seq: int, events: list):
+        self.conn.executemany('INSERT INTO pulled (calendar_id, seq, data) VALUES (?, ?, ?)',
+                              ((calendar_id, first_seq + i, json.dumps(event)) for i, event in enumerate(events)))
+
+    def iter_staged(self, calendar_id: str, batch_size: int = 500):
+        """Yield the staged events of ``calendar_id`` in listing order, ``batch_size`` at a time."""
+        cursor = self.conn.execute('SELECT data FROM pulled WHERE calendar_id = ? ORDER BY seq', (calendar_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [json.loads(data) for data, in rows]
+
+    def clear_staged(self, calendar_id: str):
+        self.conn.execute('DELETE FROM pulled WHERE calendar_id = ?', (calendar_id,))
+
+    def clear(self, calendar_id: str):
+        for table in ('events', 'series', 'overrides', 'sync_state'):
+            self.conn.execute(f'DELETE FROM {table} WHERE calendar_id = ?', (calendar_id,))
+
+    def upsert(self, calendar_id: str, event: dict, start_ts: float, end_ts: float):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO events (calendar_id, event_id, start_ts, end_ts, data) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (calendar_id, event['id'], start_ts, end_ts, json.dumps(event, separators=(',', ':'))))
+
+    def delete(self, calendar_id: str, event_id: str):
+        self.conn.execute('DELETE FROM events WHERE calendar_id = ? AND event_id = ?',
+                          (calendar_id, event_id))
+
+    def get(self, calendar_id: str, event_id: str):
+        row = self.conn.execute('SELECT data FROM events WHERE calendar_id = ? AND event_id = ?',
+                                (calendar_id, event_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def upsert_series(self, calendar_id: str, event: dict, start_ts: float, end_ts: float):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO series (calendar_id, event_id, start_ts, end_ts, data) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (calendar_id, event['id'], start_ts, end_ts, json.dumps(event, separators=(',', ':'))))
+
+    def delete_series(self, calendar_id: str, event_id: str) -> list:
+        """Drop a master and its overrides; returns the IDs of its modified instances, also dropped."""
+        if not self.conn.execute('DELETE FROM series WHERE calendar_id = ? AND event_id = ?',
+                                 (calendar_id, event_id)).rowcount:
+            return []
+        ids = [row[0] for row in self.conn.execute(
+            'SELECT event_id FROM overrides WHERE calendar_id = ? AND master_id = ?', (calendar_id, event_id))]
+        self.conn.execute('DELETE FROM overrides WHERE calendar_id = ? AND master_id = ?', (calendar_id, event_id))
+        self.conn.executemany('DELETE FROM events WHERE calendar_id = ? AND event_id = ?',
+                              [(calendar_id, i) for i in ids])
+        return ids
+
+    def get_series(self, calendar_id: str, event_id: str):
+        row = self.conn.execute('SELECT data FROM series WHERE calendar_id = ? AND event_id = ?',
+                                (calendar_id, event_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def iter_series(self, calendar_id: str, time_min: float = None, time_max: float = None) -> list:
+        """Masters with occurrences that may overlap [time_min, time_max)."""
+        sql = 'SELECT data FROM series WHERE calendar_id = ?'
+        args = [calendar_id]
+        if time_min is not None:
+            sql += ' AND (end_ts IS NULL OR end_ts > ?)'
+            args.append(time_min)
+        if time_max is not None:
+            sql += ' AND start_ts < ?'
+            args.append(time_max)
+        return [json.loads(row[0]) for row in self.conn.execute(sql, args)]
+
+    def set_override(self, calendar_id: str, event_id: str, master_id: str, original_ts: float):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO overrides (calendar_id, event_id, master_id, original_ts) '
+            'VALUES (?, ?, ?, ?)', (calendar_id, event_id, master_id, original_ts))
+
+    def delete_override(self, calendar_id: str, event_id: str):
+        self.conn.execute('DELETE FROM overrides WHERE calendar_id = ? AND event_id = ?', (calendar_id, event_id))
+
+    def overrides(self, calendar_id: str, master_id: str) -> dict:
+        """``{original_ts: instance id}`` of a master's modified and cancelled instances."""
+        return dict(self.conn.execute(
+            'SELECT original_ts, event_id FROM overrides WHERE calendar_id = ? AND master_id = ?',
+            (calendar_id, master_id)))
+
+    def iter_range(self, calendar_id: str, time_min: float = None, time_max: float = None,
+                   after: tuple = None, limit: int = None, keyed: bool = False):
+        """Yield events ordered by (start, id); ``after`` is an exclusive keyset position.
+
+        With ``keyed``, yield ``(start_ts, event_id, event)`` tuples instead.
+        """
+        sql = 'SELECT start_ts, event_id, data FROM events WHERE calendar_id = ?'
+        args = [calendar_id]
+        if time_min is not None:
+            sql += ' AND end_ts > ?'
+            args.append(time_min)
+        if time_max is not None:
+            sql += ' AND start_ts < ?'
+            args.append(time_max)
+        if after is not None:
+            sql += ' AND (start_ts, event_id) > (?, ?)'
+            args.extend(after)
+        sql += ' ORDER BY start_ts, event_id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        for start_ts, event_id, data in self.conn.execute(sql, args):
+            yield (start_ts, event_id, json.loads(data)) if keyed else json.loads(data)
+
+    def iter_bounds(self, calendar_id: str, time_min: float, time_max: float):
+        """Yield ``(start_ts, end_ts, event)`` of stored events overlapping a window, unordered."""
+        rows = self.conn.execute('SELECT start_ts, end_ts, data FROM events WHERE calendar_id = ? '
+                                 'AND end_ts > ? AND start_ts < ?', (calendar_id, time_min, time_max))
+        for start_ts, end_ts, data in rows:
+            yield start_ts, end_ts, json.loads(data)
+
+    def iter_ical_keys(self, calendar_id: str):
+        """Yield ``(iCalUID, original_ts)`` of a calendar's events and masters (original_ts None unless an exception)."""
+        return self.conn.execute(
+            "SELECT json_extract(e.data, '$.iCalUID'), o.original_ts FROM events e LEFT JOIN overrides o "
+            "ON o.calendar_id = e.calendar_id AND o.event_id = e.event_id WHERE e.calendar_id = ? UNION ALL "
+            "SELECT json_extract(data, '$.iCalUID'), NULL FROM series WHERE calendar_id = ? UNION ALL "
+            # Cancelled occurrences only live in overrides; they carry their series' iCalUID
+            "SELECT json_extract(s.data, '$.iCalUID'), o.original_ts FROM overrides o JOIN series s "
+            "ON s.calendar_id = o.calendar_id AND s.event_id = o.master_id WHERE o.calendar_id = ?",
+            (calendar_id, calendar_id, calendar_id))
+
+    def iter_all(self):
+        """(calendar_id, event, start_ts, end_ts) for every mirrored event and master.
+
+        The rows are read at the call; events are decoded as they are iterated.
+        """
+        rows = self.conn.execute('SELECT calendar_id, data, start_ts, end_ts FROM events UNION ALL '
+                                 'SELECT calendar_id, data, start_ts, end_ts FROM series').fetchall()
+        return ((calendar_id, json.loads(data), start_ts, end_ts) for calendar_id, data, start_ts, end_ts in rows)
+
+
+class EventStore:
+    """Calendar mirror kept in sync through ``events().list`` sync tokens.
+
+    ``service_factory`` returns a Calendar client (the real one or a fake with
+    the same ``events().list`` shape); ``backend`` persists the events.
+    Listeners (e.g. ``NameIndex``) receive ``on_upsert``, ``on_delete`` and
+    ``on_clear`` calls for every committed change.
+    """
+
+    def __init__(self, service_factory, backend=None, max_age: float = EVENT_STORE_MAX_AGE,
+                 watched_max_age: float = EVENT_STORE_WATCHED_MAX_AGE):
+        self.service_factory = service_factory
+        self.backend = backend or SQLiteBackend()
+        self.max_age = max_age
+        self.watched_max_age = watched_max_age
+        self._lock = threading.RLock()
+        self._sync_locks = {}   # calendar id -> lock held while that calendar syncs
+        self._series = {}       # (calendar id, master id) -> parsed Series
+        self._listeners = []
+        self._unseeded = []     # lazy listeners, seeded on their first use
+        self._seed_lock = threading.Lock()
+        self._seeding = None    # changes committed while lazy listeners are seeded
+        self._pull_hooks = []
+        self._watched = set()
+        self._stats = {'full_syncs': 0, 'incremental_syncs': 0, 'invalidations': 0,
+                       'changes_applied': 0, 'queries': 0, 'expansions': 0}
+
+    def add_listener(self, listener, lazy: bool = False):
+        """Subscribe ``listener`` to changes, seeding it with the current contents.
+
+        With ``lazy`` the seeding (a read of every stored event) is left to
+        ``seed_listeners``, which the listener's owner calls before using it.
+        """
+        with self._lock:
+            if lazy:
+                self._unseeded.append(listener)
+                return
+            for calendar_id, event, start_ts, end_ts in self.backend.iter_all():
+                listener.on_upsert(calendar_id, event, start_ts, end_ts)
+            self._listeners.append(listener)
+
+    def seed_listeners(self):
+        """Seed the lazy listeners in one pass over the store; a no-op once done.
+
+        Only reading the rows holds the store lock: the listeners are fed
+        outside it, so syncs and queries go on, and changes committed
+        meanwhile are replayed to them in order afterwards. Callers wait for
+        a seeding already under way.
+        """
+        if not self._unseeded:
+            return
+        with self._seed_lock:
+            if not self._unseeded:
+                return  # seeded by another thread while this one waited
+            try:
+                with telemetry.span('seed_listeners'):
+                    with self._lock:
+                        rows = self.backend.iter_all()
+                        self._seeding = []
+                    for calendar_id, event, start_ts, end_ts in rows:
+                        for listener in self._unseeded:
+                            listener.on_upsert(calendar_id, event, start_ts, end_ts)
+                    with self._lock:
+                        for method, args in self._seeding:
+                            for listener in self._unseeded:
+                                getattr(listener, method)(*args)
+                        # Changes reach them directly from here on
+                        self._listeners.extend(self._unseeded)
+                        self._unseeded = []
+            finally:
+                with self._lock:
+                    self._seeding = None
+
+    def add_pull_hook(self, hook):
+        """Call ``hook(calendar_id)`` before each pull (e.g. to send queued local edits first)."""
+        self._pull_hooks.append(hook)
+
+    def _notify(self, changes):
+        if self._seeding is not None:
+            self._seeding.extend(changes)
+        for method, args in changes:
+            for listener in self._listeners:
+                getattr(listener, method)(*args)
+
+    # ----------------------------
+    # Synchronisation
+    # ----------------------------
+    def mirrored(self, calendar_id: str) -> bool:
+        """Whether ``calendar_id`` was synced before (its next sync is incremental)."""
+        with self._lock:
+            state = self.backend.get_state(calendar_id)
+            return bool(state and state['sync_token'])
+
+    def set_watched(self, calendar_id: str, watched: bool):
+        """Mark whether push notifications announce changes to ``calendar_id``."""
+        with self._lock:
+            if watched:
+                self._watched.add(calendar_id)
+            else:
+                self._watched.discard(calendar_id)
+
+    def sync(self, calendar_id: str = 'primary', force: bool = False):
+        """Bring the mirror up to date unless it was synced within ``max_age``.
+
+        Different calendars sync concurrently; the store is only locked while
+        the pulled changes are written.
+        """
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(calendar_id, threading.Lock())
+        with sync_lock:
+            with self._lock:
+                state = self.backend.get_state(calendar_id)
+                max_age = self.watched_max_age if calendar_id in self._watched else self.max_age
+            if (not force and state and state['sync_token']
+                    and time.time() - state['synced_at'] < max_age):
+                return
+            for hook in self._pull_hooks:
+                hook(calendar_id)
+            with telemetry.span('mirror_sync', calendar_id=calendar_id):
+                if state and state['sync_token']:
+                    try:
+                        self._pull(calendar_id, state['sync_token'], state['time_zone'])
+                        self._count('incremental_syncs')
+                        return
+                    except HttpError as e:
+                        if e.resp.status != 410:
+                            raise
+                        # Sync token expired or invalidated: start over with a full sync
+                        self._count('invalidations')
+                self._pull(calendar_id, None, None)
+                self._count('full_syncs')
+
+    def _pull(self, calendar_id: str, sync_token: str, time_zone: str):
+        # Recurring events come as one master plus their exceptions
+        params = {}
+        if sync_token:
+            params['syncToken'] = sync_token
+        # Each page is fetched without the store lock, so queries and other calendars'
+        # syncs go on, and staged in SQLite rather than kept in memory. The pull is
+        # applied in one transaction once its last page has arrived.
+        with self._lock:
+            self.backend.clear_staged(calendar_id)
+        staged, next_sync_token = 0, None
+        try:
+            for response in iter_pages(self.service_factory(), calendar_id, SYNC_FIELDS, MAX_PAGE_SIZE, **params):
+                time_zone = response.get('timeZone', time_zone)
+                next_sync_token = response.get('nextSyncToken')
+                items = response.get('items', [])
+                with self._lock:
+                    self.backend.begin()
+                    try:
+                        self.backend.stage(calendar_id, staged, items)
+                        self.backend.commit()
+                    except BaseException:
+                        self.backend.rollback()
+                        raise
+                staged += len(items)
+            with self._lock:
+                self._apply_pulled(calendar_id, not sync_token, time_zone, next_sync_token)
+        finally:
+            with self._lock:
+                self.backend.clear_staged(calendar_id)
+
+    def _apply_pulled(self, calendar_id: str, full: bool, time_zone: str, sync_token: str):
+        """Write a staged pull into the mirror (call with the lock held).
+
+        Listeners are told about each batch as it is written; if the
+        transaction fails they are reset to what the mirror still holds.
+        """
+        notified = False
+        self.backend.begin()
+        try:
+            if full:
+                self.backend.clear(calendar_id)
+                self._drop_series(calendar_id)
+                notified = True
+                self._notify([('on_clear', (calendar_id,))])
+            for events in self.backend.iter_staged(calendar_id):
+                changes = []
+                for event in events:
+                    changes.extend(self._write(calendar_id, event, time_zone))
+                self._stats['changes_applied'] += len(changes)
+                notified = True
+                self._notify(changes)
+            self.backend.clear_staged(calendar_id)
+            self.backend.set_state(calendar_id, sync_token, time_zone, time.time())
+            self.backend.commit()
+        except BaseException:
+            self.backend.rollback()
+            self._drop_series(calendar_id)
+            if notified:
+                self._notify([('on_clear', (calendar_id,))])
+                for row in self.backend.iter_all():
+                    if row[0] == calendar_id:
+                        self._notify([('on_upsert', row)])
+            raise
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _write(self, calendar_id: str, event: dict, time_zone: str) -> list:
+        """Store one pulled event; returns the listener calls it causes."""
+        event_id = event['id']
+        if event.get('recurringEventId') and event.get('originalStartTime'):
+            # An exception: it replaces the occurrence it was expanded from
+            self.backend.set_override(calendar_id, event_id, event['recurringEventId'],
+                                      _to_timestamp(event['originalStartTime'], time_zone))
+        self._series.pop((calendar_id, event_id), None)
+        changes = []
+        if event.get('status') == 'cancelled' or not is_recurring(event):
+            # A deleted master (or one that stopped recurring) takes its modified instances with it
+            changes = [('on_delete', (calendar_id, i)) for i in self.backend.delete_series(calendar_id, event_id)]
+        if event.get('status') == 'cancelled':
+            self.backend.delete(calendar_id, event_id)
+            return changes + [('on_delete', (calendar_id, event_id))]
+        if is_recurring(event):
+            series = self._series[calendar_id, event_id] = Series(event, time_zone)
+            start_ts, end_ts = series.bounds()
+            self.backend.delete(calendar_id, event_id)
+            self.backend.upsert_series(calendar_id, event, start_ts, end_ts)
+        else:
+            start_ts, end_ts = event_bounds(event, time_zone)
+            self.backend.upsert(calendar_id, event, start_ts, end_ts)
+        return changes + [('on_upsert', (calendar_id, event, start_ts, end_ts))]
+
+    def _drop_series(self, calendar_id: str):
+        for key in [k for k in self._series if k[0] == calendar_id]:
+            del self._series[key]
+
+    def _load_series(self, calendar_id: str, master_id: str, master: dict = None):
+        """The parsed ``Series`` of a mirrored master, or None (call with the lock held)."""
+        series = self._series.get((calendar_id, master_id))
+        if series is None:
+            master = master or self.backend.get_series(calendar_id, master_id)
+            if master is None:
+                return None
+            state = self.backend.get_state(calendar_id)
+            series = self._series[calendar_id, master_id] = Series(master, state and state['time_zone'])
+        return series
+
+    # ----------------------------
+    # Local writes (keep the mirror current after our own mutations)
+    # ----------------------------
+    def apply(self, calendar_id: str, event: dict):
+        with self._lock:
+            state = self.backend.get_state(calendar_id)
+            self._notify(self._write(calendar_id, event, state and state['time_zone']))
+
+    def remove(self, calendar_id: str, event_id: str):
+        with self._lock:
+            state = self.backend.get_state(calendar_id)
+            event = self._get(calendar_id, event_id) or {}
+            # Deleting an instance leaves a cancelled exception, as the API reports it
+            cancelled = {'id': event_id, 'status': 'cancelled'}
+            for key in ('recurringEventId', 'originalStartTime'):
+                if key in event:
+                    cancelled[key] = event[key]
+            self._notify(self._write(calendar_id, cancelled, state and state['time_zone']))
+
+    def prune(self, calendar_id: str, time_min: float, time_max: float, keep: set) -> int:
+        """Drop stored events and series overlapping [time_min, time_max) whose IDs are not in ``keep``.
+
+        For calendars only cached through remote searches, which no sync
+        keeps current. Returns the number of entries dropped.
+        """
+        with self._lock:
+            stale = [event['id'] for _, _, event in self.backend.iter_bounds(calendar_id, time_min, time_max)
+                     if event['id'] not in keep]
+            stale += [master['id'] for master in self.backend.iter_series(calendar_id, time_min, time_max)
+                      if master['id'] not in keep]
+            if not stale:
+                return 0
+            changes = []
+            self.backend.begin()
+            try:
+                for event_id in stale:
+                    # Drops a master's modified instances too
+                    changes.extend(self._write(calendar_id, {'id': event_id, 'status': 'cancelled'}, None))
+                    self.backend.delete_override(calendar_id, event_id)
+                self.backend.commit()
+            except BaseException:
+                self.backend.rollback()
+                raise
+            self._notify(changes)
+            return len(stale)
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def get(self, calendar_id: str, event_id: str):
+        """A mirrored event, series master or expanded instance by ID."""
+        with self._lock:
+            self._stats['queries'] += 1
+            return self._get(calendar_id, event_id)
+
+    def _get(self, calendar_id: str, event_id: str):
+        event = self.backend.get(calendar_id, event_id) or self.backend.get_series(calendar_id, event_id)
+        if event is not None:
+            return event
+        master_id, suffix = split_instance_id(event_id)
+        series = master_id and self._load_series(calendar_id, master_id)
+        if not series:
+            return None
+        original_ts = series.parse_suffix(suffix)
+        # A stored override with this ID would have been found above: this one is cancelled
+        if original_ts is None or original_ts in self.backend.overrides(calendar_id, master_id):
+            return None
+        original = series.occurs_at(original_ts)
+        return None if original is None else series.instance(original)
+
+    def series(self, calendar_id: str, master_id: str):
+        """The parsed ``Series`` of a recurring event, or None."""
+        with self._lock:
+            return self._load_series(calendar_id, master_id)
+
+    def original_timestamp(self, calendar_id: str, event: dict) -> float:
+        """Start of the occurrence an instance was expanded from."""
+        with self._lock:
+            state = self.backend.get_state(calendar_id)
+            return _to_timestamp(event['originalStartTime'], state and state['time_zone'])
+
+    def ical_keys(self, calendar_id: str) -> set:
+        """``(iCalUID, original start)`` of every mirrored event, for import deduplication."""
+        with self._lock:
+            self._stats['queries'] += 1
+            return {(uid, original_ts) for uid, original_ts in self.backend.iter_ical_keys(calendar_id) if uid}
+
+    def next_instance(self, calendar_id: str, master_id: str, after: float):
+        """The first live instance of a series ending after ``after``, modified or not."""
+        with self._lock:
+            series = self._load_series(calendar_id, master_id)
+            if series is None:
+                return None
+            overrides = self.backend.overrides(calendar_id, master_id)
+            for original in series.occurrences(after):
+                exception_id = overrides.get(series.timestamp(original))
+                if exception_id is None:
+                    return series.instance(original)
+                exception = self.backend.get(calendar_id, exception_id)
+                if exception is not None:
+                    return exception
+            return None
+
+    def exceptions(self, calendar_id: str, master_id: str, since: float = None) -> list:
+        """IDs of a series' modified instances replacing occurrences from ``since`` on."""
+        with self._lock:
+            return [event_id for original_ts, event_id in self.backend.overrides(calendar_id, master_id).items()
+                    if (since is None or original_ts >= since) and self.backend.get(calendar_id, event_id)]
+
+    def expand(self, calendar_id: str, time_min: float, time_max: float) -> list:
+        """``(start_ts, end_ts, instance)`` of the unmodified recurring instances in a window."""
+        with self._lock:
+            self._stats['expansions'] += 1
+            state = self.backend.get_state(calendar_id)
+            found = []
+            for master in self.backend.iter_series(calendar_id, time_min, time_max):
+                series = self._load_series(calendar_id, master['id'], master)
+                skip = self.backend.overrides(calendar_id, master['id'])
+                for start_ts, _, event in series.instances(time_min, time_max, skip):
+                    found.append((start_ts, event_bounds(event, state and state['time_zone'])[1], event))
+            return found
+
+    def intervals(self, calendar_id: str, time_min: float, time_max: float) -> list:
+        """``(start_ts, end_ts, event)`` of every event and instance overlapping a window, unordered."""
+        with self._lock:
+            self._stats['queries'] += 1
+            return list(self.backend.iter_bounds(calendar_id, time_min, time_max)) + \
+                self.expand(calendar_id, time_min, time_max)
+
+    def _range(self, calendar_id: str, time_min: float, time_max: float, after: tuple, limit: int):
+        """Keyed events of a window: stored events merged with expanded recurring instances."""
+        self._stats['queries'] += 1
+        rows = self.backend.iter_range(calendar_id, time_min, time_max, after, limit, keyed=True)
+        masters = self.backend.iter_series(calendar_id, time_min, time_max)
+        if not masters:
+            return list(rows)
+        self._stats['expansions'] += 1
+        streams = [rows]
+        for master in masters:
+            series = self._load_series(calendar_id, master['id'], master)
+            instances = series.instances(time_min, time_max, self.backend.overrides(calendar_id, master['id']))
+            if after is not None:
+                instances = itertools.dropwhile(lambda item, after=after: item[:2] <= after, instances)
+            streams.append(instances)
+        return list(itertools.islice(heapq.merge(*streams, key=lambda item: item[:2]), limit))
+
+    def range(self, calendar_id: str, time_min: datetime.datetime = None,
+              time_max: datetime.datetime = None, limit: int = None, after: tuple = None) -> list:
+        """Events overlapping [time_min, time_max), ordered by start time.
+
+        ``after`` is the (start_ts, event_id) keyset position of the last event
+        of a previous page; see ``position``.
+        """
+        with self._lock:
+            return [event for *_, event in self._range(calendar_id,
+                                                       time_min.timestamp() if time_min else None,
+                                                       time_max.timestamp() if time_max else None,
+                                                       after, limit)]
+
+    def keyed_range(self, calendar_id: str, time_min: datetime.datetime = None,
+                    time_max: datetime.datetime = None, limit: int = None, after: tuple = None) -> list:
+        """Like ``range`` but returns ``(start_ts, event_id, event)`` tuples, for merging."""
+        with self._lock:
+            return self._range(calendar_id, time_min.timestamp() if time_min else None,
+                               time_max.timestamp() if time_max else None, after, limit)
+
+    def position(self, calendar_id: str, event: dict) -> tuple:
+        """Keyset position of ``event`` for paging with ``range(after=...)``."""
+        with self._lock:
+            state = self.backend.get_state(calendar_id)
+            return (event_bounds(event, state and state['time_zone'])[0], event['id'])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, watched=len(self._watched))
@@ -0,0 +1,181 @@
+"""
+Busy-interval index and free-slot computation.
+
+``IntervalIndex`` is a static interval tree laid out over start-sorted
+arrays (each subtree root stores the maximum end of its subtree), giving
+O(log n + k) overlap queries. ``BusyIndex`` keeps one per calendar on top
+of the event mirror and rebuilds it lazily after changes. ``free_slots``
+sweeps merged busy intervals to find gaps of a given length.
+"""
+
+import datetime
+import threading
+
+
+class IntervalIndex:
+    """Immutable index of half-open ``[start, end)`` intervals with payloads."""
+
+    def __init__(self, intervals):
+        items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.payloads = [item[2] if len(item) > 2 else None for item in items]
+        self._max_end = [0.0] * len(items)
+        self._build(0, len(items))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo: int, hi: int) -> float:
+        if lo >= hi:
+            return float('-inf')
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self.ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlapping(self, start: float, end: float) -> list:
+        """Indexes of intervals overlapping ``[start, end)``, in start order."""
+        found = []
+        self._query(0, len(self.starts), start, end, found)
+        return found
+
+    def _query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= start:
+            return
+        self._query(lo, mid, start, end, found)
+        if self.starts[mid] < end:
+            if self.ends[mid] > start:
+                found.append(mid)
+            self._query(mid + 1, hi, start, end, found)
+
+    def busy(self, start: float, end: float) -> list:
+        """Merged busy intervals clipped to ``[start, end)``."""
+        hits = self.overlapping(start, end)
+        return merge_intervals((max(self.starts[i], start), min(self.ends[i], end)) for i in hits)
+
+
+def merge_intervals(intervals) -> list:
+    """Sort and merge overlapping or touching ``(start, end)`` pairs."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def free_slots(busy: list, window_start: float, window_end: float, duration: float,
+               allowed: list = None, max_slots: int = None) -> list:
+    """Gaps of at least ``duration`` seconds between merged ``busy`` intervals.
+
+    ``allowed`` optionally restricts results to sorted ``(start, end)``
+    windows such as working hours.
+    """
+    gaps = []
+    cursor = window_start
+    for start, end in busy:
+        if start > cursor:
+            gaps.append((cursor, min(start, window_end)))
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            break
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    if allowed is not None:
+        gaps = _intersect(gaps, allowed)
+    slots = [(start, end) for start, end in gaps if end - start >= duration]
+    return slots[:max_slots] if max_slots else slots
+
+
+def _intersect(a: list, b: list) -> list:
+    out = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            out.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def working_hours(window_start: float, window_end: float, tzinfo, start_hour: int,
+                  end_hour: int) -> list:
+    """Daily ``[start_hour, end_hour)`` windows in ``tzinfo`` covering the range."""
+    day = datetime.datetime.fromtimestamp(window_start, tzinfo).date()
+    last = datetime.datetime.fromtimestamp(window_end, tzinfo).date()
+    windows = []
+    while day <= last:
+        midnight = datetime.datetime.combine(day, datetime.time(0), tzinfo)
+        start = (midnight + datetime.timedelta(hours=start_hour)).timestamp()
+        end = (midnight + datetime.timedelta(hours=end_hour)).timestamp()
+        if end > window_start and start < window_end:
+            windows.append((max(start, window_start), min(end, window_end)))
+        day += datetime.timedelta(days=1)
+    return windows
+
+
+def is_busy(event: dict) -> bool:
+    """Whether an event blocks time (not transparent, cancelled or declined)."""
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return False
+    for attendee in event.get('attendees', ()):
+        if attendee.get('self') and attendee.get('responseStatus') == 'declined':
+            return False
+    return True
+
+
+class BusyIndex:
+    """Per-calendar ``IntervalIndex`` over mirrored events.
+
+    Registered as an ``EventStore`` listener; changes only mark the calendar
+    dirty and the tree is rebuilt on the next query. Recurring masters are
+    left out: their instances are expanded per window (``EventStore.expand``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}       # calendar_id -> {event_id: (start, end, event_id)}
+        self._indexes = {}      # calendar_id -> IntervalIndex (None when dirty)
+        self._stats = {'rebuilds': 0, 'queries': 0}
+
+    def on_upsert(self, calendar_id: str, event: dict, start_ts: float, end_ts: float):
+        with self._lock:
+            events = self._events.setdefault(calendar_id, {})
+            if start_ts is not None and end_ts is not None and is_busy(event) and not event.get('recurrence'):
+                events[event['id']] = (start_ts, end_ts, event['id'])
+            else:
+                events.pop(event['id'], None)
+            self._indexes[calendar_id] = None
+
+    def on_delete(self, calendar_id: str, event_id: str):
+        with self._lock:
+            self._events.get(calendar_id, {}).pop(event_id, None)
+            self._indexes[calendar_id] = None
+
+    def on_clear(self, calendar_id: str):
+        with self._lock:
+            self._events.pop(calendar_id, None)
+            self._indexes[calendar_id] = None
+
+    def index(self, calendar_id: str) -> IntervalIndex:
+        with self._lock:
+            self._stats['queries'] += 1
+            index = self._indexes.get(calendar_id)
+            if index is None:
+                index = IntervalIndex(self._events.get(calendar_id, {}).values())
+                self._indexes[calendar_id] = index
+                self._stats['rebuilds'] += 1
+            return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
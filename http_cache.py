@@ -0,0 +1,159 @@
+"""
+Caching HTTP layer for Calendar API reads.
+
+``CachingHttp`` wraps an ``httplib2.Http`` under ``AuthorizedHttp``. GET
+responses are kept in a shared ``ResponseCache`` (LRU with TTL and a byte
+cap). Fresh entries are served locally; stale entries are revalidated with
+``If-None-Match`` and a 304 reuses the cached body. Any write invalidates
+the entries of the calendar it touched. Several accounts can share one cache:
+each ``CachingHttp`` prefixes its keys with the account's namespace, and its
+writes only invalidate that namespace.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from telemetry import telemetry
+
+HTTP_CACHE_TTL = float(os.environ.get('HTTP_CACHE_TTL', '30'))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+_CALENDAR_PATH = re.compile(r'/calendars/([^/]+)/')
+
+
+class _Entry:
+    __slots__ = ('headers', 'content', 'etag', 'stored_at')
+
+    def __init__(self, headers, content, etag, stored_at):
+        self.headers = headers
+        self.content = content
+        self.etag = etag
+        self.stored_at = stored_at
+
+
+class ResponseCache:
+    """Thread-safe LRU of GET responses with TTL freshness and a memory cap."""
+
+    def __init__(self, ttl: float = HTTP_CACHE_TTL, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'invalidations': 0,
+                       'evictions': 0}
+
+    def lookup(self, key: str):
+        """Return ``(entry, fresh)``; ``entry`` is None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = time.monotonic() - entry.stored_at < self.ttl
+            if fresh:
+                self._stats['hits'] += 1
+            return entry, fresh
+
+    def store(self, key: str, headers: dict, content: bytes):
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = _Entry(headers, content, headers.get('etag'), time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= len(old.content)
+                self._stats['evictions'] += 1
+
+    def revalidated(self, key: str):
+        """Record a 304: the cached entry is fresh again."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+            self._stats['revalidations'] += 1
+
+    def invalidate(self, marker: str = None, namespace: str = ''):
+        """Drop entries of ``namespace`` whose key contains ``marker`` (all if None)."""
+        with self._lock:
+            keys = [k for k in self._entries
+                    if k.startswith(namespace) and (marker is None or marker in k)]
+            for key in keys:
+                self._discard(key)
+            self._stats['invalidations'] += len(keys)
+
+    def _discard(self, key):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.content)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+
+def _replay(entry: _Entry) -> tuple:
+    import httplib2  # already loaded by the wrapped Http; kept out of server startup
+    return httplib2.Response(entry.headers), entry.content
+
+
+class CachingHttp:
+    """``httplib2.Http`` look-alike that serves and revalidates GETs from a cache."""
+
+    def __init__(self, http: 'httplib2.Http', cache: ResponseCache, namespace: str = ''):
+        self.http = http
+        self.cache = cache
+        self.namespace = f'{namespace}|' if namespace else ''
+
+    def __getattr__(self, name):
+        # AuthorizedHttp reads attributes such as timeout/connections from the wrapped Http
+        return getattr(self.http, name)
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        if method != 'GET':
+            response, content = self._send(uri, method, body, headers, *args, **kwargs)
+            self._invalidate_for(uri)
+            return response, content
+        # Sync-token pulls must always see the latest changes
+        if 'syncToken=' in uri:
+            telemetry.count('cache_lookups_total', result='bypass')
+            return self._send(uri, method, body, headers, *args, **kwargs)
+
+        key = self.namespace + uri
+        entry, fresh = self.cache.lookup(key)
+        if fresh:
+            telemetry.count('cache_lookups_total', result='hit')
+            return _replay(entry)
+        headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        response, content = self._send(uri, method, body, headers, *args, **kwargs)
+        if response.status == 304 and entry is not None:
+            telemetry.count('cache_lookups_total', result='revalidated')
+            self.cache.revalidated(key)
+            return _replay(entry)
+        telemetry.count('cache_lookups_total', result='miss')
+        if response.status == 200:
+            self.cache.store(key, dict(response), content)
+        return response, content
+
+    def _send(self, uri, method, body, headers, *args, **kwargs):
+        response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        if body:
+            sent = len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))
+            telemetry.count('http_bytes_total', sent, direction='sent')
+        telemetry.count('http_bytes_total', len(content or b''), direction='received')
+        return response, content
+
+    def _invalidate_for(self, uri: str):
+        match = _CALENDAR_PATH.search(urlsplit(uri).path)
+        # Batch requests (and anything else) may touch any calendar
+        self.cache.invalidate(match.group(0) if match else None, self.namespace)
@@ -0,0 +1,57 @@
+"""
+Lazy, paginated listing of Calendar events.
+
+``iter_pages``/``iter_events`` follow ``nextPageToken`` one page at a time
+and ask only for the fields the caller needs (``fields=`` partial
+responses). Cursors hand a listing position back to MCP clients so they can
+fetch further pages on demand.
+"""
+
+import base64
+import json
+
+# Largest page the Calendar API serves for events().list
+MAX_PAGE_SIZE = 2500
+
+
+def list_fields(item_fields: str) -> str:
+    """``fields=`` mask for ``events().list`` keeping paging/sync metadata."""
+    return f'nextPageToken,nextSyncToken,timeZone,items({item_fields})'
+
+
+def iter_pages(service, calendar_id: str = 'primary', item_fields: str = None,
+               page_size: int = 250, page_token: str = None, **params):
+    """Yield raw ``events().list`` responses, requesting the next page lazily."""
+    params['calendarId'] = calendar_id
+    params['maxResults'] = min(page_size, MAX_PAGE_SIZE)
+    if item_fields:
+        params['fields'] = list_fields(item_fields)
+    while True:
+        response = service.events().list(pageToken=page_token, **params).execute()
+        yield response
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def iter_events(service, calendar_id: str = 'primary', item_fields: str = None,
+                page_size: int = 250, **params):
+    """Yield events one by one across all pages; memory stays at one page."""
+    for response in iter_pages(service, calendar_id, item_fields, page_size, **params):
+        yield from response.get('items', [])
+
+
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return position
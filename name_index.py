@@ -0,0 +1,185 @@
+"""
+In-memory index over event summaries for resolving events by name.
+
+Supports exact, prefix and fuzzy (trigram + edit distance) matching. The
+index subscribes to the event mirror and is updated incrementally on every
+change instead of being rebuilt per lookup.
+"""
+
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+# Fuzzy candidates scoring below this are not returned
+FUZZY_THRESHOLD = 0.5
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize(text: str) -> str:
+    """Case-fold, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_NON_WORD.sub(' ', text.casefold()).split())
+
+
+def trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class NameMatch:
+    __slots__ = ('calendar_id', 'event_id', 'summary', 'kind', 'score', 'start_ts')
+
+    def __init__(self, calendar_id, event_id, summary, kind, score, start_ts):
+        self.calendar_id = calendar_id
+        self.event_id = event_id
+        self.summary = summary
+        self.kind = kind
+        self.score = score
+        self.start_ts = start_ts
+
+    def __repr__(self):
+        return f'NameMatch({self.summary!r}, kind={self.kind}, score={self.score:.2f})'
+
+
+class NameIndex:
+    """Exact, prefix and trigram indexes over normalized event summaries.
+
+    Attach it to an ``EventStore`` with ``store.add_listener(index)``; the
+    store then calls ``on_upsert``/``on_delete``/``on_clear`` as the mirror
+    changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}                  # key -> (norm, summary, start_ts, end_ts)
+        self._exact = defaultdict(set)      # norm -> keys
+        self._sorted = []                   # [(norm, key)] for prefix range scans
+        self._trigrams = defaultdict(set)   # trigram -> keys
+        self._stats = {'lookups': 0, 'updates': 0}
+
+    # ----------------------------
+    # Store listener interface
+    # ----------------------------
+    def on_upsert(self, calendar_id: str, event: dict, start_ts: float, end_ts: float):
+        key = (calendar_id, event['id'])
+        summary = event.get('summary', '')
+        with self._lock:
+            self._remove(key)
+            norm = normalize(summary)
+            self._entries[key] = (norm, summary, start_ts, end_ts)
+            self._exact[norm].add(key)
+            bisect.insort(self._sorted, (norm, key))
+            for gram in trigrams(norm):
+                self._trigrams[gram].add(key)
+            self._stats['updates'] += 1
+
+    def on_delete(self, calendar_id: str, event_id: str):
+        with self._lock:
+            self._remove((calendar_id, event_id))
+            self._stats['updates'] += 1
+
+    def on_clear(self, calendar_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == calendar_id]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        norm = entry[0]
+        self._exact[norm].discard(key)
+        if not self._exact[norm]:
+            del self._exact[norm]
+        i = bisect.bisect_left(self._sorted, (norm, key))
+        if i < len(self._sorted) and self._sorted[i] == (norm, key):
+            del self._sorted[i]
+        for gram in trigrams(norm):
+            keys = self._trigrams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[gram]
+
+    # ----------------------------
+    # Lookup
+    # ----------------------------
+    def resolve(self, name: str, calendar_id: str = None, time_min: float = None,
+                time_max: float = None, limit: int = 5) -> list:
+        """Return up to ``limit`` ranked ``NameMatch`` candidates for ``name``.
+
+        Exact matches rank above prefix matches, which rank above fuzzy ones;
+        ties go to the event starting closest to now. Only events overlapping
+        [time_min, time_max) (POSIX timestamps) are considered.
+        """
+        query = normalize(name)
+        if not query:
+            return []
+        with self._lock:
+            self._stats['lookups'] += 1
+            scored = {}
+            for key in self._exact.get(query, ()):
+                scored[key] = ('exact', 1.0)
+            i = bisect.bisect_left(self._sorted, (query,))
+            while i < len(self._sorted) and self._sorted[i][0].startswith(query):
+                key = self._sorted[i][1]
+                if key not in scored:
+                    scored[key] = ('prefix', 0.9 * len(query) / len(self._sorted[i][0]) + 0.05)
+                i += 1
+            matches = self._select(scored, calendar_id, time_min, time_max)
+            if not matches:
+                matches = self._select(self._fuzzy(query), calendar_id, time_min, time_max)
+        now = time.time()
+        matches.sort(key=lambda m: (-m.score, abs((m.start_ts or now) - now)))
+        return matches[:limit]
+
+    def _select(self, scored: dict, calendar_id, time_min, time_max) -> list:
+        matches = []
+        for key, (kind, score) in scored.items():
+            if calendar_id is not None and key[0] != calendar_id:
+                continue
+            norm, summary, start_ts, end_ts = self._entries[key]
+            if time_min is not None and end_ts is not None and end_ts <= time_min:
+                continue
+            if time_max is not None and start_ts is not None and start_ts >= time_max:
+                continue
+            matches.append(NameMatch(key[0], key[1], summary, kind, score, start_ts))
+        return matches
+
+    def _fuzzy(self, query: str) -> dict:
+        grams = trigrams(query)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for key in self._trigrams.get(gram, ()):
+                overlap[key] += 1
+        scored = {}
+        for key in overlap:
+            norm = self._entries[key][0]
+            dice = 2 * overlap[key] / (len(grams) + len(trigrams(norm)))
+            similarity = max(dice, 1 - edit_distance(query, norm) / max(len(query), len(norm)))
+            if similarity >= FUZZY_THRESHOLD:
+                scored[key] = ('fuzzy', 0.8 * similarity)
+        return scored
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
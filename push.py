@@ -0,0 +1,287 @@
+"""
+Push notifications from Google Calendar instead of polling.
+
+``WatchManager`` opens an ``events().watch`` channel for each watched
+calendar of every loaded account. Google then POSTs to the webhook
+(``PUSH_WEBHOOK_URL``) whenever the calendar changes. The webhook
+acknowledges the push at once and runs an incremental sync of only that
+calendar's mirror. It then sends ``notifications/resources/updated`` to the
+MCP sessions subscribed to ``calendar://events/<calendar id>``.
+
+Channels expire after ``WATCH_TTL`` seconds. A background thread replaces
+each channel ``WATCH_RENEW_BEFORE`` seconds before it expires and stops the
+channels of evicted accounts. While a calendar is watched, its mirror is
+trusted without polling (see ``EVENT_STORE_WATCHED_MAX_AGE``).
+
+Google only delivers to a public HTTPS address, so ``PUSH_WEBHOOK_URL`` is
+usually a reverse proxy in front of the SSE server; ``PUSH_WEBHOOK_PATH`` is
+the path the server listens on.
+"""
+
+import asyncio
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+import weakref
+from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
+from pydantic import AnyUrl
+
+from telemetry import telemetry
+from tenants import current_tenant_id
+
+# Public address Google posts to; push is off when unset
+PUSH_WEBHOOK_URL = os.environ.get('PUSH_WEBHOOK_URL', '')
+PUSH_WEBHOOK_PATH = os.environ.get('PUSH_WEBHOOK_PATH', '/notifications')
+WATCH_CALENDARS = [c for c in os.environ.get('WATCH_CALENDARS', 'primary').split(',') if c]
+# Requested channel lifetime (Google may grant less) and renewal margin, in seconds
+WATCH_TTL = int(os.environ.get('WATCH_TTL', str(7 * 24 * 3600)))
+WATCH_RENEW_BEFORE = float(os.environ.get('WATCH_RENEW_BEFORE', '3600'))
+# Seconds between channel maintenance runs
+WATCH_CHECK_INTERVAL = float(os.environ.get('WATCH_CHECK_INTERVAL', '60'))
+
+RESOURCE_PREFIX = 'calendar://events/'
+
+
+def resource_uri(calendar_id: str) -> str:
+    return RESOURCE_PREFIX + quote(calendar_id, safe='@')
+
+
+class Channel:
+    __slots__ = ('id', 'tenant', 'calendar_id', 'resource_id', 'token', 'expiration')
+
+    def __init__(self, channel_id, tenant, calendar_id, resource_id, token, expiration):
+        self.id = channel_id
+        self.tenant = tenant
+        self.calendar_id = calendar_id
+        self.resource_id = resource_id
+        self.token = token
+        self.expiration = expiration
+
+
+# ----------------------------
+# MCP resource subscriptions
+# ----------------------------
+class Subscriptions:
+    """Which MCP sessions want updates of which resource, per tenant."""
+
+    def __init__(self):
+        self._sessions = {}     # (tenant id, uri) -> WeakSet of sessions
+        self._lock = threading.Lock()
+
+    def add(self, tenant_id: str, uri: str, session):
+        with self._lock:
+            self._sessions.setdefault((tenant_id, uri), weakref.WeakSet()).add(session)
+
+    def remove(self, tenant_id: str, uri: str, session):
+        with self._lock:
+            self._sessions.get((tenant_id, uri), weakref.WeakSet()).discard(session)
+
+    async def notify(self, tenant_id: str, uri: str) -> int:
+        """Send ``resources/updated`` to the subscribers; returns how many got it."""
+        with self._lock:
+            sessions = list(self._sessions.get((tenant_id, uri), ()))
+        sent = 0
+        for session in sessions:
+            try:
+                await session.send_resource_updated(AnyUrl(uri))
+                sent += 1
+            except Exception:
+                # The client went away
+                self.remove(tenant_id, uri, session)
+        return sent
+
+
+def enable_subscriptions(server, subscriptions: Subscriptions):
+    """Handle resources/subscribe on a low-level MCP ``server``.
+
+    The SDK advertises ``subscribe: false`` whatever handlers exist, so the
+    capability is switched on here too.
+    """
+    get_capabilities = server.get_capabilities
+
+    def capabilities(*args, **kwargs):
+        result = get_capabilities(*args, **kwargs)
+        if result.resources is not None:
+            result.resources.subscribe = True
+        return result
+    server.get_capabilities = capabilities
+
+    @server.subscribe_resource()
+    async def subscribe(uri: AnyUrl):
+        subscriptions.add(current_tenant_id(), str(uri), server.request_context.session)
+
+    @server.unsubscribe_resource()
+    async def unsubscribe(uri: AnyUrl):
+        subscriptions.remove(current_tenant_id(), str(uri), server.request_context.session)
+
+
+# ----------------------------
+# Watch channels
+# ----------------------------
+class WatchManager:
+    """Opens, renews and stops watch channels and handles their pushes."""
+
+    def __init__(self, pool, subscriptions: Subscriptions, address: str = PUSH_WEBHOOK_URL,
+                 calendars: list = None, ttl: int = WATCH_TTL,
+                 renew_before: float = WATCH_RENEW_BEFORE):
+        self.pool = pool
+        self.subscriptions = subscriptions
+        self.address = address
+        self.calendars = calendars or WATCH_CALENDARS
+        self.ttl = ttl
+        self.renew_before = renew_before
+        self._channels = {}     # channel id -> Channel
+        self._current = {}      # (tenant id, calendar id) -> newest Channel
+        self._syncing = set()
+        self._dirty = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._stats = {'watches': 0, 'renewals': 0, 'stops': 0, 'failures': 0,
+                       'notifications': 0, 'rejected': 0, 'syncs': 0, 'updates_sent': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.address)
+
+    def maintain(self):
+        """Watch the calendars of loaded tenants; renew or stop channels as needed."""
+        tenants = {tenant.tenant_id: tenant for tenant in self.pool.tenants()}
+        with self._lock:
+            channels = list(self._channels.values())
+            current = dict(self._current)
+        for channel in channels:
+            if tenants.get(channel.tenant.tenant_id) is not channel.tenant:
+                self._stop(channel)
+        deadline = time.time() + self.renew_before
+        for tenant in tenants.values():
+            for calendar_id in self.calendars:
+                old = current.get((tenant.tenant_id, calendar_id))
+                if old is not None and old.tenant is tenant and old.expiration > deadline:
+                    continue
+                try:
+                    self._watch(tenant, calendar_id)
+                except Exception as e:
+                    self._count('failures')
+                    print(f"Watching {calendar_id} of tenant '{tenant.tenant_id}' failed: {e}",
+                          file=sys.stderr)
+                    continue
+                if old is not None and old.tenant is tenant:
+                    # The new channel is open, so no change falls between the two
+                    self._count('renewals')
+                    self._stop(old)
+
+    def stop_all(self):
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            self._stop(channel)
+
+    def receive(self, headers) -> tuple:
+        """Check a push against its channel; returns ``(channel, state)`` or ``(None, None)``."""
+        channel = self._channels.get(headers.get('x-goog-channel-id', ''))
+        token = headers.get('x-goog-channel-token', '')
+        if channel is None or not hmac.compare_digest(channel.token, token):
+            self._count('rejected')
+            telemetry.count('push_notifications_total', state='rejected')
+            return None, None
+        state = headers.get('x-goog-resource-state', '')
+        self._count('notifications')
+        telemetry.count('push_notifications_total', state=state)
+        return channel, state
+
+    def schedule(self, channel: Channel, executor):
+        """Pull the channel's changes in the background (from the event loop)."""
+        task = asyncio.get_running_loop().create_task(self._sync_and_notify(channel, executor))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, channels=len(self._channels))
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    async def _sync_and_notify(self, channel: Channel, executor):
+        # One pull per calendar at a time; pushes arriving meanwhile trigger one more
+        key = (channel.tenant.tenant_id, channel.calendar_id)
+        if key in self._syncing:
+            self._dirty.add(key)
+            return
+        self._syncing.add(key)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._dirty.discard(key)
+                await loop.run_in_executor(executor, channel.tenant.event_store.sync,
+                                           channel.calendar_id, True)
+                self._count('syncs')
+                sent = await self.subscriptions.notify(key[0], resource_uri(channel.calendar_id))
+                self._count('updates_sent', sent)
+                if key not in self._dirty:
+                    break
+        except Exception as e:
+            self._count('failures')
+            print(f"Sync after push for {channel.calendar_id} failed: {e}", file=sys.stderr)
+        finally:
+            self._syncing.discard(key)
+
+    def _watch(self, tenant, calendar_id: str) -> Channel:
+        body = {'id': uuid.uuid4().hex, 'type': 'web_hook', 'address': self.address,
+                'token': secrets.token_urlsafe(24), 'params': {'ttl': str(self.ttl)}}
+        response = tenant.get_service().events().watch(calendarId=calendar_id, body=body).execute()
+        expiration = int(response.get('expiration') or 0) / 1000 or time.time() + self.ttl
+        channel = Channel(body['id'], tenant, calendar_id, response.get('resourceId'),
+                          body['token'], expiration)
+        with self._lock:
+            self._channels[channel.id] = channel
+            self._current[tenant.tenant_id, calendar_id] = channel
+            self._stats['watches'] += 1
+        tenant.event_store.set_watched(calendar_id, True)
+        return channel
+
+    def _stop(self, channel: Channel):
+        with self._lock:
+            self._channels.pop(channel.id, None)
+            key = (channel.tenant.tenant_id, channel.calendar_id)
+            if self._current.get(key) is channel:
+                del self._current[key]
+                channel.tenant.event_store.set_watched(channel.calendar_id, False)
+            self._stats['stops'] += 1
+        try:
+            channel.tenant.get_service().channels().stop(
+                body={'id': channel.id, 'resourceId': channel.resource_id}).execute()
+        except HttpError as e:
+            if e.resp.status != 404:
+                print(f"Stopping channel {channel.id} failed: {e}", file=sys.stderr)
+        except Exception as e:
+            print(f"Stopping channel {channel.id} failed: {e}", file=sys.stderr)
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+
+class WatchRenewer(threading.Thread):
+    """Daemon thread that runs ``WatchManager.maintain`` periodically."""
+
+    def __init__(self, manager: WatchManager, interval: float = WATCH_CHECK_INTERVAL):
+        super().__init__(name='watch-renewer', daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.manager.maintain()
+            if self._stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stopped.set()
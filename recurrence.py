@@ -0,0 +1,300 @@
+"""
+Local expansion of recurring events.
+
+The mirror stores a recurring event once, as its master: the event whose
+``recurrence`` lists RRULE, EXRULE, EXDATE and RDATE lines. ``Series`` parses
+a master and yields its occurrences in any window. Occurrences are computed
+in the master's own time zone, so wall-clock times survive DST changes.
+Expanded instances get the IDs Google gives them (``<master id>_<UTC
+start>``, or ``<master id>_<date>`` for all-day events), so they can be
+patched or deleted like server-expanded ones. Modified and cancelled
+instances (exceptions) come from the API and replace the occurrences they
+override.
+
+``split_recurrence`` cuts a series in two for "this and following" edits.
+"""
+
+import bisect
+import datetime
+import os
+import re
+import threading
+
+from date_parsing import get_zone
+
+# Recurring events without an end are expanded this far past the window start
+RECURRENCE_HORIZON_DAYS = int(os.environ.get('RECURRENCE_HORIZON_DAYS', '730'))
+# Safety cap on the occurrences materialized per series
+MAX_OCCURRENCES = 100_000
+
+_INSTANCE_SUFFIX = re.compile(r'\d{8}(T\d{6}Z)?')
+_UNTIL = re.compile(r'UNTIL=(\d{8})(?:T(\d{6})(Z?))?', re.IGNORECASE)
+_COUNT = re.compile(r'COUNT=(\d+)', re.IGNORECASE)
+
+
+def is_recurring(event: dict) -> bool:
+    """Whether ``event`` is a recurring master (not an instance)."""
+    return bool(event.get('recurrence'))
+
+
+def instance_id(master_id: str, original: datetime.datetime, all_day: bool) -> str:
+    if all_day:
+        return f"{master_id}_{original.strftime('%Y%m%d')}"
+    return f"{master_id}_{original.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def split_instance_id(event_id: str) -> tuple:
+    """``(master id, original start suffix)`` of an instance ID, or ``(None, None)``."""
+    master_id, _, suffix = event_id.rpartition('_')
+    if master_id and _INSTANCE_SUFFIX.fullmatch(suffix):
+        return master_id, suffix
+    return None, None
+
+
+def _parse_line(line: str) -> tuple:
+    """Split ``NAME;PARAM=X:VALUE`` into ``(name, params, value)``."""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(p.split('=', 1) for p in params if '=' in p), value
+
+
+class Series:
+    """A recurring master parsed once; occurrences are materialized lazily and kept."""
+
+    def __init__(self, master: dict, time_zone: str = None):
+        self.master = master
+        start, end = master['start'], master['end']
+        self.all_day = 'date' in start and not start.get('dateTime')
+        if self.all_day:
+            # All-day occurrences are naive dates, anchored in the calendar's zone
+            self.zone = get_zone(time_zone) if time_zone else datetime.timezone.utc
+            self.dtstart = datetime.datetime.fromisoformat(start['date'])
+            self.duration = datetime.datetime.fromisoformat(end['date']) - self.dtstart
+        else:
+            begin = datetime.datetime.fromisoformat(start['dateTime'])
+            zone_name = start.get('timeZone') or time_zone
+            self.zone = get_zone(zone_name) if zone_name else begin.tzinfo
+            self.dtstart = begin.astimezone(self.zone)
+            # Same tzinfo on both sides: a wall-clock duration, as calendar clients use
+            self.duration = datetime.datetime.fromisoformat(end['dateTime']).astimezone(self.zone) - self.dtstart
+        self.finite = True
+        self.rules = self._ruleset(master.get('recurrence') or [])
+        self._iterator = iter(self.rules)
+        self._starts = []       # occurrence start timestamps, ascending
+        self._originals = []    # the matching local datetimes
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # Parsing
+    # ----------------------------
+    def _ruleset(self, lines: list) -> 'rruleset':
+        from dateutil.rrule import rruleset, rrulestr
+        rules = rruleset()
+        has_rule = False
+        for line in lines:
+            name, params, value = _parse_line(line)
+            if name in ('RRULE', 'EXRULE'):
+                rule = rrulestr(self._until(value), dtstart=self.dtstart)
+                if name == 'RRULE':
+                    has_rule = True
+                    self.finite = self.finite and bool(_UNTIL.search(value) or _COUNT.search(value))
+                    rules.rrule(rule)
+                else:
+                    rules.exrule(rule)
+            elif name in ('RDATE', 'EXDATE'):
+                add = rules.rdate if name == 'RDATE' else rules.exdate
+                for dt in self._dates(params, value):
+                    add(dt)
+        if not has_rule:
+            # No RRULE: the master itself is the first occurrence
+            rules.rdate(self.dtstart)
+        return rules
+
+    def _until(self, value: str) -> str:
+        """Give UNTIL the same kind of value as DTSTART (dateutil requires it)."""
+        def fix(match):
+            day, time, utc = match.group(1), match.group(2), match.group(3)
+            if self.all_day:
+                return f'UNTIL={day}'
+            if utc:
+                return match.group(0)
+            local = datetime.datetime.strptime(day + (time or '235959'), '%Y%m%d%H%M%S')
+            until = local.replace(tzinfo=self.zone).astimezone(datetime.timezone.utc)
+            return f"UNTIL={until.strftime('%Y%m%dT%H%M%SZ')}"
+        return _UNTIL.sub(fix, value)
+
+    def _dates(self, params: dict, value: str) -> list:
+        zone = get_zone(params['TZID']) if params.get('TZID') else self.zone
+        dates = []
+        for item in value.split(','):
+            item = item.split('/')[0].strip()     # PERIOD values: start/end
+            if not item:
+                continue
+            if len(item) == 8:
+                dt = datetime.datetime.strptime(item, '%Y%m%d')
+                if not self.all_day:
+                    dt = datetime.datetime.combine(dt.date(), self.dtstart.timetz().replace(tzinfo=None), self.zone)
+            else:
+                dt = datetime.datetime.strptime(item.rstrip('Zz'), '%Y%m%dT%H%M%S')
+                dt = dt.replace(tzinfo=datetime.timezone.utc if item[-1] in 'Zz' else zone).astimezone(self.zone)
+                if self.all_day:
+                    dt = dt.replace(tzinfo=None, hour=0, minute=0, second=0)
+            dates.append(dt)
+        return dates
+
+    # ----------------------------
+    # Occurrences
+    # ----------------------------
+    def timestamp(self, dt: datetime.datetime) -> float:
+        return dt.replace(tzinfo=self.zone).timestamp() if self.all_day else dt.timestamp()
+
+    def _materialize(self, until_ts: float = None):
+        """Extend the occurrence list past ``until_ts`` (to the end if None)."""
+        with self._lock:
+            while not self._exhausted and (until_ts is None or not self._starts or self._starts[-1] < until_ts):
+                if len(self._starts) >= MAX_OCCURRENCES:
+                    self._exhausted = True
+                    break
+                dt = next(self._iterator, None)
+                if dt is None:
+                    self._exhausted = True
+                    break
+                self._starts.append(self.timestamp(dt))
+                self._originals.append(dt)
+
+    def occurrences(self, time_min: float = None, time_max: float = None):
+        """Original starts of the occurrences overlapping ``[time_min, time_max)``, in order.
+
+        Without ``time_max``, a never-ending series stops after
+        ``RECURRENCE_HORIZON_DAYS``.
+        """
+        if time_max is None and not self.finite:
+            time_max = max(time_min or 0, self.bounds()[0] or 0) + RECURRENCE_HORIZON_DAYS * 86400
+        self._materialize(time_max)
+        span = self.duration.total_seconds()
+        # Earlier occurrences cannot reach the window: durations are all equal
+        i = 0 if time_min is None else bisect.bisect_right(self._starts, time_min - span)
+        while i < len(self._starts):
+            start_ts = self._starts[i]
+            if time_max is not None and start_ts >= time_max:
+                return
+            original = self._originals[i]
+            if time_min is None or self.timestamp(original + self.duration) > time_min:
+                yield original
+            i += 1
+
+    def occurs_at(self, start_ts: float):
+        """The original start of the occurrence at ``start_ts``, or None."""
+        self._materialize(start_ts + 1)
+        i = bisect.bisect_left(self._starts, start_ts)
+        if i < len(self._starts) and self._starts[i] == start_ts:
+            return self._originals[i]
+        return None
+
+    def bounds(self) -> tuple:
+        """``(start of the first occurrence, end of the last)``; the end is None if it never ends."""
+        self._materialize(float('-inf'))
+        if not self._starts:
+            return None, None
+        first = self._starts[0]
+        if not self.finite:
+            return first, None
+        self._materialize()
+        return first, self.timestamp(self._originals[-1] + self.duration)
+
+    # ----------------------------
+    # Instances
+    # ----------------------------
+    def original_timestamp(self, when: dict):
+        """Timestamp of an ``originalStartTime`` of this series."""
+        if when.get('dateTime'):
+            return datetime.datetime.fromisoformat(when['dateTime']).timestamp()
+        return datetime.datetime.fromisoformat(when['date']).replace(tzinfo=self.zone).timestamp()
+
+    def parse_suffix(self, suffix: str):
+        """Original start of an instance ID suffix (see ``split_instance_id``)."""
+        if self.all_day:
+            return self.timestamp(datetime.datetime.strptime(suffix[:8], '%Y%m%d'))
+        if len(suffix) == 8:
+            return None
+        return datetime.datetime.strptime(suffix, '%Y%m%dT%H%M%SZ').replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+
+    def instance(self, original: datetime.datetime) -> dict:
+        """The instance event of the occurrence starting at ``original``."""
+        master = self.master
+        # Instances have etags of their own, which only the API knows
+        event = {k: v for k, v in master.items() if k not in ('recurrence', 'start', 'end', 'etag')}
+        event['id'] = instance_id(master['id'], original, self.all_day)
+        event['recurringEventId'] = master['id']
+        end = original + self.duration
+        if self.all_day:
+            event['start'] = {'date': original.date().isoformat()}
+            event['end'] = {'date': end.date().isoformat()}
+        else:
+            zone_name = master['start'].get('timeZone')
+            event['start'] = {'dateTime': original.isoformat()}
+            event['end'] = {'dateTime': end.isoformat()}
+            if zone_name:
+                event['start']['timeZone'] = event['end']['timeZone'] = zone_name
+        event['originalStartTime'] = dict(event['start'])
+        return event
+
+    def instances(self, time_min: float = None, time_max: float = None, skip=frozenset()):
+        """Yield ``(start_ts, instance id, instance)`` in the window, except overridden originals."""
+        for original in self.occurrences(time_min, time_max):
+            start_ts = self.timestamp(original)
+            if start_ts not in skip:
+                event = self.instance(original)
+                yield start_ts, event['id'], event
+
+
+# ----------------------------
+# "This and following" edits
+# ----------------------------
+def split_recurrence(series: Series, original: datetime.datetime) -> tuple:
+    """Recurrence lines ending before ``original`` and lines of a series starting at it.
+
+    COUNT rules are cut with UNTIL; the new series keeps the remaining count.
+    EXDATE and RDATE values go to the half they fall in.
+    """
+    cut = series.timestamp(original)
+    if series.all_day:
+        until = f"UNTIL={(original - datetime.timedelta(days=1)).strftime('%Y%m%d')}"
+    else:
+        last = (original - datetime.timedelta(seconds=1)).astimezone(datetime.timezone.utc)
+        until = f"UNTIL={last.strftime('%Y%m%dT%H%M%SZ')}"
+    head, tail = [], []
+    for line in series.master.get('recurrence') or []:
+        name, params, value = _parse_line(line)
+        if name in ('RRULE', 'EXRULE'):
+            parts = [p for p in value.split(';') if not re.match(r'(UNTIL|COUNT)=', p, re.IGNORECASE)]
+            head.append(f"{name}:{';'.join(parts + [until])}")
+            count = _COUNT.search(value)
+            if count:
+                from dateutil.rrule import rrulestr
+                used = 0
+                for dt in rrulestr(series._until(value), dtstart=series.dtstart):
+                    if series.timestamp(dt) >= cut:
+                        break
+                    used += 1
+                remaining = int(count.group(1)) - used
+                if remaining <= 0:
+                    continue
+                value = _COUNT.sub(f'COUNT={remaining}', value)
+            tail.append(f'{name}:{value}')
+        elif name in ('RDATE', 'EXDATE'):
+            prefix = line.partition(':')[0]
+            items = [item for item in value.split(',') if item]
+            dates = series._dates(params, value)
+            before = [item for item, dt in zip(items, dates) if series.timestamp(dt) < cut]
+            after = [item for item, dt in zip(items, dates) if series.timestamp(dt) >= cut]
+            if before:
+                head.append(f"{prefix}:{','.join(before)}")
+            if after:
+                tail.append(f"{prefix}:{','.join(after)}")
+        else:
+            head.append(line)
+            tail.append(line)
+    return head, tail
@@ -0,0 +1,263 @@
+"""
+Central pacing and retry policy for Calendar API requests.
+
+Every request goes through ``RequestScheduler.run``:
+
+- A token bucket paces requests to the per-user quota.
+- A semaphore caps the number of requests in flight.
+- Transient failures are retried with full-jitter exponential backoff.
+  These are 429, 403 rateLimitExceeded/userRateLimitExceeded, 5xx and
+  connection errors. Only requests that are safe to repeat are retried.
+
+A rate-limit response halves the bucket's rate, and each success raises it
+again additively. The client therefore settles just under the quota instead
+of alternating between bursts and failures.
+
+Quotas are per user, so a server acting for several accounts gives each one
+its own scheduler; the exported queue and in-flight gauges sum over all of
+them.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import weakref
+
+from googleapiclient.errors import HttpError
+
+from telemetry import telemetry
+
+# Requests per second per user (Calendar's default quota is 600 per minute);
+# 0 disables pacing
+SCHEDULER_RATE = float(os.environ.get('SCHEDULER_RATE', '10'))
+SCHEDULER_BURST = int(os.environ.get('SCHEDULER_BURST', '20'))
+SCHEDULER_MAX_CONCURRENCY = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', '10'))
+SCHEDULER_MAX_RETRIES = int(os.environ.get('SCHEDULER_MAX_RETRIES', '5'))
+# Backoff before retry n is uniform in [0, min(MAX, BASE * 2**n)] seconds
+SCHEDULER_BACKOFF_BASE = float(os.environ.get('SCHEDULER_BACKOFF_BASE', '0.5'))
+SCHEDULER_BACKOFF_MAX = float(os.environ.get('SCHEDULER_BACKOFF_MAX', '32'))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# POST methods that only read, or are keyed by their payload, and may be repeated
+SAFE_POSTS = {'calendar.freebusy.query', 'calendar.events.import'}
+
+
+def new_event_id() -> str:
+    """Client-generated event ID (base32hex-compatible) that makes inserts idempotent."""
+    return uuid.uuid4().hex
+
+
+def error_reason(error: HttpError) -> str:
+    try:
+        return json.loads(error.content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ''
+
+
+def is_rate_limited(error: Exception) -> bool:
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return status == 429 or (status == 403 and error_reason(error) in RATE_LIMIT_REASONS)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failure is worth retrying (the request may not have been applied)."""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES or is_rate_limited(error)
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_safe(method_id: str, http_method: str, body) -> bool:
+    """Whether repeating the request cannot apply it twice.
+
+    Reads, deletes, patches and updates repeat safely. Inserts are safe only
+    when they carry a client-generated ``id``: a retry of an insert that
+    already went through then answers 409 instead of creating a duplicate.
+    """
+    if http_method in ('GET', 'DELETE', 'PATCH', 'PUT'):
+        return True
+    if method_id in SAFE_POSTS:
+        return True
+    if method_id == 'calendar.events.insert':
+        if isinstance(body, (str, bytes)):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                return False
+        return bool(body and body.get('id'))
+    return False
+
+
+def applied_earlier(method_id: str, error: Exception) -> bool:
+    """After a retry, whether ``error`` means an earlier attempt succeeded."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return ((method_id == 'calendar.events.insert' and status == 409)
+            or (method_id == 'calendar.events.delete' and status == 410))
+
+
+class TokenBucket:
+    """Token bucket with an adjustable rate; reservations may go into debt."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Take ``tokens`` and return how long the caller must wait for them."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RequestScheduler:
+    """Paces, caps and retries blocking API calls made from any thread."""
+
+    def __init__(self, rate: float = SCHEDULER_RATE, burst: int = SCHEDULER_BURST,
+                 max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+                 max_retries: int = SCHEDULER_MAX_RETRIES,
+                 backoff_base: float = SCHEDULER_BACKOFF_BASE,
+                 backoff_max: float = SCHEDULER_BACKOFF_MAX):
+        self.max_rate = rate
+        self.min_rate = rate / 20
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'gave_up': 0, 'recovered': 0}
+        _schedulers.add(self)
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def run(self, method_id: str, send, safe: bool = True, recover=None, cost: int = 1):
+        """Call ``send()`` under the rate limit and concurrency cap, retrying transient failures.
+
+        ``safe`` says whether the request may be repeated (see ``retry_safe``).
+        If a retry fails because an earlier attempt was applied after all,
+        ``recover(error)`` supplies the result (the error is raised without it).
+        ``cost`` is the number of quota units used, e.g. the size of a batch.
+        """
+        attempt = 0
+        while True:
+            self._acquire(cost)
+            try:
+                result = send()
+            except Exception as error:
+                self._release()
+                if attempt and recover is not None and applied_earlier(method_id, error):
+                    # An earlier attempt went through even though we never saw its response
+                    self._count('recovered')
+                    return recover(error)
+                delay = self.next_delay(error, attempt, safe)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self._release()
+            self._speed_up()
+            return result
+
+    def next_delay(self, error: Exception, attempt: int, safe: bool = True):
+        """Backoff before retrying ``error``, or None to give up."""
+        if is_rate_limited(error):
+            self._slow_down()
+        if not (safe and is_transient(error)):
+            return None
+        if attempt >= self.max_retries:
+            self._count('gave_up')
+            return None
+        self._count('retries')
+        telemetry.retry(str(error.resp.status) if isinstance(error, HttpError) else type(error).__name__)
+        delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def configure(self, rate: float = None, burst: int = None, max_retries: int = None):
+        """Change pacing limits at runtime (e.g. for benchmarks)."""
+        with self._lock:
+            if rate is not None:
+                self.max_rate = self.bucket.rate = rate
+                self.min_rate = rate / 20
+            if burst is not None:
+                self.bucket.burst = burst
+            if max_retries is not None:
+                self.max_retries = max_retries
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, queued=self._queued, in_flight=self._in_flight,
+                        rate=self.bucket.rate)
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    def _acquire(self, cost: int):
+        with self._lock:
+            self._queued += 1
+            self._stats['requests'] += 1
+        try:
+            wait = self.bucket.reserve(cost)
+            if wait:
+                time.sleep(wait)
+            self._slots.acquire()
+        finally:
+            with self._lock:
+                self._queued -= 1
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _slow_down(self):
+        # Multiplicative decrease on every rate-limit response
+        with self._lock:
+            self._stats['throttled'] += 1
+            if self.max_rate > 0:
+                self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+
+    def _speed_up(self):
+        # Additive increase back towards the configured quota
+        if self.max_rate > 0 and self.bucket.rate < self.max_rate:
+            with self._lock:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 50)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+
+# Live schedulers, for the process-wide gauges
+_schedulers = weakref.WeakSet()
+
+# Scheduler of the default account (and of clients built without one)
+scheduler = RequestScheduler()
+
+telemetry.gauge('scheduler_queue_depth', lambda: sum(s._queued for s in list(_schedulers)))
+telemetry.gauge('scheduler_in_flight', lambda: sum(s._in_flight for s in list(_schedulers)))
+telemetry.gauge('scheduler_rate', lambda: scheduler.bucket.rate)
@@ -0,0 +1,335 @@
+"""
+Field and full-text search over mirrored events.
+
+``parse_query`` understands a small query language:
+
+    standup                      free text: any field
+    "design review"              phrase
+    summary:retro  title:retro   event title
+    description:budget  desc:    description
+    location:"room 4"  loc:      location
+    attendee:alice  with:bob     attendee or organizer name or email
+    after:2025-05-01  before:"May 31 2025"  on:2025-05-14
+    plan*                        prefix
+    -lunch  -location:cafe       exclude
+
+``SearchIndex`` is an inverted index over the same fields. It subscribes
+to the event mirror and is updated incrementally. Matches are ranked with
+BM25, weighted per field; ties go to the event starting closest to now.
+``remote_terms`` turns a query into the Calendar API's ``q=`` parameter,
+for narrowing calendars that are not mirrored yet.
+"""
+
+import bisect
+import datetime
+import math
+import re
+import shlex
+import threading
+import time
+from collections import Counter, defaultdict
+
+from date_parsing import parse_datetime
+from name_index import normalize
+
+# BM25 parameters and per-field weights
+BM25_K1 = 1.2
+BM25_B = 0.75
+FIELD_WEIGHTS = {'summary': 3.0, 'location': 1.5, 'attendee': 1.5, 'description': 1.0}
+FIELDS = tuple(FIELD_WEIGHTS)
+# Bonus on top of BM25 when a phrase matches as a whole
+PHRASE_BONUS = 1.0
+
+FIELD_ALIASES = {'summary': 'summary', 'title': 'summary', 'description': 'description',
+                 'desc': 'description', 'location': 'location', 'loc': 'location',
+                 'attendee': 'attendee', 'with': 'attendee'}
+TIME_FILTERS = ('after', 'before', 'on')
+
+_FIELD_TERM = re.compile(r'^(-?)(\w+):(.*)$', re.DOTALL)
+
+
+class Term:
+    __slots__ = ('field', 'tokens', 'phrase', 'prefix', 'negate')
+
+    def __init__(self, field, tokens, phrase=False, prefix=False, negate=False):
+        self.field = field          # None = any field
+        self.tokens = tokens
+        self.phrase = phrase
+        self.prefix = prefix        # the last token is a prefix
+        self.negate = negate
+
+    def __repr__(self):
+        return f'Term({self.field}, {self.tokens}, phrase={self.phrase}, prefix={self.prefix}, negate={self.negate})'
+
+
+class Query:
+    def __init__(self, terms: list, time_min: float = None, time_max: float = None):
+        self.terms = terms
+        self.time_min = time_min
+        self.time_max = time_max
+
+    @property
+    def positive(self) -> list:
+        return [t for t in self.terms if not t.negate]
+
+
+def parse_query(text: str, timezone: str = 'UTC') -> Query:
+    """Parse ``text`` in the query language above; raises ValueError on bad input."""
+    try:
+        parts = shlex.split(text or '', posix=True)
+    except ValueError as e:
+        raise ValueError(f"Invalid query: {e}")
+    terms, time_min, time_max = [], None, None
+    for part in parts:
+        negate = part.startswith('-') and len(part) > 1
+        field, value = None, part[1:] if negate else part
+        match = _FIELD_TERM.match(part)
+        if match and (match.group(2).lower() in FIELD_ALIASES or match.group(2).lower() in TIME_FILTERS):
+            negate, name, value = bool(match.group(1)), match.group(2).lower(), match.group(3)
+            if name in TIME_FILTERS:
+                if negate:
+                    raise ValueError(f"'{name}:' cannot be negated")
+                start, end = _day_bounds(value, timezone) if name == 'on' else (_timestamp(value, timezone),) * 2
+                if name in ('after', 'on'):
+                    time_min = start if time_min is None else max(time_min, start)
+                if name in ('before', 'on'):
+                    time_max = end if time_max is None else min(time_max, end)
+                continue
+            field = FIELD_ALIASES[name]
+        prefix = value.endswith('*')
+        tokens = normalize(value.rstrip('*')).split()
+        if tokens:
+            terms.append(Term(field, tokens, phrase=len(tokens) > 1, prefix=prefix, negate=negate))
+    return Query(terms, time_min, time_max)
+
+
+def remote_terms(query: Query) -> str:
+    """Words for the Calendar API's ``q=`` (it matches all of them in any text field)."""
+    words = []
+    for term in query.positive:
+        # q= has no prefix matching, so a prefix token is left to the local index
+        words.extend(term.tokens[:-1] if term.prefix else term.tokens)
+    return ' '.join(dict.fromkeys(words))
+
+
+def _parse_date(value: str, timezone: str) -> datetime.datetime:
+    try:
+        parsed = parse_datetime(value, timezone)
+    except (ValueError, OverflowError):
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid date '{value}' in query")
+    return datetime.datetime.fromisoformat(parsed)
+
+
+def _timestamp(value: str, timezone: str) -> float:
+    return _parse_date(value, timezone).timestamp()
+
+
+def _day_bounds(value: str, timezone: str) -> tuple:
+    start = _parse_date(value, timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.timestamp(), (start + datetime.timedelta(days=1)).timestamp()
+
+
+def event_fields(event: dict) -> dict:
+    """Normalized tokens of each searchable field of an API event."""
+    people = list(event.get('attendees') or [])
+    if event.get('organizer'):
+        people.append(event['organizer'])
+    attendee = ' '.join(f"{p.get('displayName', '')} {p.get('email', '')}" for p in people)
+    return {'summary': normalize(event.get('summary')).split(),
+            'description': normalize(event.get('description')).split(),
+            'location': normalize(event.get('location')).split(),
+            'attendee': normalize(attendee).split()}
+
+
+class SearchMatch:
+    __slots__ = ('calendar_id', 'event_id', 'score', 'start_ts')
+
+    def __init__(self, calendar_id, event_id, score, start_ts):
+        self.calendar_id = calendar_id
+        self.event_id = event_id
+        self.score = score
+        self.start_ts = start_ts
+
+    def __repr__(self):
+        return f'SearchMatch({self.calendar_id}, {self.event_id}, score={self.score:.2f})'
+
+
+class SearchIndex:
+    """Inverted index over event fields, kept current as an ``EventStore`` listener."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}                     # key -> (fields, token counts, start_ts, end_ts)
+        self._postings = defaultdict(set)   # (field, token) -> keys
+        self._vocabulary = []               # sorted (field, token), for prefix scans
+        self._field_tokens = dict.fromkeys(FIELDS, 0)
+        self._stats = {'searches': 0, 'updates': 0}
+
+    # ----------------------------
+    # Store listener interface
+    # ----------------------------
+    def on_upsert(self, calendar_id: str, event: dict, start_ts: float, end_ts: float):
+        key = (calendar_id, event['id'])
+        with self._lock:
+            self._remove(key)
+            fields = event_fields(event)
+            counts = {field: Counter(tokens) for field, tokens in fields.items()}
+            self._docs[key] = (fields, counts, start_ts, end_ts)
+            for field, tokens in fields.items():
+                self._field_tokens[field] += len(tokens)
+                for token in set(tokens):
+                    posting = (field, token)
+                    if not self._postings.get(posting):
+                        bisect.insort(self._vocabulary, posting)
+                    self._postings[posting].add(key)
+            self._stats['updates'] += 1
+
+    def on_delete(self, calendar_id: str, event_id: str):
+        with self._lock:
+            self._remove((calendar_id, event_id))
+            self._stats['updates'] += 1
+
+    def on_clear(self, calendar_id: str):
+        with self._lock:
+            for key in [k for k in self._docs if k[0] == calendar_id]:
+                self._remove(key)
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for field, tokens in doc[0].items():
+            self._field_tokens[field] -= len(tokens)
+            for token in set(tokens):
+                posting = (field, token)
+                keys = self._postings.get(posting)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del self._postings[posting]
+                    i = bisect.bisect_left(self._vocabulary, posting)
+                    if i < len(self._vocabulary) and self._vocabulary[i] == posting:
+                        del self._vocabulary[i]
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    def search(self, query: Query, calendar_ids=None, limit: int = 10) -> tuple:
+        """Return ``(matches, total)``: the ``limit`` best ``SearchMatch``es and the match count."""
+        calendar_ids = set(calendar_ids) if calendar_ids else None
+        with self._lock:
+            self._stats['searches'] += 1
+            positive = query.positive
+            candidates = None
+            for term in positive:
+                keys = self._term_keys(term)
+                candidates = keys if candidates is None else candidates & keys
+                if not candidates:
+                    return [], 0
+            if candidates is None:
+                candidates = set(self._docs)
+            for term in query.terms:
+                if term.negate:
+                    candidates -= self._term_keys(term)
+            plan = self._plan(positive)
+            matches = []
+            for key in candidates:
+                fields, counts, start_ts, end_ts = self._docs[key]
+                if calendar_ids is not None and key[0] not in calendar_ids:
+                    continue
+                # A recurring series spans its first to last occurrence; no end = open-ended
+                if query.time_min is not None and end_ts is not None and end_ts <= query.time_min:
+                    continue
+                if query.time_max is not None and (start_ts is None or start_ts >= query.time_max):
+                    continue
+                matches.append(SearchMatch(key[0], key[1], self._score(plan, fields, counts), start_ts))
+        now = time.time()
+        matches.sort(key=lambda m: (-m.score, abs((m.start_ts or now) - now)))
+        return matches[:limit], len(matches)
+
+    def _term_keys(self, term: Term) -> set:
+        fields = (term.field,) if term.field else FIELDS
+        keys = None
+        for i, token in enumerate(term.tokens):
+            prefix = term.prefix and i == len(term.tokens) - 1
+            found = set()
+            for field in fields:
+                for posting in (self._prefixed(field, token) if prefix else ((field, token),)):
+                    found |= self._postings.get(posting, set())
+            keys = found if keys is None else keys & found
+        if term.phrase:
+            keys = {key for key in keys if any(_contains(self._docs[key][0][field], term) for field in fields)}
+        return keys
+
+    def _prefixed(self, field: str, prefix: str) -> list:
+        i = bisect.bisect_left(self._vocabulary, (field, prefix))
+        found = []
+        while i < len(self._vocabulary):
+            posting = self._vocabulary[i]
+            if posting[0] != field or not posting[1].startswith(prefix):
+                break
+            found.append(posting)
+            i += 1
+        return found
+
+    def _plan(self, terms: list) -> list:
+        """Per term and field: ``(term, field, length norm, [(token, is prefix, idf)])``.
+
+        Document frequencies depend only on the query, so they are computed
+        once per search rather than once per candidate.
+        """
+        count = len(self._docs) or 1
+        plan = []
+        for term in terms:
+            for field in ((term.field,) if term.field else FIELDS):
+                average = self._field_tokens[field] / count or 1.0
+                parts = []
+                for i, token in enumerate(term.tokens):
+                    prefix = term.prefix and i == len(term.tokens) - 1
+                    if prefix:
+                        df = len(set().union(*(self._postings[p] for p in self._prefixed(field, token))))
+                    else:
+                        df = len(self._postings.get((field, token), ()))
+                    if df:
+                        parts.append((token, prefix, math.log(1 + (count - df + 0.5) / (df + 0.5))))
+                if parts:
+                    plan.append((term, field, average, parts))
+        return plan
+
+    @staticmethod
+    def _score(plan: list, fields: dict, counts: dict) -> float:
+        score = 0.0
+        for term, field, average, parts in plan:
+            tokens = fields[field]
+            if not tokens:
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average)
+            field_counts = counts[field]
+            for token, prefix, idf in parts:
+                if prefix:
+                    tf = sum(n for t, n in field_counts.items() if t.startswith(token))
+                else:
+                    tf = field_counts.get(token, 0)
+                if tf:
+                    score += FIELD_WEIGHTS[field] * idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if term.phrase and _contains(tokens, term):
+                score += PHRASE_BONUS * FIELD_WEIGHTS[field]
+        return score
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, documents=len(self._docs), terms=len(self._vocabulary))
+
+
+def _contains(tokens: list, term: Term) -> bool:
+    """Whether the term's tokens appear consecutively in ``tokens``."""
+    n = len(term.tokens)
+    for i in range(len(tokens) - n + 1):
+        window = tokens[i:i + n]
+        if window[:-1] == term.tokens[:-1] and (
+                window[-1].startswith(term.tokens[-1]) if term.prefix else window[-1] == term.tokens[-1]):
+            return True
+    return False
@@ -0,0 +1,344 @@
+"""
+Per-tool tracing and metrics.
+
+Every tool call runs inside ``telemetry.tool(name)``, and the phases inside it
+are timed with ``telemetry.span(name)``. Phases include client build, token
+refresh, mirror sync, date parsing and each Calendar API request. Spans and
+counters are attributed to the running tool through a context variable;
+``blocking_tool`` copies that variable into its worker thread.
+
+Metrics are rendered in the Prometheus text format, which the SSE server
+serves at ``/metrics``. When ``TELEMETRY_OTEL`` is set, spans and metrics
+are also sent through OpenTelemetry. ``TELEMETRY_SPANS`` keeps the last N
+finished spans in memory for tests and debugging.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Finished spans kept in memory (0 = none)
+TELEMETRY_SPANS = int(os.environ.get('TELEMETRY_SPANS', '0'))
+# '' = off, 'api' = use globally configured OpenTelemetry providers,
+# 'otlp' / 'console' = configure the SDK with that exporter
+TELEMETRY_OTEL = os.environ.get('TELEMETRY_OTEL', '')
+
+PREFIX = 'calendar_mcp_'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'tool_calls_total': ('counter', 'Tool invocations by outcome', None),
+    'span_duration_seconds': ('histogram', 'Duration of tools (span="tool") and the phases inside them',
+                              LATENCY_BUCKETS),
+    'api_calls_total': ('counter', 'Calendar API requests by method', None),
+    'api_calls_per_invocation': ('histogram', 'Calendar API requests made by one tool call', COUNT_BUCKETS),
+    'http_bytes_total': ('counter', 'HTTP body bytes sent and received', None),
+    'cache_lookups_total': ('counter', 'Response cache lookups by result', None),
+    'retries_total': ('counter', 'Retried Calendar API requests by reason', None),
+    'push_notifications_total': ('counter', 'Push notifications received by resource state', None),
+    'scheduler_queue_depth': ('gauge', 'API requests waiting for a rate-limit token or a free slot', None),
+    'scheduler_in_flight': ('gauge', 'API requests currently in flight', None),
+    'scheduler_rate': ('gauge', 'Current API request rate limit per second of the default account', None),
+}
+
+_invocation = contextvars.ContextVar('telemetry_invocation', default=None)
+_span_path = contextvars.ContextVar('telemetry_span_path', default=())
+
+
+class _Invocation:
+    __slots__ = ('tool', 'api_calls')
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.api_calls = 0
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Prometheus buckets are "less than or equal"; the last slot is +Inf
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Telemetry:
+    """Thread-safe registry of counters, histograms and (optionally) recent spans."""
+
+    def __init__(self, keep_spans: int = TELEMETRY_SPANS, otel: str = TELEMETRY_OTEL):
+        self._lock = threading.Lock()
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> _Histogram
+        self._gauges = {}       # name -> callable returning the current value
+        self._spans = deque(maxlen=keep_spans) if keep_spans else None
+        self._otel = _start_otel(otel) if otel else None
+
+    # ----------------------------
+    # Recording
+    # ----------------------------
+    def count(self, name: str, value: float = 1, **labels):
+        labels = self._labels(labels)
+        with self._lock:
+            self._counters[name, labels] = self._counters.get((name, labels), 0) + value
+        if self._otel is not None:
+            self._otel.record(name, value, labels)
+
+    def observe(self, name: str, value: float, **labels):
+        labels = self._labels(labels)
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[name, labels] = _Histogram(METRICS[name][2])
+            histogram.observe(value)
+        if self._otel is not None:
+            self._otel.record(name, value, labels)
+
+    def gauge(self, name: str, read):
+        """Report ``read()`` as the value of gauge ``name`` whenever metrics are collected."""
+        with self._lock:
+            self._gauges[name] = read
+        if self._otel is not None:
+            self._otel.gauge(name, read)
+
+    def span(self, name: str, **attributes):
+        """Time a phase of the current tool (context manager)."""
+        return self._span(name, name, attributes)
+
+    @contextlib.contextmanager
+    def tool(self, name: str):
+        """Run a tool invocation: root span, outcome counter, API calls per call."""
+        invocation = _Invocation(name)
+        token = _invocation.set(invocation)
+        status = 'ok'
+        try:
+            with self._span(name, 'tool', {}):
+                yield invocation
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self.count('tool_calls_total', status=status)
+            self.observe('api_calls_per_invocation', invocation.api_calls)
+            _invocation.reset(token)
+
+    @contextlib.contextmanager
+    def api_call(self, method: str):
+        """Count and time one Calendar API round trip (``method`` e.g. calendar.events.patch)."""
+        invocation = _invocation.get()
+        if invocation is not None:
+            with self._lock:
+                invocation.api_calls += 1
+        self.count('api_calls_total', method=method or 'unknown')
+        with self._span(method or 'api', method or 'api', {}):
+            yield
+
+    def retry(self, reason: str):
+        self.count('retries_total', reason=reason)
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+    def spans(self) -> list:
+        """Recently finished spans, oldest first (empty unless spans are kept)."""
+        with self._lock:
+            return list(self._spans or ())
+
+    def keep_spans(self, limit: int):
+        """Start (limit > 0) or stop keeping finished spans in memory."""
+        with self._lock:
+            self._spans = deque(self._spans or (), maxlen=limit) if limit else None
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            if self._spans is not None:
+                self._spans.clear()
+
+    def snapshot(self) -> dict:
+        """Counters and histogram count/sum keyed by Prometheus-style series names."""
+        with self._lock:
+            counters = {_series(name, labels): value
+                        for (name, labels), value in sorted(self._counters.items())}
+            histograms = {_series(name, labels): {'count': h.count, 'sum': h.sum}
+                          for (name, labels), h in sorted(self._histograms.items())}
+            gauges = dict(self._gauges)
+        return {'counters': counters, 'histograms': histograms,
+                'gauges': {PREFIX + name: read() for name, read in sorted(gauges.items())}}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count))
+                                for key, h in self._histograms.items())
+            gauges = dict(self._gauges)
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            full = PREFIX + name
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} {kind}')
+            if kind == 'gauge':
+                if name in gauges:
+                    lines.append(f'{full} {_number(gauges[name]())}')
+                continue
+            if kind == 'counter':
+                for (metric, labels), value in counters:
+                    if metric == name:
+                        lines.append(f'{full}{_format_labels(labels)} {_number(value)}')
+                continue
+            for (metric, labels), (counts, total, count) in histograms:
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{full}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{full}_sum{_format_labels(labels)} {_number(total)}')
+                lines.append(f'{full}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    @staticmethod
+    def _labels(labels: dict) -> tuple:
+        invocation = _invocation.get()
+        labels.setdefault('tool', invocation.tool if invocation is not None else 'none')
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @contextlib.contextmanager
+    def _span(self, name: str, label: str, attributes: dict):
+        path = _span_path.get() + (name,)
+        token = _span_path.set(path)
+        otel_span = self._otel.span(name, attributes) if self._otel else contextlib.nullcontext()
+        error = None
+        begin = time.perf_counter()
+        try:
+            with otel_span:
+                yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - begin
+            _span_path.reset(token)
+            self.observe('span_duration_seconds', duration, span=label)
+            if self._spans is not None:
+                invocation = _invocation.get()
+                record = {'name': name, 'path': '/'.join(path), 'duration': duration, 'error': error,
+                          'tool': invocation.tool if invocation is not None else None}
+                record.update(attributes)
+                with self._lock:
+                    if self._spans is not None:
+                        self._spans.append(record)
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _series(name: str, labels: tuple) -> str:
+    return PREFIX + name + _format_labels(labels)
+
+
+# ----------------------------
+# OpenTelemetry bridge (optional dependency)
+# ----------------------------
+class _OpenTelemetry:
+    """Mirror spans and metrics into the OpenTelemetry API."""
+
+    def __init__(self, trace, metrics):
+        self.tracer = trace.get_tracer('calendar_mcp')
+        self.meter = metrics.get_meter('calendar_mcp')
+        self._instruments = {}     # metric name -> bound add/record
+        self._lock = threading.Lock()
+
+    def span(self, name: str, attributes: dict):
+        return self.tracer.start_as_current_span(
+            name, attributes={key: str(value) for key, value in attributes.items()})
+
+    def gauge(self, name: str, read):
+        from opentelemetry.metrics import Observation
+        self.meter.create_observable_gauge(PREFIX + name, callbacks=[lambda options: [Observation(read())]],
+                                           description=METRICS[name][1])
+
+    def record(self, name: str, value: float, labels: tuple):
+        with self._lock:
+            emit = self._instruments.get(name)
+            if emit is None:
+                kind, help_text, _ = METRICS[name]
+                unit = 's' if name.endswith('_seconds') else '1'
+                if kind == 'counter':
+                    emit = self.meter.create_counter(PREFIX + name, unit=unit, description=help_text).add
+                else:
+                    emit = self.meter.create_histogram(PREFIX + name, unit=unit, description=help_text).record
+                self._instruments[name] = emit
+        emit(value, dict(labels))
+
+
+def _start_otel(mode: str):
+    try:
+        from opentelemetry import metrics, trace
+        if mode in ('otlp', 'console'):
+            _configure_sdk(mode, trace, metrics)
+    except ImportError as e:
+        print(f"TELEMETRY_OTEL={mode} ignored: {e}. Install opentelemetry-sdk "
+              f"(and opentelemetry-exporter-otlp for 'otlp').", file=sys.stderr)
+        return None
+    return _OpenTelemetry(trace, metrics)
+
+
+def _configure_sdk(mode: str, trace, metrics):
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    if mode == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        span_exporter, metric_exporter = OTLPSpanExporter(), OTLPMetricExporter()
+    else:
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        # stdout carries the stdio transport; export to stderr instead
+        span_exporter = ConsoleSpanExporter(out=sys.stderr)
+        metric_exporter = ConsoleMetricExporter(out=sys.stderr)
+
+    resource = Resource.create({'service.name': os.environ.get('OTEL_SERVICE_NAME', 'calendar-mcp')})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(resource=resource,
+                                             metric_readers=[PeriodicExportingMetricReader(metric_exporter)]))
+
+
+# Process-wide registry used by every module
+telemetry = Telemetry()
@@ -0,0 +1,331 @@
+"""
+Serve several Google accounts from one server process.
+
+A ``Tenant`` bundles the state of one account: its Calendar service manager
+(credentials), its request scheduler (the Calendar quota is per user), its
+event mirror and the indexes built on the mirror. ``TenantPool`` keeps the
+most recently used tenants in a bounded LRU; an evicted tenant is rebuilt on
+its next request from its token file and on-disk mirror. The parsed
+discovery document, the per-thread HTTP connections, the response cache and
+the tool worker pool are shared, so each extra account only adds its own
+credentials and events.
+
+Accounts are listed in the JSON file named by ``TENANTS_FILE``:
+
+    {"alice": {"key_sha256": "<sha256 of alice's access key>"},
+     "bob": {"key_sha256": "...", "token_file": "/secrets/bob.json"}}
+
+Over SSE, ``TenantMiddleware`` maps the key presented when a client opens
+``GET /sse`` to its tenant and stores the tenant ID in a context variable
+that every tool call of that MCP session inherits. Without a tenants file
+the server stays single-account. Add an account with:
+    python -m tenants add alice
+"""
+
+import argparse
+import collections
+import contextvars
+import hashlib
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+from urllib.parse import parse_qs
+
+from calendar_service import CalendarServiceManager
+from event_store import EventStore, SQLiteBackend
+from fanout import CalendarList
+from freebusy import BusyIndex
+from http_cache import ResponseCache
+from name_index import NameIndex
+from scheduler import RequestScheduler
+from search import SearchIndex
+from write_behind import WriteQueue, journal_path
+
+TENANTS_FILE = os.environ.get('TENANTS_FILE', '')
+# Per-tenant token.json and events.db live in TENANT_DATA_DIR/<tenant id>/
+TENANT_DATA_DIR = os.environ.get('TENANT_DATA_DIR', os.path.join('data', 'tenants'))
+TENANT_POOL_SIZE = int(os.environ.get('TENANT_POOL_SIZE', '32'))
+# Seconds between background token refreshes of pooled tenants
+TOKEN_REFRESH_INTERVAL = float(os.environ.get('TOKEN_REFRESH_INTERVAL', '60'))
+DEFAULT_TENANT = 'default'
+
+_TENANT_ID = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+
+# Tenant of the current MCP session (CALENDAR_TENANT picks one for stdio)
+_current_tenant = contextvars.ContextVar('calendar_tenant',
+                                         default=os.environ.get('CALENDAR_TENANT', DEFAULT_TENANT))
+
+
+def current_tenant_id() -> str:
+    return _current_tenant.get()
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class Tenant:
+    """One account: credentials, quota, calendar list, event mirror and indexes."""
+
+    def __init__(self, tenant_id: str, token_file: str, event_store_path: str, scopes: list,
+                 response_cache: ResponseCache = None, scheduler: RequestScheduler = None):
+        self.tenant_id = tenant_id
+        self.service_manager = CalendarServiceManager(token_file, scopes, response_cache=response_cache,
+                                                      cache_namespace=tenant_id,
+                                                      scheduler=scheduler or RequestScheduler())
+        self.calendar_list = CalendarList(self.get_service)
+        # Local mirror of the account's calendars, kept current with sync tokens
+        self.event_store = EventStore(self.get_service, SQLiteBackend(event_store_path))
+        # Indexes fed by the mirror, seeded from it on first use (or by the
+        # warm start) rather than here, so a large mirror does not slow start-up
+        self._name_index = NameIndex()
+        self._busy_index = BusyIndex()
+        self._search_index = SearchIndex()
+        for index in (self._name_index, self._busy_index, self._search_index):
+            self.event_store.add_listener(index, lazy=True)
+        # (calendar id, q, window) -> when a remote q= search last filled the index
+        self.remote_searches = {}
+        # Queued, coalesced edits; sent before the mirror pulls so a pull never undoes them
+        self.write_queue = WriteQueue(self.event_store, self.get_service, journal_path(event_store_path))
+        self.event_store.add_pull_hook(self.write_queue.flush)
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        return self.service_manager.scheduler
+
+    def get_service(self):
+        return self.service_manager.get_service()
+
+    @property
+    def name_index(self) -> NameIndex:
+        """Summary index for name lookups, updated incrementally by the mirror."""
+        self.event_store.seed_listeners()
+        return self._name_index
+
+    @property
+    def busy_index(self) -> BusyIndex:
+        """Interval trees of busy time per calendar, rebuilt lazily after changes."""
+        self.event_store.seed_listeners()
+        return self._busy_index
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """Inverted index for search_events."""
+        self.event_store.seed_listeners()
+        return self._search_index
+
+    def close(self):
+        """Send queued edits and release the edit journal (on eviction from the pool)."""
+        self.write_queue.close()
+
+    def stats(self) -> dict:
+        return {'tenant': self.tenant_id, 'service': self.service_manager.stats(),
+                'event_store': self.event_store.stats(), 'name_index': self._name_index.stats(),
+                'search_index': self._search_index.stats(), 'scheduler': self.scheduler.stats(),
+                'write_queue': self.write_queue.stats()}
+
+
+class TenantPool:
+    """Bounded LRU of tenants, built on first use from the tenants file.
+
+    The default tenant (the single-account configuration) is always kept.
+    """
+
+    def __init__(self, default: Tenant, scopes: list, registry: dict = None,
+                 size: int = TENANT_POOL_SIZE, data_dir: str = TENANT_DATA_DIR,
+                 in_memory: bool = False):
+        self.default = default
+        self.scopes = scopes
+        self.registry = registry or {}
+        self.size = size
+        self.data_dir = data_dir
+        self.in_memory = in_memory
+        self._by_key = {entry['key_sha256']: tenant_id for tenant_id, entry in self.registry.items()
+                        if entry.get('key_sha256')}
+        self._tenants = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}  # tenant id -> lock held while that tenant is built
+        self._stats = {'hits': 0, 'builds': 0, 'evictions': 0}
+
+    @classmethod
+    def from_file(cls, default: Tenant, scopes: list, path: str = TENANTS_FILE, **kwargs) -> 'TenantPool':
+        return cls(default, scopes, load_registry(path) if path else {}, **kwargs)
+
+    @property
+    def multi_tenant(self) -> bool:
+        return bool(self.registry)
+
+    def authenticate(self, key: str):
+        """Tenant ID for an access key, or None."""
+        return self._by_key.get(hash_key(key)) if key else None
+
+    def get(self, tenant_id: str) -> Tenant:
+        if tenant_id == DEFAULT_TENANT:
+            return self.default
+        tenant = self._pooled(tenant_id)
+        if tenant is not None:
+            return tenant
+        with self._lock:
+            if tenant_id not in self.registry:
+                raise KeyError(f"Unknown tenant '{tenant_id}'")
+            build_lock = self._build_locks.setdefault(tenant_id, threading.Lock())
+        # Built outside the pool lock: building waits for an evicted copy of this
+        # tenant to release its edit journal, and other tenants must not wait with it
+        evicted = []
+        with build_lock:
+            tenant = self._pooled(tenant_id)    # built by another call meanwhile
+            if tenant is not None:
+                return tenant
+            tenant = self._build(tenant_id)
+            with self._lock:
+                self._tenants[tenant_id] = tenant
+                self._stats['builds'] += 1
+                while len(self._tenants) > self.size:
+                    # In-flight calls keep their reference; the rest is garbage collected
+                    evicted.append(self._tenants.popitem(last=False)[1])
+                    self._stats['evictions'] += 1
+        # Queued edits are sent outside the locks so other tenants are not held up
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def _pooled(self, tenant_id: str):
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                self._stats['hits'] += 1
+            return tenant
+
+    def tenants(self) -> list:
+        with self._lock:
+            return [self.default, *self._tenants.values()]
+
+    def refresh_tokens(self):
+        """Refresh expiring tokens of pooled tenants ahead of their next call."""
+        for tenant in self.tenants():
+            try:
+                tenant.service_manager.refresh()
+            except Exception as e:
+                print(f"Token refresh failed for tenant '{tenant.tenant_id}': {e}", file=sys.stderr)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pooled=len(self._tenants), size=self.size,
+                        registered=len(self.registry))
+
+    def _build(self, tenant_id: str) -> Tenant:
+        entry = self.registry[tenant_id]
+        directory = os.path.join(self.data_dir, tenant_id)
+        token_file = entry.get('token_file') or os.path.join(directory, 'token.json')
+        if self.in_memory:
+            event_store_path = ':memory:'
+        else:
+            os.makedirs(directory, exist_ok=True)
+            event_store_path = os.path.join(directory, 'events.db')
+        return Tenant(tenant_id, token_file, event_store_path, self.scopes,
+                      self.default.service_manager.response_cache)
+
+
+def load_registry(path: str) -> dict:
+    with open(path) as f:
+        registry = json.load(f)
+    for tenant_id in registry:
+        if not _TENANT_ID.fullmatch(tenant_id) or tenant_id == DEFAULT_TENANT:
+            raise ValueError(f"Invalid tenant ID '{tenant_id}' in {path}")
+    return registry
+
+
+# ----------------------------
+# SSE: pick the tenant per MCP session
+# ----------------------------
+class TenantMiddleware:
+    """ASGI middleware that binds each SSE connection to the tenant of its key.
+
+    The key is read from ``Authorization: Bearer <key>``, an ``X-Calendar-Key``
+    header or a ``?key=`` query parameter. Without a tenants file every
+    connection uses the default tenant.
+    """
+
+    def __init__(self, app, pool: TenantPool, sse_path: str = '/sse'):
+        self.app = app
+        self.pool = pool
+        self.sse_path = sse_path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.sse_path or not self.pool.multi_tenant:
+            return await self.app(scope, receive, send)
+        tenant_id = self.pool.authenticate(self._key(scope))
+        if tenant_id is None:
+            await send({'type': 'http.response.start', 'status': 401,
+                        'headers': [(b'content-type', b'text/plain'),
+                                    (b'www-authenticate', b'Bearer')]})
+            await send({'type': 'http.response.body', 'body': b'Unknown or missing calendar key\n'})
+            return
+        # The SSE handler runs the whole MCP session in this task, so its tools inherit the tenant
+        _current_tenant.set(tenant_id)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _key(scope) -> str:
+        headers = dict(scope.get('headers') or [])
+        authorization = headers.get(b'authorization', b'').decode('latin-1')
+        if authorization.lower().startswith('bearer '):
+            return authorization[7:].strip()
+        if b'x-calendar-key' in headers:
+            return headers[b'x-calendar-key'].decode('latin-1').strip()
+        return parse_qs(scope.get('query_string', b'').decode('latin-1')).get('key', [''])[0]
+
+
+class TokenRefresher(threading.Thread):
+    """Daemon thread that keeps the tokens of pooled tenants fresh."""
+
+    def __init__(self, pool: TenantPool, interval: float = TOKEN_REFRESH_INTERVAL):
+        super().__init__(name='token-refresher', daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.pool.refresh_tokens()
+
+    def stop(self):
+        self._stopped.set()
+
+
+# ----------------------------
+# CLI: register tenants
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Manage the accounts listed in the tenants file')
+    parser.add_argument('--file', default=TENANTS_FILE or 'tenants.json')
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add', help='register a tenant (or rotate its key) and print its new key')
+    add.add_argument('tenant_id')
+    add.add_argument('--token-file', help=f'token path (default: {TENANT_DATA_DIR}/<id>/token.json)')
+    sub.add_parser('list', help='list registered tenants')
+    args = parser.parse_args()
+
+    registry = load_registry(args.file) if os.path.exists(args.file) else {}
+    if args.command == 'list':
+        for tenant_id, entry in sorted(registry.items()):
+            print(tenant_id, entry.get('token_file') or os.path.join(TENANT_DATA_DIR, tenant_id, 'token.json'))
+        return
+    if not _TENANT_ID.fullmatch(args.tenant_id) or args.tenant_id == DEFAULT_TENANT:
+        parser.error(f"invalid tenant ID '{args.tenant_id}'")
+    key = secrets.token_urlsafe(32)
+    entry = registry.setdefault(args.tenant_id, {})
+    entry['key_sha256'] = hash_key(key)
+    if args.token_file:
+        entry['token_file'] = args.token_file
+    with open(args.file, 'w') as f:
+        json.dump(registry, f, indent=2)
+    print(key)
+
+
+if __name__ == '__main__':
+    main()
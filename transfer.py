@@ -0,0 +1,565 @@
+"""
+Bulk export and import of events as JSONL or ICS files.
+
+Both directions are generator pipelines holding one page or one batch of
+events at a time, so memory does not grow with the event bodies (import
+also keeps the set of iCalUIDs it has seen):
+
+- Export pages through ``events().list`` (``MAX_PAGE_SIZE`` events a page,
+  recurring events as series with their exceptions) and writes each event
+  as it arrives: one JSON object per line, or one ``VEVENT`` of an RFC 5545
+  calendar. A cancelled occurrence of a series is written with the series'
+  iCalUID and its times, so importing the file cancels it again. The file
+  is written next to its final path and renamed when complete.
+- Import reads the file record by record and sends ``events().import_``
+  calls through the batch endpoint, ``IMPORT_BATCH_SIZE`` at a time.
+  Importing keeps each event's iCalUID, so an event imported twice is
+  updated rather than duplicated. Records whose iCalUID (and, for a changed
+  occurrence of a recurring event, original start) was already seen in
+  the file or is already in the calendar are skipped.
+
+After every batch the number of records done, and which of them failed, is
+saved to a checkpoint file next to the source; an interrupted import started
+again with the same file and calendar sends the failed records again and
+continues after the last completed batch. The checkpoint is removed once the
+import finishes.
+
+JSONL holds events exactly as the API returned them. ICS keeps the fields
+other calendar apps understand (times, recurrence, text, status,
+transparency, organizer and attendees); times are written with their IANA
+time zone as TZID, without VTIMEZONE definitions, as Google's importer
+accepts.
+"""
+
+import collections
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import re
+
+from batch_ops import BATCH_LIMIT, BATCH_WORKERS, execute_batch
+from date_parsing import get_zone
+from event_store import SYNC_FIELDS, event_bounds
+from listing import MAX_PAGE_SIZE, iter_pages
+
+# events().import_ calls sent per round of batch requests (checkpointed after each)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', str(BATCH_LIMIT * BATCH_WORKERS)))
+# Failed records listed in an import result
+TRANSFER_MAX_ERRORS = 50
+FORMATS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.ics': 'ics', '.ical': 'ics'}
+
+# Fields Google assigns to an event in a particular calendar; an imported copy gets its own
+SERVER_FIELDS = ('id', 'etag', 'htmlLink', 'kind', 'created', 'updated', 'creator', 'recurringEventId',
+                 'hangoutLink', 'conferenceData', 'privateCopy', 'locked')
+
+
+def format_of(path: str, fmt: str = None) -> str:
+    """``'jsonl'`` or ``'ics'``: ``fmt`` if given, else from the file extension."""
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ('jsonl', 'ics'):
+        raise ValueError(f"Unknown format for '{path}'. Use a .jsonl or .ics file, or format 'jsonl' or 'ics'.")
+    return fmt
+
+
+def checkpoint_path(path: str) -> str:
+    return path + '.checkpoint.json'
+
+
+# ----------------------------
+# ICS encoding
+# ----------------------------
+_PARTSTAT = {'accepted': 'ACCEPTED', 'declined': 'DECLINED', 'tentative': 'TENTATIVE',
+             'needsAction': 'NEEDS-ACTION'}
+_RESPONSE = {v: k for k, v in _PARTSTAT.items()}
+
+
+def _escape(text: str) -> str:
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), text)
+
+
+def _fold(line: str) -> str:
+    """Fold a content line into chunks of at most 75 octets (RFC 5545 3.1)."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1    # do not split a UTF-8 sequence
+        parts.append(data[start:end].decode('utf-8'))
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _param(value: str) -> str:
+    return f'"{value}"' if any(c in value for c in ':;,') else value
+
+
+def _ics_time(name: str, when: dict, time_zone: str = None) -> str:
+    if when.get('date'):
+        return f"{name};VALUE=DATE:{when['date'].replace('-', '')}"
+    moment = datetime.datetime.fromisoformat(when['dateTime'])
+    zone = when.get('timeZone') or time_zone
+    if zone:
+        try:
+            local = moment.astimezone(get_zone(zone))
+            return f"{name};TZID={zone}:{local.strftime('%Y%m%dT%H%M%S')}"
+        except Exception:
+            pass    # not an IANA zone: fall back to UTC
+    return f"{name}:{moment.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def ics_lines(event: dict, time_zone: str = None):
+    """Content lines of one ``VEVENT`` for an API event (unfolded)."""
+    yield 'BEGIN:VEVENT'
+    yield f"UID:{event.get('iCalUID') or event['id'] + '@google.com'}"
+    stamp = event.get('updated') or datetime.datetime.now(datetime.timezone.utc).isoformat()
+    stamp = datetime.datetime.fromisoformat(stamp.replace('Z', '+00:00')).astimezone(datetime.timezone.utc)
+    yield f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}"
+    zone = event.get('start', {}).get('timeZone') or time_zone
+    if event.get('start'):
+        yield _ics_time('DTSTART', event['start'], zone)
+    if event.get('end'):
+        yield _ics_time('DTEND', event['end'], zone)
+    if event.get('originalStartTime'):
+        yield _ics_time('RECURRENCE-ID', event['originalStartTime'], zone)
+    yield from event.get('recurrence', ())
+    for key in ('summary', 'description', 'location'):
+        if event.get(key):
+            yield f"{key.upper()}:{_escape(event[key])}"
+    if event.get('status'):
+        yield f"STATUS:{event['status'].upper()}"
+    yield f"TRANSP:{'TRANSPARENT' if event.get('transparency') == 'transparent' else 'OPAQUE'}"
+    if event.get('sequence'):
+        yield f"SEQUENCE:{event['sequence']}"
+    organizer = event.get('organizer') or {}
+    if organizer.get('email'):
+        cn = f";CN={_param(organizer['displayName'])}" if organizer.get('displayName') else ''
+        yield f"ORGANIZER{cn}:mailto:{organizer['email']}"
+    for attendee in event.get('attendees', ()):
+        if not attendee.get('email'):
+            continue
+        params = ''
+        if attendee.get('displayName'):
+            params += f";CN={_param(attendee['displayName'])}"
+        params += f";PARTSTAT={_PARTSTAT.get(attendee.get('responseStatus'), 'NEEDS-ACTION')}"
+        if attendee.get('optional'):
+            params += ';ROLE=OPT-PARTICIPANT'
+        yield f"ATTENDEE{params}:mailto:{attendee['email']}"
+    yield 'END:VEVENT'
+
+
+def write_ics(events, f, name: str = None, time_zone: str = None) -> int:
+    """Write ``events`` as an iCalendar stream to text file ``f``; returns the count."""
+    header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Google Calendar MCP Server//EN',
+              'CALSCALE:GREGORIAN', 'METHOD:PUBLISH']
+    if name:
+        header.append(f'X-WR-CALNAME:{_escape(name)}')
+    if time_zone:
+        header.append(f'X-WR-TIMEZONE:{time_zone}')
+    f.writelines(_fold(line) for line in header)
+    count = 0
+    for event in events:
+        f.writelines(_fold(line) for line in ics_lines(event, time_zone))
+        count += 1
+    f.write('END:VCALENDAR\r\n')
+    return count
+
+
+def write_jsonl(events, f) -> int:
+    count = 0
+    for event in events:
+        f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+        count += 1
+    return count
+
+
+# ----------------------------
+# ICS decoding
+# ----------------------------
+def _unfold(lines):
+    """Join folded physical lines into content lines, lazily."""
+    current = None
+    for raw in lines:
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and current is not None:
+            current += raw[1:]
+            continue
+        if current:
+            yield current
+        current = raw
+    if current:
+        yield current
+
+
+def _split_line(line: str) -> tuple:
+    """Split ``NAME;PARAM=X;P="a:b":VALUE`` into ``(name, params, value)``, honouring quotes."""
+    head, _, value = line.partition(':')
+    if '"' not in head:
+        name, *params = head.split(';')
+        return name.upper(), {k.upper(): v for k, _, v in (p.partition('=') for p in params) if v}, value
+    quoted, i = False, 0
+    for i, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif c == ':' and not quoted:
+            break
+    head, value = line[:i], line[i + 1:]
+    name, *params = re.split(r';(?=(?:[^"]*"[^"]*")*[^"]*$)', head)
+    params = dict(p.split('=', 1) for p in params if '=' in p)
+    return name.upper(), {k.upper(): v.strip('"') for k, v in params.items()}, value
+
+
+def _time(params: dict, value: str, default_zone: str) -> dict:
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return {'date': f'{value[:4]}-{value[4:6]}-{value[6:8]}'}
+    local = datetime.datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                              int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    if value.endswith('Z'):
+        return {'dateTime': local.replace(tzinfo=datetime.timezone.utc).isoformat()}
+    zone = params.get('TZID') or default_zone
+    try:
+        tzinfo = get_zone(zone)
+    except Exception:
+        zone, tzinfo = default_zone, get_zone(default_zone)
+    return {'dateTime': local.replace(tzinfo=tzinfo).isoformat(), 'timeZone': zone}
+
+
+def _duration(value: str) -> datetime.timedelta:
+    """An RFC 5545 DURATION such as ``PT1H30M`` or ``P1D``."""
+    match = re.fullmatch(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?', value.strip())
+    if not match:
+        raise ValueError(f"Invalid DURATION '{value}'")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = datetime.timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                               minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == '-' else delta
+
+
+def _shift(when: dict, delta: datetime.timedelta) -> dict:
+    if 'date' in when:
+        day = datetime.date.fromisoformat(when['date']) + datetime.timedelta(days=max(delta.days, 1))
+        return {'date': day.isoformat()}
+    moment = datetime.datetime.fromisoformat(when['dateTime']) + delta
+    return dict(when, dateTime=moment.isoformat())
+
+
+def _ics_event(props: list, time_zone: str) -> dict:
+    event, duration = {}, None
+    for name, params, value, line in props:
+        if name == 'UID':
+            event['iCalUID'] = value
+        elif name in ('SUMMARY', 'DESCRIPTION', 'LOCATION'):
+            event[name.lower()] = _unescape(value)
+        elif name == 'DTSTART':
+            event['start'] = _time(params, value, time_zone)
+        elif name == 'DTEND':
+            event['end'] = _time(params, value, time_zone)
+        elif name == 'DURATION':
+            duration = _duration(value)
+        elif name == 'RECURRENCE-ID':
+            event['originalStartTime'] = _time(params, value, time_zone)
+        elif name in ('RRULE', 'RDATE', 'EXDATE', 'EXRULE'):
+            event.setdefault('recurrence', []).append(line)
+        elif name == 'STATUS' and value.upper() in ('CONFIRMED', 'TENTATIVE', 'CANCELLED'):
+            event['status'] = value.lower()
+        elif name == 'TRANSP' and value.upper() == 'TRANSPARENT':
+            event['transparency'] = 'transparent'
+        elif name == 'SEQUENCE' and value.strip().isdigit():
+            event['sequence'] = int(value)
+        elif name in ('ORGANIZER', 'ATTENDEE'):
+            person = {'email': re.sub(r'(?i)^mailto:', '', value)}
+            if params.get('CN'):
+                person['displayName'] = params['CN']
+            if name == 'ORGANIZER':
+                event['organizer'] = person
+                continue
+            person['responseStatus'] = _RESPONSE.get(params.get('PARTSTAT', '').upper(), 'needsAction')
+            if params.get('ROLE', '').upper() == 'OPT-PARTICIPANT':
+                person['optional'] = True
+            event.setdefault('attendees', []).append(person)
+    if 'start' in event and 'end' not in event:
+        # Without DTEND: DURATION, else a day for dates and an instant for times
+        event['end'] = _shift(event['start'], duration if duration is not None else datetime.timedelta(0))
+    if 'originalStartTime' in event and 'timeZone' in event.get('start', {}):
+        event['originalStartTime'].setdefault('timeZone', event['start']['timeZone'])
+    return event
+
+
+def read_ics(lines, time_zone: str = 'UTC'):
+    """Yield the ``VEVENT`` components of an iCalendar stream as API event bodies.
+
+    Times without a TZID or ``Z`` are read in the calendar's ``X-WR-TIMEZONE``,
+    else in ``time_zone``. Nested components such as ``VALARM`` are ignored.
+    """
+    props, nested = None, 0
+    for line in _unfold(lines):
+        name, params, value = _split_line(line)
+        if name == 'X-WR-TIMEZONE' and props is None:
+            time_zone = value.strip() or time_zone
+        elif name == 'BEGIN' and value.upper() == 'VEVENT' and props is None:
+            props, nested = [], 0
+        elif props is None:
+            continue
+        elif name == 'BEGIN':
+            nested += 1
+        elif name == 'END' and nested:
+            nested -= 1
+        elif name == 'END':
+            yield _ics_event(props, time_zone)
+            props = None
+        elif not nested:
+            props.append((name, params, value, line))
+
+
+def read_jsonl(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+
+
+def read_events(path: str, fmt: str = None, time_zone: str = 'UTC'):
+    """Yield the events of a JSONL or ICS file, streaming."""
+    fmt = format_of(path, fmt)
+    with open(path, encoding='utf-8', newline='') as f:
+        yield from (read_ics(f, time_zone) if fmt == 'ics' else read_jsonl(f))
+
+
+# ----------------------------
+# Export
+# ----------------------------
+def _length(event: dict) -> datetime.timedelta:
+    start, end = event.get('start') or {}, event.get('end') or {}
+    if start.get('date') and end.get('date'):
+        return datetime.date.fromisoformat(end['date']) - datetime.date.fromisoformat(start['date'])
+    if start.get('dateTime') and end.get('dateTime'):
+        return datetime.datetime.fromisoformat(end['dateTime']) - datetime.datetime.fromisoformat(start['dateTime'])
+    return datetime.timedelta(0)
+
+
+def _with_series(events):
+    """Give cancelled occurrences the iCalUID and times an import needs.
+
+    Google lists them with little more than ``originalStartTime``. One
+    listed before its series is held back until the series is written;
+    those whose series is not in the listing are left out.
+    """
+    series, waiting = {}, collections.defaultdict(list)
+
+    def complete(event, uid, length):
+        start = event.get('start') or dict(event['originalStartTime'])
+        return dict(event, iCalUID=event.get('iCalUID') or uid, start=start,
+                    end=event.get('end') or _shift(start, length))
+
+    for event in events:
+        if event.get('recurrence') and event.get('iCalUID'):
+            series[event['id']] = event['iCalUID'], _length(event)
+            yield event
+            for held in waiting.pop(event['id'], ()):
+                yield complete(held, *series[event['id']])
+        elif event.get('status') == 'cancelled':
+            master = series.get(event.get('recurringEventId'))
+            if master is not None:
+                yield complete(event, *master)
+            else:
+                waiting[event.get('recurringEventId')].append(event)
+        else:
+            yield event
+
+
+def export_file(service, calendar_id: str, path: str, fmt: str = None,
+                  time_min: str = None, time_max: str = None) -> dict:
+    """Stream a calendar's events (optionally those overlapping a window) into ``path``."""
+    fmt = format_of(path, fmt)
+    params = {'showDeleted': True}
+    if time_min:
+        params['timeMin'] = time_min
+    if time_max:
+        params['timeMax'] = time_max
+    pages = iter_pages(service, calendar_id, page_size=MAX_PAGE_SIZE, **params)
+    first = next(pages)
+    time_zone = first.get('timeZone')
+    pages, first = itertools.chain([first], pages), None    # hold no page once it is written
+    # Deleted events are skipped; cancelled occurrences of a series are kept
+    events = _with_series(event for page in pages for event in page.get('items', [])
+                          if event.get('status') != 'cancelled' or event.get('originalStartTime'))
+    temp = path + '.tmp'
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(temp, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'ics':
+            count = write_ics(events, f, calendar_id, time_zone)
+        else:
+            count = write_jsonl(events, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return {'path': path, 'format': fmt, 'events': count, 'bytes': os.path.getsize(path)}
+
+
+# ----------------------------
+# Import
+# ----------------------------
+def import_body(event: dict) -> dict:
+    """The ``events().import_`` body for an exported or parsed event, or None if it cannot be imported.
+
+    A cancelled occurrence of a series is imported as a cancelled exception
+    of the series with its iCalUID; other cancelled events are not imported.
+    """
+    if event.get('eventType', 'default') != 'default':
+        return None
+    if event.get('status') == 'cancelled':
+        if not event.get('originalStartTime') or not event.get('iCalUID'):
+            return None
+        if not event.get('start'):
+            start = event['originalStartTime']
+            event = dict(event, start=start, end=event.get('end') or _shift(start, datetime.timedelta(0)))
+    elif not event.get('start') or not event.get('end'):
+        return None
+    body = {k: v for k, v in event.items() if k not in SERVER_FIELDS and v is not None}
+    if not body.get('iCalUID'):
+        # Derived from the content, so importing the same file again still dedupes
+        digest = hashlib.sha1(json.dumps([body.get('summary'), body['start'], body['end']],
+                                         sort_keys=True).encode()).hexdigest()
+        body['iCalUID'] = f'{digest}@import'
+    return body
+
+
+def _load_checkpoint(path: str, source: str, calendar_id: str) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('source') != os.path.abspath(source) or state.get('calendar_id') != calendar_id:
+        raise ValueError(f"Checkpoint {path} belongs to another import; remove it or pass resume=False")
+    return state
+
+
+def _save_checkpoint(path: str, state: dict):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def _key(body: dict, original_ts) -> tuple:
+    """Dedupe key: the iCalUID, plus the original start for a changed occurrence of a series."""
+    return body['iCalUID'], original_ts(body) if body.get('originalStartTime') else None
+
+
+def _batches(records, seen: set, existing: set, original_ts, result: dict, batch_size: int):
+    """Yield ``(batch, records done)`` with ``batch`` a list of ``(position, body)`` to import.
+
+    Skipped records are counted in ``result`` as they are read. A changed
+    occurrence never shares a batch with its series: batch sub-requests
+    run in any order, and the series must exist first.
+    """
+    batch, uids, done = [], set(), 0
+    for position, event in records:
+        body = import_body(event)
+        key = body and _key(body, original_ts)
+        if (batch and body is not None and key not in seen and key not in existing
+                and (len(batch) >= batch_size or body.get('originalStartTime') and body['iCalUID'] in uids)):
+            yield batch, position
+            batch, uids = [], set()
+        result['read'] += 1
+        done = position + 1
+        if body is None:
+            result['unsupported'] += 1
+        elif key in seen:
+            result['duplicates'] += 1
+        else:
+            seen.add(key)
+            if key in existing:
+                result['existing'] += 1
+            else:
+                batch.append((position, body))
+                uids.add(body['iCalUID'])
+    if batch:
+        yield batch, done
+
+
+def import_file(service_factory, calendar_id: str, path: str, fmt: str = None, time_zone: str = 'UTC',
+                  existing: set = frozenset(), original_ts=None, resume: bool = True, scheduler=None,
+                  on_imported=None, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Import the events of a JSONL or ICS file into ``calendar_id``.
+
+    ``existing`` holds ``(iCalUID, original start)`` keys already in the
+    calendar, skipped unless empty; ``original_ts(event)`` turns an
+    occurrence's ``originalStartTime`` into a timestamp (all-day ones in
+    the calendar's zone). ``on_imported(event)`` sees every imported event.
+    Records that failed in an interrupted run are sent again when it resumes.
+    """
+    fmt = format_of(path, fmt)
+    original_ts = original_ts or (lambda event: event_bounds({'start': event['originalStartTime']})[0])
+    checkpoint = checkpoint_path(path)
+    state = _load_checkpoint(checkpoint, path, calendar_id) if resume else None
+    done = state['position'] if state else 0
+    result = state['counts'] if state else {'read': 0, 'imported': 0, 'failed': 0, 'duplicates': 0,
+                                            'existing': 0, 'unsupported': 0}
+    # Positions of failed records (all of them) and details of the first TRANSFER_MAX_ERRORS
+    failed = {} if state is None else {int(k): v for k, v in state.get('failed', {}).items()}
+    seen = set()
+
+    def send(batch):
+        calls = [('import_', {'calendarId': calendar_id, 'body': body, 'fields': SYNC_FIELDS})
+                 for _, body in batch]
+        outcomes = execute_batch(service_factory, calls, scheduler=scheduler)
+        for (record, body), outcome in zip(batch, outcomes):
+            if outcome['ok']:
+                result['imported'] += 1
+                if on_imported is not None:
+                    on_imported(outcome['response'])
+            else:
+                result['failed'] += 1
+                failed[record] = ({'record': record + 1, 'iCalUID': body['iCalUID'], 'summary': body.get('summary'),
+                                   'error': outcome['error']} if len(failed) < TRANSFER_MAX_ERRORS else None)
+
+    def save(position):
+        _save_checkpoint(checkpoint, {'source': os.path.abspath(path), 'calendar_id': calendar_id,
+                                      'position': position, 'counts': result, 'failed': failed})
+
+    records = enumerate(read_events(path, fmt, time_zone))
+    # Records a previous run finished are only re-read to remember their keys,
+    # and to collect the ones that failed
+    retry = []
+    for position, event in itertools.islice(records, done):
+        body = import_body(event)
+        if body is not None:
+            seen.add(_key(body, original_ts))
+            if position in failed:
+                retry.append((position, body))
+    if retry:
+        for position, _ in retry:
+            del failed[position]
+        result['failed'] -= len(retry)
+        # Series before their changed occurrences, which must not share a batch with them
+        for occurrences in (False, True):
+            pending = [item for item in retry if bool(item[1].get('originalStartTime')) == occurrences]
+            for start in range(0, len(pending), batch_size):
+                send(pending[start:start + batch_size])
+        save(done)
+    for batch, position in _batches(records, seen, existing, original_ts, result, batch_size):
+        send(batch)
+        save(position)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    errors = sorted((error for error in failed.values() if error is not None), key=lambda error: error['record'])
+    result.update(path=path, format=fmt, resumed_at=done, retried=len(retry), errors=errors)
+    return result
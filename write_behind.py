@@ -0,0 +1,363 @@
+"""
+Write-behind queue for event edits.
+
+With ``WRITE_BEHIND_DELAY`` above zero, ``update_event`` no longer waits
+for Google: the changed fields are applied to the mirrored event, queued,
+and the edited event is returned at once. Later edits of the same event
+are merged into the queued patch, so an agent that changes the title, then
+the time, then the location sends one ``events().patch`` holding just
+those fields. A calendar's queued patches are sent ``WRITE_BEHIND_DELAY``
+seconds after its first queued edit, before its mirror pulls from Google
+(a pull must not undo a queued edit), before other writes to it, and at
+exit.
+
+Each patch carries the etag of the event it was based on (``If-Match``),
+so a change made elsewhere in the meantime is not overwritten: the
+conflict is recorded and the mirror takes Google's version. Queued edits
+are appended to a JSONL journal next to the mirror and replayed on start,
+so they survive a restart; the journal is rewritten after every flush.
+One open queue owns a journal at a time: a queue built for the same path
+waits until the previous owner is closed (see ``WriteQueue.close``).
+"""
+
+import datetime
+import json
+import os
+import sys
+import threading
+from collections import deque
+
+from googleapiclient.errors import HttpError
+
+from batch_ops import describe_error
+from event_store import SYNC_FIELDS
+from telemetry import telemetry
+
+# Seconds between an edit and the patch that sends it (0 = write through)
+WRITE_BEHIND_DELAY = float(os.environ.get('WRITE_BEHIND_DELAY', '0'))
+# Flush problems kept for flush_writes and server_stats
+WRITE_BEHIND_MAX_ERRORS = 50
+
+# Journal path -> lock held by the open queue that owns the journal
+_journal_locks = {}
+_journal_locks_lock = threading.Lock()
+
+
+def journal_path(event_store_path: str):
+    """Journal file kept next to a mirror database (None for an in-memory mirror)."""
+    if event_store_path == ':memory:':
+        return None
+    return os.path.splitext(event_store_path)[0] + '.writes.jsonl'
+
+
+def _journal_lock(path: str) -> threading.Lock:
+    with _journal_locks_lock:
+        return _journal_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _applied(event: dict, body: dict) -> bool:
+    """Whether ``event`` already holds every field of ``body`` (a lost response's patch)."""
+    for key, value in body.items():
+        current = event.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            if any(not _same(k, current.get(k), v) for k, v in value.items()):
+                return False
+        elif current != value:
+            return False
+    return True
+
+
+def _same(key: str, current, value) -> bool:
+    if key == 'dateTime' and current and value:
+        # Google may return the same instant with a different offset notation
+        try:
+            return datetime.datetime.fromisoformat(current) == datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return current == value
+
+
+class _Pending:
+    """Merged patch body of one event and the etag it was based on."""
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body: dict, etag):
+        self.body = body
+        self.etag = etag
+
+
+class WriteQueue:
+    """Coalescing, journaled queue of ``events().patch`` calls for one account.
+
+    ``store`` is the account's ``EventStore`` (edits are applied to it
+    optimistically) and ``service_factory`` returns its Calendar client.
+    Building a queue for a journal another open queue owns blocks until that
+    queue is closed, so two queues never replay or rewrite the same file.
+    """
+
+    def __init__(self, store, service_factory, journal: str = None, delay: float = WRITE_BEHIND_DELAY):
+        self.store = store
+        self.service_factory = service_factory
+        self.journal = journal
+        self.delay = delay
+        self._lock = threading.RLock()
+        self._flush_lock = threading.RLock()
+        self._pending = {}      # (calendar id, event id) -> _Pending, in queue order
+        self._timers = {}       # calendar id -> threading.Timer
+        self._errors = deque(maxlen=WRITE_BEHIND_MAX_ERRORS)
+        self._stats = {'queued': 0, 'coalesced': 0, 'flushes': 0, 'patches': 0, 'conflicts': 0,
+                       'failures': 0, 'replayed': 0}
+        self._closed = False
+        self._journal_lock = _journal_lock(journal) if journal else None
+        if self._journal_lock is not None:
+            self._journal_lock.acquire()
+        self._replay()
+
+    @property
+    def enabled(self) -> bool:
+        return self.delay > 0 and not self._closed
+
+    # ----------------------------
+    # Queueing
+    # ----------------------------
+    def patch(self, calendar_id: str, event: dict, body: dict) -> dict:
+        """Queue ``body`` as a patch of ``event``; returns the event as it will read once sent."""
+        key = calendar_id, event['id']
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The account's edit queue was closed; please retry the edit")
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending(dict(body), event.get('etag'))
+            else:
+                pending.body.update(body)
+                self._stats['coalesced'] += 1
+            self._stats['queued'] += 1
+            self._append({'calendar_id': calendar_id, 'event_id': event['id'], 'body': body,
+                          'etag': pending.etag})
+            self._schedule(calendar_id)
+        updated = dict(event, **body)
+        self.store.apply(calendar_id, updated)
+        return updated
+
+    def discard(self, calendar_id: str, event_id: str):
+        """Drop the queued patch of an event that is about to be deleted."""
+        with self._lock:
+            if self._pending.pop((calendar_id, event_id), None) is not None:
+                self._rewrite_journal()
+
+    def pending(self, calendar_id: str = None) -> int:
+        with self._lock:
+            return sum(1 for cal, _ in self._pending if calendar_id in (None, cal))
+
+    # ----------------------------
+    # Flushing
+    # ----------------------------
+    def flush(self, calendar_id: str = None) -> dict:
+        """Send the queued patches of ``calendar_id`` (all calendars if None) now.
+
+        Returns ``{'sent', 'conflicts', 'errors'}`` for this flush. Patches
+        that failed for a transient reason stay queued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                keys = [key for key in self._pending if calendar_id in (None, key[0])]
+                batch = [(key, self._pending.pop(key)) for key in keys]
+                for cal in {key[0] for key in keys}:
+                    timer = self._timers.pop(cal, None)
+                    if timer is not None:
+                        timer.cancel()
+            if not batch:
+                return {'sent': 0, 'conflicts': [], 'errors': []}
+            result = {'sent': 0, 'conflicts': [], 'errors': []}
+            with telemetry.span('write_behind_flush', calendar_id=calendar_id or 'all'):
+                for (cal, event_id), pending in batch:
+                    self._send(cal, event_id, pending, result)
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._rewrite_journal()
+            return result
+
+    def flush_all(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Flushing queued event edits failed: {e}", file=sys.stderr)
+
+    def close(self):
+        """Send what is queued, stop the timers and hand the journal to the next queue.
+
+        Patches that failed transiently stay in the journal for the next
+        owner to replay; without a journal they are lost.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush_all()
+        with self._flush_lock, self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            if self._pending and self.journal is None:
+                print(f"{len(self._pending)} queued event edits could not be sent and were dropped",
+                      file=sys.stderr)
+            self._pending.clear()
+            self.journal = None
+            if self._journal_lock is not None:
+                self._journal_lock.release()
+                self._journal_lock = None
+
+    def errors(self, clear: bool = False) -> list:
+        """Recent conflicts and failed patches, oldest first."""
+        with self._lock:
+            errors = list(self._errors)
+            if clear:
+                self._errors.clear()
+            return errors
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), delay=self.delay,
+                        journal=self.journal is not None)
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    def _send(self, calendar_id: str, event_id: str, pending: _Pending, result: dict):
+        try:
+            request = self.service_factory().events().patch(calendarId=calendar_id, eventId=event_id,
+                                                            body=pending.body, fields=SYNC_FIELDS)
+            if pending.etag:
+                request.headers['If-Match'] = pending.etag
+            event = request.execute()
+        except HttpError as e:
+            status = e.resp.status
+            if status == 412:
+                event = self._resolve_conflict(calendar_id, event_id, pending, result)
+            elif status in (404, 410):
+                self._fail(calendar_id, event_id, pending, result, 'deleted', describe_error(e))
+                self.store.remove(calendar_id, event_id)
+                return
+            elif status >= 500 or status == 429:
+                self._requeue(calendar_id, event_id, pending, result, describe_error(e))
+                return
+            else:
+                self._fail(calendar_id, event_id, pending, result, 'rejected', describe_error(e))
+                return
+        except Exception as e:
+            self._requeue(calendar_id, event_id, pending, result, describe_error(e))
+            return
+        if event is None:
+            return
+        with self._lock:
+            self._stats['patches'] += 1
+            result['sent'] += 1
+            # Edits queued while this patch was in flight still apply on top of Google's version
+            newer = self._pending.get((calendar_id, event_id))
+            if newer is not None:
+                newer.etag = event.get('etag')
+                event = dict(event, **newer.body)
+        self.store.apply(calendar_id, event)
+
+    def _resolve_conflict(self, calendar_id: str, event_id: str, pending: _Pending, result: dict):
+        """After a 412: the server's event if our patch is in it already (a retried patch), else None."""
+        try:
+            current = self.service_factory().events().get(calendarId=calendar_id, eventId=event_id,
+                                                          fields=SYNC_FIELDS).execute()
+        except Exception as e:
+            self._requeue(calendar_id, event_id, pending, result, describe_error(e))
+            return None
+        if _applied(current, pending.body):
+            return current
+        self._fail(calendar_id, event_id, pending, result, 'conflict',
+                   'The event was changed elsewhere; the queued edit was not applied')
+        with self._lock:
+            self._stats['conflicts'] += 1
+        self.store.apply(calendar_id, current)
+        return None
+
+    def _fail(self, calendar_id, event_id, pending, result, kind, message):
+        error = {'calendar_id': calendar_id, 'event_id': event_id, 'kind': kind, 'error': message,
+                 'fields': sorted(pending.body)}
+        with self._lock:
+            self._errors.append(error)
+            if kind != 'conflict':
+                self._stats['failures'] += 1
+        result['conflicts' if kind == 'conflict' else 'errors'].append(error)
+        print(f"Queued edit of {event_id} dropped ({kind}): {message}", file=sys.stderr)
+
+    def _requeue(self, calendar_id, event_id, pending, result, message):
+        # Transient failure (already retried by the scheduler): keep the edit and try again later
+        with self._lock:
+            newer = self._pending.get((calendar_id, event_id))
+            if newer is not None:
+                pending.body.update(newer.body)
+            self._pending[calendar_id, event_id] = pending
+            self._stats['failures'] += 1
+            self._schedule(calendar_id)
+        result['errors'].append({'calendar_id': calendar_id, 'event_id': event_id, 'kind': 'retrying',
+                                 'error': message, 'fields': sorted(pending.body)})
+
+    def _schedule(self, calendar_id: str):
+        """Start the calendar's flush timer unless one is running (call with the lock held)."""
+        if calendar_id in self._timers or self._closed:
+            return
+        # Retries and replayed edits are sent soon even when write-behind is off
+        timer = self._timers[calendar_id] = threading.Timer(self.delay or 1.0, self._timed_flush,
+                                                            (calendar_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _timed_flush(self, calendar_id: str):
+        with self._lock:
+            self._timers.pop(calendar_id, None)
+        try:
+            self.flush(calendar_id)
+        except Exception as e:
+            print(f"Flushing queued edits of {calendar_id} failed: {e}", file=sys.stderr)
+
+    def _append(self, entry: dict):
+        if self.journal is None:
+            return
+        with open(self.journal, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_journal(self):
+        """Replace the journal with the still-queued patches (call with the lock held)."""
+        if self.journal is None:
+            return
+        if not self._pending:
+            if os.path.exists(self.journal):
+                os.remove(self.journal)
+            return
+        temp = self.journal + '.tmp'
+        with open(temp, 'w') as f:
+            for (calendar_id, event_id), pending in self._pending.items():
+                f.write(json.dumps({'calendar_id': calendar_id, 'event_id': event_id, 'body': pending.body,
+                                    'etag': pending.etag}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.journal)
+
+    def _replay(self):
+        """Queue the patches a previous process journaled but never sent."""
+        if self.journal is None or not os.path.exists(self.journal):
+            return
+        with open(self.journal) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed write
+                key = entry['calendar_id'], entry['event_id']
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = _Pending(entry['body'], entry.get('etag'))
+                else:
+                    pending.body.update(entry['body'])
+                self._stats['replayed'] += 1
+        for calendar_id in {key[0] for key in self._pending}:
+            self._schedule(calendar_id)